@@ -0,0 +1,4 @@
+"""
+性能基准测试
+Benchmarks - 压测与离线基准脚本，使用 `python -m benchmarks.<name>` 运行
+"""
@@ -0,0 +1,372 @@
+"""
+离线回声消除基准
+Offline AEC benchmark and quality suite
+
+生成可复现的合成信号：远端语音经房间冲激响应 (RIR) 卷积并延迟后形成回声，
+叠加近端语音与噪声作为麦克风输入。逐帧送入回声消除引擎并统计：
+- 处理速度 (frames/sec)
+- 每帧临时内存分配 (tracemalloc 峰值字节)
+- ERLE (仅远端说话时的回声返回损耗增强)
+- 近端失真 (近端说话时输出相对干净近端语音的误差)
+- 过度抑制率 (近端说话帧中输出能量比近端低 10dB 以上的比例)
+
+用法:
+    python -m benchmarks.aec_bench --engine manager --engine passthrough --duration 60
+    python -m benchmarks.aec_bench --engine manager --engine canceller --check-budget
+"""
+
+import argparse
+import importlib
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+SAMPLE_RATE = 48000
+FRAME_SIZE = 960  # 20ms
+
+# 每个周期内的说话时间表 (秒)：远端单讲、静音、近端单讲、双讲
+CYCLE = 10.0
+FAR_SEGMENTS = [(0.0, 3.0), (7.0, 10.0)]
+NEAR_SEGMENTS = [(5.0, 10.0)]
+
+
+def synth_speech(duration, f0, rng, sample_rate=SAMPLE_RATE, level_db=-20.0):
+    """
+    合成类语音信号：带基频抖动的谐波 + 音节包络 + 气声噪声
+
+    Args:
+        duration: 时长 (秒)
+        f0: 平均基频 (Hz)
+        rng: numpy 随机数生成器
+        sample_rate: 采样率
+        level_db: 目标 RMS 电平 (dBFS)
+
+    Returns:
+        numpy array: float64 音频，满幅为 32767
+    """
+    count = int(duration * sample_rate)
+    t = np.arange(count) / sample_rate
+    f0_track = f0 * (1 + 0.08 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, 2 * np.pi)))
+    phase = 2 * np.pi * np.cumsum(f0_track) / sample_rate
+
+    voiced = np.zeros(count)
+    for k in range(1, 12):
+        voiced += np.sin(k * phase) / k
+
+    # 约 4 音节/秒的包络，随机幅度
+    syllables = rng.uniform(0.3, 1.0, int(duration * 4) + 2)
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5 * np.repeat(syllables, sample_rate // 4)[:count]
+    signal = voiced * envelope + 0.05 * rng.standard_normal(count) * envelope
+
+    rms = np.sqrt(np.mean(signal**2)) or 1.0
+    return signal / rms * 32767 * 10 ** (level_db / 20)
+
+
+def room_impulse_response(rt60, delay_ms, rng, sample_rate=SAMPLE_RATE, echo_gain_db=-6.0):
+    """
+    指数衰减噪声模型的房间冲激响应，包含直达声与传播延迟
+
+    Args:
+        rt60: 混响时间 (秒)
+        delay_ms: 扬声器到麦克风的延迟 (毫秒)
+        rng: numpy 随机数生成器
+        sample_rate: 采样率
+        echo_gain_db: 回声路径总增益 (dB)
+
+    Returns:
+        numpy array: 冲激响应
+    """
+    length = max(1, int(rt60 * sample_rate))
+    t = np.arange(length) / sample_rate
+    tail = rng.standard_normal(length) * np.exp(-6.9 * t / rt60) * 0.3
+    tail[0] = 1.0
+    tail /= np.sqrt(np.sum(tail**2))
+
+    delay = int(delay_ms * sample_rate / 1000)
+    return np.concatenate([np.zeros(delay), tail]) * 10 ** (echo_gain_db / 20)
+
+
+def fft_convolve(signal, kernel):
+    """FFT 卷积，截取到输入信号长度"""
+    n = len(signal) + len(kernel) - 1
+    size = 1 << (n - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(signal, size) * np.fft.rfft(kernel, size), size)
+    return result[: len(signal)]
+
+
+def activity_mask(segments, count, sample_rate=SAMPLE_RATE):
+    """按周期时间表生成逐样本的说话掩码"""
+    t = (np.arange(count) / sample_rate) % CYCLE
+    mask = np.zeros(count, dtype=bool)
+    for start, end in segments:
+        mask |= (t >= start) & (t < end)
+    return mask
+
+
+class Scenario:
+    """
+    一组可复现的合成测试信号
+    """
+
+    def __init__(self, duration=60.0, rt60=0.3, delay_ms=40.0, echo_gain_db=-6.0, snr_db=40.0, seed=0):
+        rng = np.random.default_rng(seed)
+        count = int(duration * SAMPLE_RATE) // FRAME_SIZE * FRAME_SIZE
+
+        far_mask = activity_mask(FAR_SEGMENTS, count)
+        near_mask = activity_mask(NEAR_SEGMENTS, count)
+
+        self.far = synth_speech(duration, 120.0, rng)[:count] * far_mask
+        self.near = synth_speech(duration, 210.0, rng)[:count] * near_mask
+        self.echo = fft_convolve(self.far, room_impulse_response(rt60, delay_ms, rng, echo_gain_db=echo_gain_db))
+
+        noise_level = np.sqrt(np.mean(self.near[near_mask] ** 2)) * 10 ** (-snr_db / 20)
+        self.noise = rng.standard_normal(count) * noise_level
+        self.mic = np.clip(self.echo + self.near + self.noise, -32767, 32767)
+
+        # 帧级掩码 (一帧内超过一半样本有效即视为活动)
+        frames = count // FRAME_SIZE
+        self.far_active = far_mask.reshape(frames, FRAME_SIZE).mean(axis=1) > 0.5
+        self.near_active = near_mask.reshape(frames, FRAME_SIZE).mean(axis=1) > 0.5
+        self.frames = frames
+
+        self.mic_int16 = self.mic.astype(np.int16)
+        self.far_int16 = np.clip(self.far, -32767, 32767).astype(np.int16)
+
+    def frame(self, index):
+        """返回第 index 帧的 (麦克风, 参考) 数据；远端静音时参考为 None"""
+        start = index * FRAME_SIZE
+        mic = self.mic_int16[start : start + FRAME_SIZE]
+        ref = self.far_int16[start : start + FRAME_SIZE] if self.far_active[index] else None
+        return mic, ref
+
+
+class PassthroughEngine:
+    """不做任何处理，作为对照组"""
+
+    def process(self, mic, ref):
+        return mic
+
+
+class ManagerEngine:
+    """EchoCancellationManager，按 AudioFaceSwapper 的方式调用"""
+
+    def __init__(self, warmup=False):
+        from src.audio.echo_manager import EchoCancellationManager
+
+        self.manager = EchoCancellationManager(enable_echo_cancellation=True, enable_debug=False)
+        if not warmup:
+            # 预热基于墙钟时间，离线处理远快于实时，默认跳过
+            self.manager.echo_canceller.warmup_duration = 0
+
+    def process(self, mic, ref):
+        if ref is not None:
+            self.manager.update_reference_audio(ref)
+        return self.manager.process_microphone_audio(mic)
+
+
+class PolicyEngine(ManagerEngine):
+    """EchoCancellationManager + AecPolicy，按测得的残余回声选择 full / light / bypass"""
+
+    def __init__(self, warmup=False):
+        super().__init__(warmup)
+        from src.audio.aec_policy import AecPolicy
+
+        self.manager.policy = AecPolicy()
+
+
+class CancellerEngine:
+    """直接调用 EchoCanceller，不经过管理器的安全混合"""
+
+    def __init__(self, warmup=False):
+        from src.audio.echo_canceller import EchoCanceller
+
+        self.canceller = EchoCanceller()
+        if not warmup:
+            self.canceller.warmup_duration = 0
+        self.reference = None
+
+    def process(self, mic, ref):
+        if ref is not None:
+            self.reference = ref
+        if self.reference is None:
+            return mic
+        return self.canceller.process_audio(mic, reference_audio=self.reference)
+
+
+ENGINES = {
+    "passthrough": PassthroughEngine,
+    "manager": ManagerEngine,
+    "canceller": CancellerEngine,
+    "policy": PolicyEngine,
+}
+
+
+def create_engine(name, warmup=False):
+    """
+    创建回声消除引擎
+
+    Args:
+        name: ENGINES 中的名称，或 "module:Class" 形式的自定义引擎 (需实现 process(mic, ref))
+        warmup: 是否保留基于墙钟时间的预热处理
+    """
+    if name in ENGINES:
+        factory = ENGINES[name]
+        return factory() if factory is PassthroughEngine else factory(warmup=warmup)
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def energy_db(numerator, denominator):
+    """10*log10(numerator/denominator)，避免除零"""
+    return float(10 * np.log10((numerator + 1e-9) / (denominator + 1e-9)))
+
+
+def run_engine(name, scenario, warmup=False, alloc_frames=500):
+    """
+    运行单个引擎并计算指标
+
+    Returns:
+        dict: 指标结果
+    """
+    # 1. 速度：不开启 tracemalloc
+    engine = create_engine(name, warmup)
+    output = np.zeros(scenario.frames * FRAME_SIZE, dtype=np.float64)
+    start = time.perf_counter()
+    for index in range(scenario.frames):
+        mic, ref = scenario.frame(index)
+        result = engine.process(mic, ref)
+        output[index * FRAME_SIZE : (index + 1) * FRAME_SIZE] = result
+    elapsed = time.perf_counter() - start
+
+    # 2. 临时内存分配：新的引擎实例，跟踪前 alloc_frames 帧中的远端活动帧 (走完整回声消除路径)
+    engine = create_engine(name, warmup)
+    alloc_bytes = []
+    tracemalloc.start()
+    try:
+        for index in range(min(scenario.frames, alloc_frames)):
+            mic, ref = scenario.frame(index)
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            engine.process(mic, ref)
+            _, peak = tracemalloc.get_traced_memory()
+            if scenario.far_active[index]:
+                alloc_bytes.append(peak - current)
+    finally:
+        tracemalloc.stop()
+
+    # 3. 质量指标
+    frames_out = output.reshape(scenario.frames, FRAME_SIZE)
+    frames_mic = scenario.mic.reshape(scenario.frames, FRAME_SIZE)
+    frames_near = scenario.near.reshape(scenario.frames, FRAME_SIZE)
+
+    far_only = scenario.far_active & ~scenario.near_active
+    near_any = scenario.near_active
+
+    erle = energy_db(np.mean(frames_mic[far_only] ** 2), np.mean(frames_out[far_only] ** 2))
+    distortion = energy_db(
+        np.mean((frames_out[near_any] - frames_near[near_any]) ** 2), np.mean(frames_near[near_any] ** 2)
+    )
+    out_energy = np.mean(frames_out[near_any] ** 2, axis=1)
+    near_energy = np.mean(frames_near[near_any] ** 2, axis=1)
+    over_suppressed = out_energy < near_energy * 0.1
+
+    return {
+        "engine": name,
+        "frames": scenario.frames,
+        "frames_per_sec": scenario.frames / elapsed,
+        "realtime_factor": scenario.frames * FRAME_SIZE / SAMPLE_RATE / elapsed,
+        "alloc_bytes_per_frame": float(np.mean(alloc_bytes)) if alloc_bytes else 0.0,
+        "alloc_bytes_p95": float(np.percentile(alloc_bytes, 95)) if alloc_bytes else 0.0,
+        "erle_db": erle,
+        "near_end_distortion_db": distortion,
+        "over_suppression_rate": float(np.mean(over_suppressed)) if len(over_suppressed) else 0.0,
+    }
+
+
+def print_results(results):
+    header = "{:<14} {:>10} {:>9} {:>12} {:>9} {:>12} {:>10}".format(
+        "engine", "frames/s", "x realtime", "alloc B/frm", "ERLE dB", "distort dB", "over-supp"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            "{:<14} {:>10.0f} {:>9.1f}x {:>12.0f} {:>9.2f} {:>12.2f} {:>9.1%}".format(
+                r["engine"],
+                r["frames_per_sec"],
+                r["realtime_factor"],
+                r["alloc_bytes_per_frame"],
+                r["erle_db"],
+                r["near_end_distortion_db"],
+                r["over_suppression_rate"],
+            )
+        )
+
+
+def check_budget(results):
+    """
+    检查回声消除引擎的每帧临时内存分配预算
+
+    passthrough 与自定义引擎不参与检查；取 p95 以排除策略决策等一次性分配。
+
+    Returns:
+        bool: 是否全部满足预算
+    """
+    from src.audio.echo_manager import FRAME_ALLOCATION_BUDGET
+
+    ok = True
+    for r in results:
+        if r["engine"] not in ENGINES or r["engine"] == "passthrough":
+            continue
+        within = r["alloc_bytes_p95"] <= FRAME_ALLOCATION_BUDGET
+        ok = ok and within
+        print(
+            "allocation budget {:<10} p95={:.0f}B budget={}B {}".format(
+                r["engine"], r["alloc_bytes_p95"], FRAME_ALLOCATION_BUDGET, "ok" if within else "EXCEEDED"
+            )
+        )
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线回声消除基准")
+    parser.add_argument("--engine", action="append", help="引擎名称 (可多次指定)：{}".format(", ".join(ENGINES)))
+    parser.add_argument("--duration", type=float, default=60.0, help="信号时长 (秒)")
+    parser.add_argument("--rt60", type=float, default=0.3, help="混响时间 (秒)")
+    parser.add_argument("--delay-ms", type=float, default=40.0, help="回声路径延迟 (毫秒)")
+    parser.add_argument("--echo-gain-db", type=float, default=-6.0, help="回声路径增益 (dB)")
+    parser.add_argument("--snr-db", type=float, default=40.0, help="近端语音相对噪声的信噪比 (dB)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", action="store_true", help="保留基于墙钟时间的预热处理")
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    parser.add_argument(
+        "--check-budget",
+        action="store_true",
+        help="检查每帧临时内存分配 (p95) 不超过 FRAME_ALLOCATION_BUDGET，超过时以非 0 状态退出",
+    )
+    args = parser.parse_args()
+
+    scenario = Scenario(
+        duration=args.duration,
+        rt60=args.rt60,
+        delay_ms=args.delay_ms,
+        echo_gain_db=args.echo_gain_db,
+        snr_db=args.snr_db,
+        seed=args.seed,
+    )
+    results = [run_engine(name, scenario, warmup=args.warmup) for name in args.engine or ["passthrough", "manager"]]
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.check_budget and not check_budget(results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
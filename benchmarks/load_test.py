@@ -0,0 +1,292 @@
+"""
+端到端压测
+End-to-end load test
+
+启动 N 个无界面 aiortc 客户端 (循环 PCM 音频 + 测试视频)，通过 /api/offer 连接服务端，
+服务端连接本地模拟小智后端 (src.mock.xiaozhi_backend)。统计：
+- 每路通话建立耗时 (offer -> connected)
+- 嘴到耳延迟 (客户端发出语音 burst -> 收到 TTS 音频起始) 的分位数
+- 每路会话的服务端 CPU 与内存占用
+
+用法:
+    python -m benchmarks.load_test --clients 10 --duration 30
+"""
+
+import argparse
+import asyncio
+import fractions
+import json
+import time
+
+import aiohttp
+import numpy as np
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCSessionDescription, VideoStreamTrack
+from aiortc.mediastreams import MediaStreamError
+from av import AudioFrame, VideoFrame
+
+from benchmarks.utils import ProcessSampler, format_summary, spawn, summarize, terminate, wait_http, wait_ready
+
+SAMPLE_RATE = 48000
+FRAME_SAMPLES = 960  # 20ms
+
+
+class LoopedAudioTrack(MediaStreamTrack):
+    """
+    循环播放的合成麦克风音频：低电平噪声 + 周期性的语音 burst
+
+    每个 burst 起始帧发出时记录时间戳，用于计算嘴到耳延迟。
+    """
+
+    kind = "audio"
+
+    def __init__(self, period=4.0, burst_duration=0.3, burst_frequency=440, seed=0):
+        super().__init__()
+        period_samples = int(period * SAMPLE_RATE) // FRAME_SAMPLES * FRAME_SAMPLES
+        rng = np.random.default_rng(seed)
+        pcm = rng.normal(0, 30, period_samples).astype(np.float32)
+
+        # burst 放在周期的 1/4 处，给回声消除预热留出时间
+        burst_start = period_samples // 4 // FRAME_SAMPLES * FRAME_SAMPLES
+        burst_len = int(burst_duration * SAMPLE_RATE)
+        t = np.arange(burst_len, dtype=np.float32) / SAMPLE_RATE
+        pcm[burst_start : burst_start + burst_len] += np.sin(2 * np.pi * burst_frequency * t) * 12000
+
+        self.pcm = np.clip(pcm, -32767, 32767).astype(np.int16)
+        self.burst_frame = burst_start // FRAME_SAMPLES
+        self.frames_per_loop = period_samples // FRAME_SAMPLES
+        self.burst_times = []
+
+        self._start = None
+        self._timestamp = 0
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        if self._start is None:
+            self._start = time.time()
+        else:
+            self._timestamp += FRAME_SAMPLES
+            wait = self._start + self._timestamp / SAMPLE_RATE - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+        index = (self._timestamp // FRAME_SAMPLES) % self.frames_per_loop
+        if index == self.burst_frame:
+            self.burst_times.append(time.perf_counter())
+
+        offset = index * FRAME_SAMPLES
+        frame = AudioFrame.from_ndarray(
+            self.pcm[offset : offset + FRAME_SAMPLES].reshape(1, -1), format="s16", layout="mono"
+        )
+        frame.sample_rate = SAMPLE_RATE
+        frame.pts = self._timestamp
+        frame.time_base = fractions.Fraction(1, SAMPLE_RATE)
+        return frame
+
+
+class TestPatternVideoTrack(VideoStreamTrack):
+    """移动色条测试视频"""
+
+    def __init__(self, width=320, height=240):
+        super().__init__()
+        self.image = np.zeros((height, width, 3), dtype=np.uint8)
+        self.image[:, :, 1] = np.linspace(0, 255, width, dtype=np.uint8)
+        self.counter = 0
+
+    async def recv(self):
+        pts, time_base = await self.next_timestamp()
+        self.counter += 1
+        self.image[:, :, 0] = (self.counter * 4) % 256
+
+        frame = VideoFrame.from_ndarray(self.image, format="bgr24")
+        frame.pts = pts
+        frame.time_base = time_base
+        return frame
+
+
+class LoadClient:
+    """单个压测客户端"""
+
+    def __init__(self, index, base_url, onset_threshold=1000):
+        self.index = index
+        self.base_url = base_url
+        self.mac_address = "02:00:00:00:{:02x}:{:02x}".format((index >> 8) & 0xFF, index & 0xFF)
+        self.onset_threshold = onset_threshold
+
+        self.pc = None
+        self.audio_track = LoopedAudioTrack(seed=index)
+        self.connected = asyncio.Event()
+
+        # 结果
+        self.answer_time = None
+        self.setup_time = None
+        self.latencies = []
+        self.received_frames = 0
+        self.error = None
+
+    async def connect(self, session):
+        self.pc = RTCPeerConnection()
+        self.pc.createDataChannel("chat")
+        self.pc.addTrack(self.audio_track)
+        self.pc.addTrack(TestPatternVideoTrack())
+
+        @self.pc.on("connectionstatechange")
+        async def on_connectionstatechange():
+            if self.pc.connectionState == "connected":
+                self.connected.set()
+
+        @self.pc.on("track")
+        def on_track(track):
+            if track.kind == "audio":
+                asyncio.ensure_future(self.consume_audio(track))
+
+        start = time.perf_counter()
+        await self.pc.setLocalDescription(await self.pc.createOffer())
+        payload = {"sdp": self.pc.localDescription.sdp, "type": self.pc.localDescription.type}
+        payload["macAddress"] = self.mac_address
+        async with session.post(self.base_url + "/api/offer", json=payload) as response:
+            response.raise_for_status()
+            answer = await response.json()
+        self.answer_time = time.perf_counter() - start
+
+        await self.pc.setRemoteDescription(RTCSessionDescription(sdp=answer["sdp"], type=answer["type"]))
+        await asyncio.wait_for(self.connected.wait(), timeout=30)
+        self.setup_time = time.perf_counter() - start
+
+    async def consume_audio(self, track):
+        """接收下行音频，检测 TTS 起始并与最近的 burst 匹配"""
+        active = False
+        matched = 0
+        while True:
+            try:
+                frame = await track.recv()
+            except MediaStreamError:
+                return
+            self.received_frames += 1
+
+            samples = frame.to_ndarray()
+            rms = np.sqrt(np.mean(samples.astype(np.float32) ** 2))
+            if rms >= self.onset_threshold:
+                if not active and matched < len(self.audio_track.burst_times):
+                    now = time.perf_counter()
+                    # 取最后一个早于当前时刻的 burst
+                    self.latencies.append(now - self.audio_track.burst_times[-1])
+                    matched = len(self.audio_track.burst_times)
+                active = True
+            else:
+                active = False
+
+    async def close(self):
+        if self.pc:
+            await self.pc.close()
+
+
+async def run_load(args):
+    backend = server = None
+    env = {}
+    backend_url = args.backend_url
+    if not args.server_url and not backend_url:
+        backend = spawn(["-m", "src.mock.xiaozhi_backend", "--port", str(args.backend_port)])
+        backend_url = "http://127.0.0.1:{}/xiaozhi/ota".format(args.backend_port)
+
+    base_url = args.server_url
+    if not base_url:
+        env = {"PORT": str(args.server_port), "OTA_URL": backend_url}
+        server = spawn(["main.py"], env=env)
+        base_url = "http://127.0.0.1:{}".format(args.server_port)
+
+    sampler = ProcessSampler(server.pid if server else args.server_pid)
+    clients = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_http(session, base_url + "/")
+            # 媒体模块在启动预热中导入，预热完成后再取基线内存，否则会计入每个会话
+            await wait_ready(session, base_url + "/api/ready")
+            baseline_rss = sampler.rss_bytes()
+
+            # 按 ramp 间隔依次建立连接
+            clients = [LoadClient(i + 1, base_url) for i in range(args.clients)]
+            tasks = []
+            for client in clients:
+                tasks.append(asyncio.ensure_future(client.connect(session)))
+                await asyncio.sleep(args.ramp)
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for client, result in zip(clients, results):
+                if isinstance(result, Exception):
+                    client.error = repr(result)
+
+            # 稳态采样窗口
+            cpu_start, wall_start = sampler.cpu_seconds(), time.perf_counter()
+            await asyncio.sleep(args.duration)
+            cpu_end, wall_end = sampler.cpu_seconds(), time.perf_counter()
+            steady_rss = sampler.rss_bytes()
+    finally:
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+        terminate(server)
+        terminate(backend)
+
+    connected = [c for c in clients if c.setup_time is not None]
+    report = {
+        "clients": args.clients,
+        "connected": len(connected),
+        "errors": [c.error for c in clients if c.error],
+        "answer_time": summarize([c.answer_time for c in connected]),
+        "setup_time": summarize([c.setup_time for c in connected]),
+        "mouth_to_ear": summarize([lat for c in connected for lat in c.latencies]),
+        "received_frames": sum(c.received_frames for c in connected),
+    }
+    if cpu_start is not None and connected:
+        cpu_ratio = (cpu_end - cpu_start) / (wall_end - wall_start)
+        report["cpu_percent_total"] = cpu_ratio * 100
+        report["cpu_percent_per_session"] = cpu_ratio * 100 / len(connected)
+    if baseline_rss is not None and connected:
+        report["rss_mb_total"] = steady_rss / 2**20
+        report["rss_mb_per_session"] = (steady_rss - baseline_rss) / 2**20 / len(connected)
+    return report
+
+
+def print_report(report):
+    print("=" * 72)
+    print("clients: {} connected: {} errors: {}".format(report["clients"], report["connected"], len(report["errors"])))
+    print(format_summary("answer time", report["answer_time"]))
+    print(format_summary("setup time (connected)", report["setup_time"]))
+    print(format_summary("mouth-to-ear latency", report["mouth_to_ear"]))
+    if "cpu_percent_per_session" in report:
+        print(
+            "{:<28} total={:.1f}%  per session={:.2f}%".format(
+                "server cpu", report["cpu_percent_total"], report["cpu_percent_per_session"]
+            )
+        )
+    if "rss_mb_per_session" in report:
+        print(
+            "{:<28} total={:.1f}MB  per session={:.2f}MB".format(
+                "server memory", report["rss_mb_total"], report["rss_mb_per_session"]
+            )
+        )
+    for error in report["errors"][:5]:
+        print("error:", error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--clients", type=int, default=5, help="并发客户端数量")
+    parser.add_argument("--duration", type=float, default=20.0, help="稳态采样时长 (秒)")
+    parser.add_argument("--ramp", type=float, default=0.2, help="客户端依次建立连接的间隔 (秒)")
+    parser.add_argument("--server-url", help="使用已运行的服务端，例如 http://127.0.0.1:51000")
+    parser.add_argument("--server-pid", type=int, help="已运行服务端的 pid，用于 CPU/内存采样")
+    parser.add_argument("--server-port", type=int, default=51100)
+    parser.add_argument("--backend-url", help="使用已运行的 (模拟) 后端 OTA 地址")
+    parser.add_argument("--backend-port", type=int, default=8765)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
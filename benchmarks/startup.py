@@ -0,0 +1,166 @@
+"""
+冷启动基准测试
+Startup benchmark
+
+统计：
+- import src 耗时 (每次在新的子进程中测量)
+- 服务端进程启动 -> 端口可访问 (listening)
+- 服务端进程启动 -> 第一个 /api/offer 返回应答 (time-to-first-answer)，offer 在端口可访问后立即发送
+- 服务端进程启动 -> /api/ready 返回 200 (预热完成)
+
+服务端连接本地模拟小智后端 (src.mock.xiaozhi_backend)。
+
+用法:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --no-warmup   # 对照：关闭启动预热
+    python -m benchmarks.startup --importtime           # 列出 import src 耗时最多的模块
+"""
+
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.load_test import LoadClient
+from benchmarks.utils import ROOT, format_summary, spawn, summarize, terminate, wait_http, wait_ready
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import src; print(time.perf_counter() - start)"
+
+
+def measure_import(runs):
+    """在新的子进程中测量 import src 的耗时"""
+    durations = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        durations.append(float(output.strip().splitlines()[-1]))
+    return durations
+
+
+def import_profile(top=15):
+    """
+    python -X importtime 的结果，按累计耗时排序
+
+    Returns:
+        list: [(累计微秒, 模块名)]
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src"], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+async def measure_start(args, backend_url, index):
+    """启动一次服务端，返回各阶段相对进程启动的耗时"""
+    env = {"PORT": str(args.server_port), "OTA_URL": backend_url}
+    if args.no_warmup:
+        env["WARMUP_ENABLED"] = "0"
+    base_url = "http://127.0.0.1:{}".format(args.server_port)
+
+    spawned = time.perf_counter()
+    server = spawn(["main.py"], env=env)
+    client = LoadClient(index, base_url)
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_http(session, base_url + "/api/ready")
+            listening = time.perf_counter() - spawned
+
+            async def first_answer():
+                offer_sent = time.perf_counter()
+                await client.connect(session)
+                return offer_sent - spawned + client.answer_time
+
+            async def ready():
+                body = await wait_ready(session, base_url + "/api/ready")
+                return time.perf_counter() - spawned, body
+
+            answer, (ready_time, body) = await asyncio.gather(first_answer(), ready())
+            return {
+                "listening": listening,
+                "first_answer": answer,
+                "ready": ready_time,
+                "phases": {name: result["seconds"] for name, result in body.get("phases", {}).items()},
+            }
+    finally:
+        await client.close()
+        terminate(server)
+
+
+async def run_startup(args):
+    backend = None
+    backend_url = args.backend_url
+    if not backend_url:
+        backend = spawn(["-m", "src.mock.xiaozhi_backend", "--port", str(args.backend_port)])
+        backend_url = "http://127.0.0.1:{}/xiaozhi/ota".format(args.backend_port)
+
+    runs = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            await wait_http(session, backend_url)
+        for index in range(args.runs):
+            runs.append(await measure_start(args, backend_url, index + 1))
+    finally:
+        terminate(backend)
+
+    phases = {}
+    for run in runs:
+        for name, seconds in run["phases"].items():
+            phases.setdefault(name, []).append(seconds)
+    return {
+        "runs": args.runs,
+        "warmup": not args.no_warmup,
+        "import": summarize(measure_import(args.runs)),
+        "listening": summarize([run["listening"] for run in runs]),
+        "first_answer": summarize([run["first_answer"] for run in runs]),
+        "ready": summarize([run["ready"] for run in runs]),
+        "warmup_phases": {name: summarize(values) for name, values in phases.items()},
+    }
+
+
+def print_report(report):
+    print("=" * 72)
+    print("runs: {} warm-up: {}".format(report["runs"], "on" if report["warmup"] else "off"))
+    print(format_summary("import src", report["import"]))
+    print(format_summary("spawn -> listening", report["listening"]))
+    print(format_summary("spawn -> first answer", report["first_answer"]))
+    print(format_summary("spawn -> ready", report["ready"]))
+    for name, summary in report["warmup_phases"].items():
+        print(format_summary("  " + name, summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动基准测试")
+    parser.add_argument("--runs", type=int, default=3, help="启动次数")
+    parser.add_argument("--no-warmup", action="store_true", help="关闭启动预热 (WARMUP_ENABLED=0) 作为对照")
+    parser.add_argument("--importtime", action="store_true", help="列出 import src 耗时最多的模块后退出")
+    parser.add_argument("--server-port", type=int, default=51200)
+    parser.add_argument("--backend-url", help="使用已运行的 (模拟) 后端 OTA 地址")
+    parser.add_argument("--backend-port", type=int, default=8766)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if args.importtime:
+        for cumulative, name in import_profile():
+            print("{:>10.1f}ms  {}".format(cumulative / 1000, name))
+        return
+
+    report = asyncio.run(run_startup(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+基准测试公共工具
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import aiohttp
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def spawn(args, env=None):
+    """
+    在仓库根目录下启动子进程
+
+    Args:
+        args: python 参数列表，例如 ["main.py"] 或 ["-m", "src.mock.xiaozhi_backend"]
+        env: 额外的环境变量
+
+    Returns:
+        subprocess.Popen: 子进程
+    """
+    full_env = dict(os.environ)
+    full_env.update(env or {})
+    return subprocess.Popen([sys.executable] + list(args), cwd=ROOT, env=full_env)
+
+
+def terminate(process, timeout=10):
+    """结束子进程"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+async def wait_http(session, url, timeout=30.0, method="get"):
+    """
+    轮询直到 url 可访问
+
+    Returns:
+        float: 等待耗时 (秒)
+    """
+    start = time.perf_counter()
+    while True:
+        try:
+            async with session.request(method, url) as response:
+                await response.read()
+                return time.perf_counter() - start
+        except OSError:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError("等待 {} 超时".format(url))
+            await asyncio.sleep(0.05)
+
+
+async def wait_ready(session, url, timeout=60.0):
+    """轮询 /api/ready 直到返回 200"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            async with session.get(url) as response:
+                body = await response.json()
+                if response.status == 200:
+                    return body
+        except (OSError, aiohttp.ContentTypeError):
+            pass
+        await asyncio.sleep(0.02)
+    raise TimeoutError("等待 {} 超时".format(url))
+
+
+class ProcessSampler:
+    """
+    基于 /proc 的进程 CPU 与内存采样 (仅 Linux)
+    """
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @property
+    def available(self):
+        return self.pid is not None and os.path.exists("/proc/{}/stat".format(self.pid))
+
+    def cpu_seconds(self):
+        """进程累计 CPU 时间 (用户态 + 内核态)"""
+        if not self.available:
+            return None
+        with open("/proc/{}/stat".format(self.pid)) as f:
+            # comm 字段可能包含空格，从最后一个 ')' 之后开始解析
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.clock_ticks
+
+    def rss_bytes(self):
+        """进程常驻内存"""
+        if not self.available:
+            return None
+        with open("/proc/{}/status".format(self.pid)) as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return None
+
+
+def summarize(values, percentiles=(50, 90, 99)):
+    """
+    计算数值序列的统计摘要
+
+    Returns:
+        dict: count / mean / max 以及各分位数
+    """
+    if not values:
+        return {"count": 0}
+    data = np.asarray(values, dtype=np.float64)
+    summary = {"count": int(data.size), "mean": float(data.mean()), "max": float(data.max())}
+    for p in percentiles:
+        summary["p{}".format(p)] = float(np.percentile(data, p))
+    return summary
+
+
+def format_summary(name, summary, unit="ms", scale=1000.0):
+    """格式化统计摘要为单行文本"""
+    if not summary.get("count"):
+        return "{:<28} n/a".format(name)
+    parts = ["n={}".format(summary["count"])]
+    for key in ("mean", "p50", "p90", "p99", "max"):
+        if key in summary:
+            parts.append("{}={:.1f}{}".format(key, summary[key] * scale, unit))
+    return "{:<28} {}".format(name, "  ".join(parts))
@@ -1,21 +1,37 @@
 import asyncio
+import hmac
 import json
 import logging
 import os
+import uuid
 
 from aiohttp import web
-from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
 
-from src.config import DEFAULT_MAC_ADDR, OTA_URL, PORT
+from src.assets import AssetCache
+from src.config import DEFAULT_MAC_ADDR, OTA_URL, PORT, XIAOZHI_BACKEND
+from src.config.admin_config import AdminConfig
+from src.config.asset_config import AssetConfig
+from src.config.drain_config import DrainConfig
 from src.config.ice_config import ice_config
-from src.server import XiaoZhiServer
-from src.track.audio import AudioFaceSwapper
-from src.track.video import VideoFaceSwapper
-
-# 设置 logger
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", datefmt="%Y-%m-%d %H:%M:%S"
-)
+from src.config.lipsync_config import LipSyncConfig
+from src.config.profile_config import ProfileConfig
+from src.config.record_config import RecordConfig
+from src.config.registry_config import RegistryConfig
+from src.config.session_config import SessionConfig
+from src.config.startup_config import StartupConfig
+from src.drain import DrainController
+from src.ice import ice_servers
+from src.load_monitor import load_monitor
+from src.log import bind_session, setup_logging
+from src.profiler import attribute, measure_sessions, profiler
+from src.registry import REDIRECT, REJECT, ClusterNode, create_registry
+from src.session import SessionManager
+from src.warmup import import_media_modules, validate_ice_config, warm_codecs, warmup
+
+# 媒体相关模块 (aiortc、av、cv2、xiaozhi_sdk) 在启动预热中导入，见 src/warmup.py
+
+# 设置 logger：队列 + 后台写入线程，见 src/log.py
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # 禁用 aioice.ice 模块的日志输出
@@ -23,6 +39,12 @@ logging.getLogger("aioice.ice").setLevel(logging.WARNING)
 
 ROOT = os.path.dirname(__file__)
 
+# 页面与静态资源的内存缓存
+PAGES = ("index.html", "chat.html", "chatv2.html")
+APP_SHELL = ("js/vue.min.js", "js/pixi.js", "js/cubism4.min.js", "js/live2dcubismcore.min.js", "js/live2d.js")
+page_cache = AssetCache(ROOT)
+static_cache = AssetCache(os.path.join(ROOT, "static"))
+
 
 def get_client_ip(request):
     """
@@ -55,57 +77,211 @@ def get_client_ip(request):
     return "unknown"
 
 
+def require_admin(request):
+    """校验管理接口令牌 (Authorization: Bearer <ADMIN_TOKEN>)，未配置令牌时管理接口不可用"""
+    if not AdminConfig.TOKEN:
+        raise web.HTTPNotFound()
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip(), AdminConfig.TOKEN):
+        raise web.HTTPUnauthorized(headers={"WWW-Authenticate": "Bearer"})
+
+
 async def index(request):
-    content = open(os.path.join(ROOT, "index.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await page_cache.response(request, "index.html", AssetConfig.PAGE_CACHE_CONTROL)
 
 
 async def chatv2(request):
-    content = open(os.path.join(ROOT, "chatv2.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await page_cache.response(request, "chatv2.html", AssetConfig.PAGE_CACHE_CONTROL)
 
 
 async def chat(request):
-    content = open(os.path.join(ROOT, "chat.html"), "r", encoding="utf-8").read()
-    return web.Response(content_type="text/html", text=content)
+    return await page_cache.response(request, "chat.html", AssetConfig.PAGE_CACHE_CONTROL)
+
+
+async def static(request):
+    """静态资源：内存缓存 + 预压缩 + ETag"""
+    relative_path = request.match_info["path"]
+    cache_control = AssetConfig.get_cache_control(relative_path, versioned="v" in request.query)
+    return await static_cache.response(request, relative_path, cache_control)
 
 
 async def ice(request):
-    """返回ICE服务器配置"""
-    ice_servers_config = ice_config.get_ice_config()
-    return web.Response(content_type="application/json", text=json.dumps(ice_servers_config, ensure_ascii=False))
+    """返回ICE服务器配置 (按探测结果排序，预先构建，支持 ETag)"""
+    return ice_servers.response(request)
+
+
+async def ready(request):
+    """就绪检查：预热完成前 (或有阶段失败时)、排空期间返回 503"""
+    statistics = warmup.get_statistics()
+    is_ready = (warmup.ready or not StartupConfig.WARMUP_ENABLED) and not drain.draining
+    return web.Response(
+        status=200 if is_ready else 503,
+        content_type="application/json",
+        text=json.dumps(dict(statistics, ready=is_ready, drain=drain.get_statistics()), ensure_ascii=False),
+    )
+
+
+def drain_response(status=200):
+    return web.Response(
+        status=status, content_type="application/json", text=json.dumps(drain.get_statistics(), ensure_ascii=False)
+    )
+
+
+async def drain_status(request):
+    """排空状态：剩余会话数、距期限时间等"""
+    require_admin(request)
+    return drain_response()
+
+
+async def drain_start(request):
+    """
+    进入排空模式
+
+    请求体 (可选): {"deadline": 秒, "exit": 排空结束后是否退出进程}
+    """
+    require_admin(request)
+    params = await request.json() if request.can_read_body else {}
+    try:
+        deadline = float(params["deadline"]) if params.get("deadline") is not None else None
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text="deadline 必须是数字")
+    started = await drain.begin("管理接口", deadline=deadline, exit_when_done=params.get("exit") is True)
+    return drain_response(202 if started else 200)
+
+
+async def drain_cancel(request):
+    """取消排空模式"""
+    require_admin(request)
+    await drain.cancel()
+    return drain_response()
+
+
+async def profile(request):
+    """
+    在线剖析：采样 duration 秒的 CPU 调用栈 (可选同时比较 tracemalloc 快照并统计各会话常驻内存)
+
+    请求体 (可选): {"duration": 秒, "interval_ms": 毫秒, "memory": 是否剖析内存}
+    查询参数 format=folded 时只返回折叠调用栈文本 (可直接交给 flamegraph.pl / speedscope)
+    """
+    require_admin(request)
+    params = await request.json() if request.can_read_body else {}
+    try:
+        duration = float(params.get("duration", ProfileConfig.DEFAULT_DURATION))
+        interval_ms = float(params.get("interval_ms", ProfileConfig.DEFAULT_INTERVAL_MS))
+    except (TypeError, ValueError):
+        raise web.HTTPBadRequest(text="duration / interval_ms 必须是数字")
+    if not 0 < duration <= ProfileConfig.MAX_DURATION:
+        raise web.HTTPBadRequest(text="duration 需在 (0, {}] 秒之间".format(ProfileConfig.MAX_DURATION))
+    interval_ms = max(interval_ms, ProfileConfig.MIN_INTERVAL_MS)
+    memory = params.get("memory") is True
+    if profiler.running:
+        raise web.HTTPConflict(text="已有剖析正在进行")
+
+    logger.warning("开始在线剖析: %.0fs, 间隔 %.0fms, 内存 %s", duration, interval_ms, memory)
+    result = await profiler.profile(
+        duration,
+        interval_ms / 1000,
+        memory=memory,
+        tracemalloc_frames=ProfileConfig.TRACEMALLOC_FRAMES,
+        top_allocations=ProfileConfig.TOP_ALLOCATIONS,
+    )
+    sessions = list(session_manager.sessions.values())
+    result["session_info"] = {
+        s.pc.session_id: {"mac": s.pc.mac_address, "ip": s.pc.client_ip, "state": s.pc.connectionState}
+        for s in sessions
+    }
+    if memory:
+        result["memory"]["retained"] = measure_sessions(
+            {s.pc.session_id: [s.pc, s.xiaozhi] for s in sessions}, ProfileConfig.MAX_WALK_OBJECTS
+        )
+
+    if request.query.get("format") == "folded":
+        return web.Response(content_type="text/plain", text=result["folded"])
+    return web.Response(content_type="application/json", text=json.dumps(result, ensure_ascii=False))
 
 
 async def offer(request):
+    # 预热期间到达的请求等待媒体相关阶段完成 (不等待页面预加载)，避免在事件循环中同步导入与解码
+    await warmup.wait(StartupConfig.OFFER_WAIT_TIMEOUT, phase=MEDIA_WARMUP_PHASE)
+    from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
+
     params = await request.json()
     _offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
 
-    # 使用动态ICE服务器配置
-    ice_servers = ice_config.get_server_ice_servers()
-    configuration = RTCConfiguration(iceServers=ice_servers)
+    # 多节点路由：设备已有会话时交给归属节点，本节点满载时交给负载最低的节点
+    mac_address = params.get("macAddress") or None
+    route = await cluster.route(mac_address, redirected="redirected" in request.query)
+    if route.action == REDIRECT:
+        logger.info("offer 重定向 [%s]: %s", mac_address, route.url)
+        raise web.HTTPTemporaryRedirect(route.url)
+    if route.action == REJECT:
+        logger.warning("节点%s，拒绝 offer [%s]", "排空中" if drain.draining else "满载", mac_address)
+        return web.Response(
+            status=503,
+            headers={"Retry-After": str(cluster.retry_after)},
+            content_type="application/json",
+            text=json.dumps({"error": "服务繁忙，请稍后重试", "retryAfter": cluster.retry_after}, ensure_ascii=False),
+        )
+    if route.replace:
+        await cluster.replace(route.replace)
+
+    # 使用探测排序后的ICE服务器配置 (aiortc 只使用第一个 STUN 服务器)
+    configuration = RTCConfiguration(iceServers=ice_servers.get_server_ice_servers())
     pc = RTCPeerConnection(configuration=configuration)
-    pcs.add(pc)
 
     # Store client IP in the peer connection object
     # 使用改进的IP获取函数
     pc.client_ip = get_client_ip(request)
-    pc.mac_address = params.get("macAddress") or DEFAULT_MAC_ADDR
-
-    await server(pc, _offer)
+    pc.session_id = uuid.uuid4().hex[:12]
+    pc.mac_address = mac_address or DEFAULT_MAC_ADDR
+    pc.record = RecordConfig.should_record(params)
+    # 客户端实际生效的音频处理 (track.getSettings())，用于决定服务端回声消除强度
+    audio_processing = params.get("audioProcessing")
+    pc.audio_processing = audio_processing if isinstance(audio_processing, dict) else None
+    # Live2D 客户端请求服务端口型参数，不再自行分析解码后的音频
+    pc.lipsync = LipSyncConfig.ENABLED and params.get("lipSync") is True
+
+    try:
+        await setup_session(pc, _offer)
+    except Exception:
+        # 建立失败的会话立即回收，不留下半开的连接
+        await session_manager.close(pc, "offer 处理失败")
+        raise
+    # 同一设备只保留一个会话 (未指定 MAC 的客户端共用默认 MAC，不做限制)
+    if mac_address:
+        await cluster.claim(mac_address, pc.session_id)
 
     return web.Response(
         content_type="application/json",
-        text=json.dumps({"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}),
+        text=json.dumps({"sdp": pc.answer_sdp, "type": pc.localDescription.type}),
     )
 
 
 pcs = set()
+session_manager = SessionManager(pcs, **SessionConfig.get_timeout_params())
+cluster = ClusterNode(create_registry(), session_manager, load_monitor, **RegistryConfig.get_node_params())
+drain = DrainController(session_manager, cluster, **DrainConfig.get_drain_params())
+
 
+async def setup_session(pc, offer):
+    from src.recording import SessionRecorder
+    from src.server import XiaoZhiServer
+    from src.track.audio import AudioFaceSwapper
+    from src.track.video import VideoFaceSwapper
 
-async def server(pc, offer):
     # Dictionary to store track instances
 
+    # 此后在该请求中创建的任务 (轨道、后端连接等) 的日志都带有会话字段
+    bind_session(pc.session_id, pc.mac_address, pc.client_ip)
+    # 剖析归属：此后创建的任务 (ICE、DTLS、RTP 收发、后端连接) 都属于该会话
+    attribute(pc.session_id)
     xiaozhi = XiaoZhiServer(pc)
+    session_manager.register(pc, xiaozhi)
+    if pc.record:
+        xiaozhi.recorder = SessionRecorder(
+            RecordConfig.DIRECTORY, pc.mac_address, pc.session_id, RecordConfig.CHUNK_SIZE
+        )
+        logger.info("会话录制: %s %s", pc.mac_address, xiaozhi.recorder.path)
     await xiaozhi.start()
 
     # 监听来自客户端的 DataChannel
@@ -114,9 +290,14 @@ async def server(pc, offer):
 
         @channel.on("message")
         async def on_message(message):
-            logger.info("收到客户端消息 [%s %s]: %s", pc.mac_address, pc.client_ip, message)
-            if xiaozhi.server is None:
-                await xiaozhi.start()
+            logger.info(
+                "收到客户端消息 [%s %s]: %s", pc.mac_address, pc.client_ip, message, extra={"category": "client"}
+            )
+            if xiaozhi.recorder:
+                xiaozhi.recorder.record_event_in(message)
+            xiaozhi.touch_activity()
+            if not await xiaozhi.connect():
+                return
 
             if xiaozhi.server.output_audio_queue:
                 return
@@ -140,48 +321,129 @@ async def server(pc, offer):
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
         logger.info("Connection state is %s %s %s", pc.connectionState, pc.mac_address, pc.client_ip)
-        if pc.connectionState in ["failed", "closed", "disconnected"]:
-            # Stop all AudioFaceSwapper instances
-            if xiaozhi.server:
-                await xiaozhi.server.close()
-            await pc.close()
-            pcs.discard(pc)
+        if pc.connectionState == "connected":
+            session_manager.mark_connected(pc)
+        elif pc.connectionState in ["failed", "closed", "disconnected"]:
+            await session_manager.close(pc, pc.connectionState)
 
     @pc.on("track")
     def on_track(track):
         if track.kind == "audio":
-            t = AudioFaceSwapper(xiaozhi, track)
+            t = AudioFaceSwapper(xiaozhi, track, pc.audio_processing, pc.lipsync)
             pc.addTrack(t)
             # 将 track 实例存储在 pc 对象上
             pc.audio_track = t
         elif track.kind == "video":
             t = VideoFaceSwapper(xiaozhi, track)
             pc.addTrack(t)
+            # 摄像头画面只用于拍照，限制上行码率 (REMB)
+            receiver = next((r for r in pc.getReceivers() if r.track is track), None)
+            if receiver is not None:
+                xiaozhi.video_control.install_estimator(receiver)
             # 将 track 实例存储在 pc 对象上
             pc.video_track = t
 
     await pc.setRemoteDescription(offer)
     answer = await pc.createAnswer()
     await pc.setLocalDescription(answer)
+    # 应答中写入上行视频带宽上限 (b=AS / b=TIAS)
+    pc.answer_sdp = xiaozhi.video_control.answer_sdp(pc.localDescription.sdp)
+
+
+async def warm_imports():
+    return await asyncio.get_running_loop().run_in_executor(None, import_media_modules)
+
+
+async def warm_avatar():
+    from src.track.avatar import load_avatar_images
+
+    images = await asyncio.get_running_loop().run_in_executor(None, load_avatar_images)
+    return {"images": len(images)}
+
+
+async def warm_assets():
+    """预加载页面与常用静态资源，缺少任一文件时预热失败"""
+    count = await page_cache.preload(PAGES) + await static_cache.preload(APP_SHELL)
+    if count != len(PAGES) + len(APP_SHELL):
+        raise RuntimeError("页面或静态资源缺失: 预加载 {}/{} 个".format(count, len(PAGES) + len(APP_SHELL)))
+    return {"assets": count}
+
+
+async def warm_ice():
+    """校验ICE配置并完成首次探测，使第一个会话即可使用排序后的服务器"""
+    details = validate_ice_config(ice_config)
+    if ice_config.probe_enabled and ice_servers.urls:
+        await ice_servers.refresh()
+        details["ranked"] = [ice_servers.describe(url) for url in ice_servers.stun_urls]
+    return details
+
+
+async def warm_codecs_async():
+    """
+    初始化编码器，并检查依赖的 aiortc 私有属性 (缺失时相关功能退回 aiortc 默认行为，不影响就绪)
+    """
+    from src.track.aiortc_internals import check_internals
+
+    details = await asyncio.get_running_loop().run_in_executor(None, warm_codecs)
+    details["aiortc_missing"] = await check_internals()
+    return details
+
+
+# 媒体相关阶段在前，/api/offer 只等待到 MEDIA_WARMUP_PHASE 结束
+warmup.add_phase("imports", warm_imports)
+warmup.add_phase("avatar", warm_avatar)
+warmup.add_phase("codecs", warm_codecs_async)
+warmup.add_phase("ice", warm_ice)
+warmup.add_phase("assets", warm_assets)
+MEDIA_WARMUP_PHASE = "codecs"
+
+
+async def start_mock_backend(app):
+    """XIAOZHI_BACKEND=mock 时，在同一事件循环中启动本地模拟后端"""
+    from src.mock.xiaozhi_backend import MockXiaoZhiBackend
+
+    app["mock_backend"] = MockXiaoZhiBackend()
+    await app["mock_backend"].start()
 
 
-async def on_shutdown(app):
-    # close peer connections
-    coros = [pc.close() for pc in pcs]
-    await asyncio.gather(*coros)
-    pcs.clear()
+async def stop_mock_backend(app):
+    await app["mock_backend"].stop()
 
 
 def run():
     app = web.Application()
-    app.on_shutdown.append(on_shutdown)
+    if StartupConfig.WARMUP_ENABLED:
+        app.on_startup.append(warmup.start)
+        app.on_shutdown.append(warmup.stop)
+    app.on_startup.append(profiler.start)
+    app.on_startup.append(session_manager.start)
+    app.on_startup.append(load_monitor.start)
+    app.on_startup.append(cluster.start)
+    app.on_startup.append(ice_servers.start)
+    if DrainConfig.ON_SIGTERM:
+        app.on_startup.append(drain.start)
+    app.on_shutdown.append(drain.stop)
+    app.on_shutdown.append(session_manager.stop)
+    app.on_shutdown.append(load_monitor.stop)
+    app.on_shutdown.append(ice_servers.stop)
+    # 会话在 on_shutdown 中关闭 (同时注销设备会话)，之后再注销节点
+    app.on_cleanup.append(cluster.stop)
+    if XIAOZHI_BACKEND == "mock":
+        logger.info("使用本地模拟小智后端: %s", OTA_URL)
+        app.on_startup.append(start_mock_backend)
+        app.on_cleanup.append(stop_mock_backend)
 
     app.router.add_get("/", index)
     app.router.add_get("/chat", chat)
     app.router.add_get("/chatv2", chatv2)
 
     app.router.add_get("/api/ice", ice)
+    app.router.add_get("/api/ready", ready)
     app.router.add_post("/api/offer", offer)
-    app.router.add_static("/static/", path=os.path.join(ROOT, "static"), name="static")
+    app.router.add_get("/api/admin/drain", drain_status)
+    app.router.add_post("/api/admin/drain", drain_start)
+    app.router.add_delete("/api/admin/drain", drain_cancel)
+    app.router.add_post("/api/admin/profile", profile)
+    app.router.add_get("/static/{path:.+}", static, name="static")
 
     web.run_app(app, host="0.0.0.0", port=PORT)
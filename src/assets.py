@@ -0,0 +1,233 @@
+"""
+静态资源内存缓存
+Asset Cache - 页面与静态文件的内存缓存、预压缩 (gzip / brotli)、强 ETag 与 304 处理
+"""
+
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+from email.utils import formatdate
+
+from aiohttp import web
+
+from src.config.asset_config import AssetConfig
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+mimetypes.add_type("application/javascript", ".js")
+
+# 已经压缩过的格式，不再尝试预压缩
+INCOMPRESSIBLE_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp", "audio/", "video/")
+
+
+def etag_matches(if_none_match, tags):
+    """If-None-Match 是否命中 tags 中的任一 ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        # If-None-Match 使用弱比较
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in tags:
+            return True
+    return False
+
+
+class Asset:
+    """
+    单个缓存资源：原始内容及其预压缩版本
+    """
+
+    __slots__ = ("body", "content_type", "mtime", "last_modified", "etag", "variants")
+
+    def __init__(self, body, content_type, mtime):
+        self.body = body
+        self.content_type = content_type
+        self.mtime = mtime
+        self.last_modified = formatdate(mtime, usegmt=True)
+
+        # 强 ETag：基于内容摘要，不同编码的表示使用不同的后缀
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        self.etag = '"{}"'.format(digest)
+        self.variants = {}
+        if not content_type.startswith(INCOMPRESSIBLE_TYPES):
+            self._compress(digest)
+
+    def _compress(self, digest):
+        """预计算压缩版本，节省不足时丢弃"""
+        limit = len(self.body) * (1 - AssetConfig.MIN_COMPRESSION_SAVING)
+
+        compressed = gzip.compress(self.body, compresslevel=AssetConfig.GZIP_LEVEL, mtime=0)
+        if len(compressed) <= limit:
+            self.variants["gzip"] = (compressed, '"{}-gz"'.format(digest))
+
+        if brotli is not None:
+            compressed = brotli.compress(self.body, quality=AssetConfig.BROTLI_QUALITY)
+            if len(compressed) <= limit:
+                self.variants["br"] = (compressed, '"{}-br"'.format(digest))
+
+    def representation(self, accept_encoding):
+        """
+        根据 Accept-Encoding 选择表示
+
+        Returns:
+            tuple: (content_encoding 或 None, body, etag)
+        """
+        accepted = parse_accept_encoding(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and encoding in accepted:
+                body, etag = self.variants[encoding]
+                return encoding, body, etag
+        return None, self.body, self.etag
+
+    def matches(self, if_none_match):
+        """If-None-Match 是否命中该资源的任一表示"""
+        return etag_matches(if_none_match, {self.etag} | {etag for _, etag in self.variants.values()})
+
+
+def parse_accept_encoding(header):
+    """解析 Accept-Encoding，返回可接受的编码集合 (忽略 q=0)"""
+    accepted = set()
+    for item in (header or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(name.lower())
+    return accepted
+
+
+class AssetCache:
+    """
+    静态资源缓存
+
+    资源在首次请求时 (或启动预加载时) 于线程池中读取并预压缩，之后直接从内存响应。
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: 资源根目录
+        """
+        self.root = os.path.realpath(root)
+        self.assets = {}
+        self.loading = {}
+
+        # 统计信息
+        self.hits = 0
+        self.not_modified = 0
+
+    def resolve(self, relative_path):
+        """将相对路径解析为根目录下的文件，越界或不存在时返回 None"""
+        path = os.path.realpath(os.path.join(self.root, relative_path))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def _load(self, path):
+        """读取文件并构建 Asset (在线程池中执行)"""
+        with open(path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return Asset(body, content_type, os.path.getmtime(path))
+
+    async def get(self, relative_path):
+        """
+        获取缓存资源，同一资源并发加载时只读取一次
+
+        Returns:
+            Asset: 资源；文件不存在或超过缓存大小上限时返回 None
+        """
+        asset = self.assets.get(relative_path)
+        if asset is not None and not AssetConfig.CHECK_MTIME:
+            return asset
+
+        path = self.resolve(relative_path)
+        if path is None:
+            return None
+        if asset is not None and os.path.getmtime(path) == asset.mtime:
+            return asset
+        if os.path.getsize(path) > AssetConfig.MAX_CACHED_FILE_SIZE:
+            return None
+
+        future = self.loading.get(relative_path)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(None, self._load, path)
+            self.loading[relative_path] = future
+        try:
+            asset = await future
+        finally:
+            self.loading.pop(relative_path, None)
+        self.assets[relative_path] = asset
+        return asset
+
+    async def preload(self, relative_paths):
+        """预加载资源，忽略不存在的文件"""
+        results = await asyncio.gather(*(self.get(p) for p in relative_paths), return_exceptions=True)
+        for relative_path, result in zip(relative_paths, results):
+            if isinstance(result, Exception):
+                logger.warning("预加载资源失败 %s: %s", relative_path, result)
+        return sum(1 for result in results if isinstance(result, Asset))
+
+    async def response(self, request, relative_path, cache_control):
+        """
+        构建资源响应
+
+        Args:
+            request: aiohttp 请求
+            relative_path: 相对根目录的路径
+            cache_control: Cache-Control 头
+
+        Returns:
+            web.StreamResponse: 200 / 304 响应；资源不存在时抛出 HTTPNotFound
+        """
+        asset = await self.get(relative_path)
+        if asset is None:
+            path = self.resolve(relative_path)
+            if path is None:
+                raise web.HTTPNotFound()
+            # 超大文件直接从磁盘发送
+            return web.FileResponse(path, headers={"Cache-Control": cache_control})
+
+        encoding, body, etag = asset.representation(request.headers.get("Accept-Encoding"))
+        headers = {
+            "ETag": etag,
+            "Cache-Control": cache_control,
+            "Last-Modified": asset.last_modified,
+            "Vary": "Accept-Encoding",
+        }
+        if asset.matches(request.headers.get("If-None-Match")):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+
+        self.hits += 1
+        headers["Content-Type"] = asset.content_type
+        if asset.content_type.startswith("text/") or asset.content_type.endswith(("javascript", "json")):
+            headers["Content-Type"] += "; charset=utf-8"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return web.Response(body=body, headers=headers)
+
+    def get_statistics(self):
+        return {
+            "cached_assets": len(self.assets),
+            "cached_bytes": sum(
+                len(a.body) + sum(len(v[0]) for v in a.variants.values()) for a in self.assets.values()
+            ),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+        }
@@ -0,0 +1,159 @@
+"""
+回声消除策略
+AEC Policy - 根据客户端上报的音频处理能力与残余回声测量，为每个会话选择服务端回声消除强度
+"""
+
+import logging
+import math
+from collections import deque
+
+import numpy as np
+
+from src.config.echo_config import EchoConfig
+
+logger = logging.getLogger(__name__)
+
+# 回声消除模式
+AEC_FULL = "full"  # 完整的自适应滤波回声消除
+AEC_LIGHT = "light"  # 仅在远端播放时抑制残余回声
+AEC_BYPASS = "bypass"  # 不做服务端回声消除
+
+AEC_MODES = (AEC_FULL, AEC_LIGHT, AEC_BYPASS)
+
+
+class AecPolicy:
+    """
+    回声消除策略
+
+    客户端明确上报未开启回声消除时，始终使用完整回声消除；否则在累计 probe_seconds 的远端播放后，
+    用麦克风与参考信号 RMS 包络的互相关估计回声延迟，再按该延迟下的电平比估计残余回声，决定 full / light / bypass。
+    """
+
+    def __init__(self, client_audio_processing=None, frame_duration=0.02, **kwargs):
+        """
+        Args:
+            client_audio_processing: 客户端上报的 track.getSettings() 音频处理项 (dict)，未上报为 None
+            frame_duration: 麦克风帧时长 (秒)
+            **kwargs: 覆盖 EchoConfig.get_policy_params() 中的参数
+        """
+        params = EchoConfig.get_policy_params()
+        unknown = set(kwargs) - set(params)
+        if unknown:
+            raise ValueError("未知的回声消除策略参数: {}".format(", ".join(sorted(unknown))))
+        params.update(kwargs)
+
+        self.frame_duration = frame_duration
+        self.probe_frames = int(params["probe_seconds"] / frame_duration)
+        self.max_lag = int(params["max_lag_ms"] / 1000 / frame_duration)
+        self.ref_active_rms = params["ref_active_rms"]
+        self.bypass_echo_db = params["bypass_echo_db"]
+        self.light_echo_db = params["light_echo_db"]
+
+        self.client_echo_cancellation = (client_audio_processing or {}).get("echoCancellation")
+        if self.client_echo_cancellation is False:
+            # 客户端没有回声消除，不需要测量
+            self.mode = AEC_FULL
+            self.decided = True
+        else:
+            # 客户端声明已开启回声消除时，测量期间只做轻量处理
+            self.mode = AEC_LIGHT if self.client_echo_cancellation else AEC_FULL
+            self.decided = False
+
+        # 每个麦克风帧一个 RMS 值；参考信号为两次麦克风帧之间播放的最大 RMS
+        history = self.probe_frames * 4 + self.max_lag
+        self.mic_envelope = deque(maxlen=history)
+        self.ref_envelope = deque(maxlen=history)
+        self.pending_ref_rms = 0.0
+        self.active_frames = 0
+
+        # 测量结果
+        self.echo_db = self.light_echo_db
+        self.correlation = None
+        self.lag_frames = None
+
+    def observe_reference(self, ref_rms):
+        """记录播放给客户端的参考音频 RMS"""
+        if ref_rms > self.pending_ref_rms:
+            self.pending_ref_rms = ref_rms
+
+    def observe_microphone(self, mic_rms):
+        """记录一个麦克风帧的 RMS (回声消除前)，测量完成时切换模式"""
+        ref_rms = self.pending_ref_rms
+        self.pending_ref_rms = 0.0
+        self.mic_envelope.append(mic_rms)
+        self.ref_envelope.append(ref_rms)
+
+        if self.decided:
+            return
+        if ref_rms > self.ref_active_rms:
+            self.active_frames += 1
+        if self.active_frames >= self.probe_frames:
+            self._decide()
+
+    def far_end_level(self):
+        """最近 max_lag 帧内参考信号的最大 RMS，用于估计当前可能的回声电平"""
+        count = min(len(self.ref_envelope), self.max_lag + 1)
+        if count == 0:
+            return 0.0
+        return max(self.ref_envelope[-i] for i in range(1, count + 1))
+
+    def expected_echo_rms(self):
+        """按测得的残余回声电平估计当前麦克风中的回声 RMS"""
+        return self.far_end_level() * 10 ** (self.echo_db / 20)
+
+    def _decide(self):
+        mic = np.asarray(self.mic_envelope, dtype=np.float32)
+        ref = np.asarray(self.ref_envelope, dtype=np.float32)
+
+        # 互相关最大处作为回声延迟
+        best_corr, best_lag = 0.0, 0
+        for lag in range(min(self.max_lag, len(ref) - 2) + 1):
+            r = ref[: len(ref) - lag]
+            m = mic[lag:]
+            if r.std() == 0 or m.std() == 0:
+                continue
+            corr = float(np.corrcoef(r, m)[0, 1])
+            if corr > best_corr:
+                best_corr, best_lag = corr, lag
+
+        # 远端播放帧上麦克风/参考的电平比；取低分位数，排除双讲帧中近端语音的影响
+        r = ref[: len(ref) - best_lag]
+        m = mic[best_lag:]
+        active = r > self.ref_active_rms
+        ratios = m[active] / r[active]
+        ratios = ratios[ratios > 0]
+        if len(ratios):
+            echo_db = 20 * math.log10(float(np.percentile(ratios, 25)))
+        else:
+            echo_db = -120.0
+
+        self.correlation = best_corr
+        self.lag_frames = best_lag
+        self.echo_db = echo_db
+
+        if echo_db < self.bypass_echo_db:
+            self.mode = AEC_BYPASS
+        elif echo_db < self.light_echo_db:
+            self.mode = AEC_LIGHT
+        else:
+            self.mode = AEC_FULL
+        self.decided = True
+        logger.info(
+            "回声消除策略: %s (客户端回声消除=%s, 残余回声=%.1fdB, 相关系数=%.2f, 延迟=%dms)",
+            self.mode,
+            self.client_echo_cancellation,
+            echo_db,
+            best_corr,
+            best_lag * self.frame_duration * 1000,
+        )
+
+    def get_statistics(self):
+        return {
+            "mode": self.mode,
+            "decided": self.decided,
+            "client_echo_cancellation": self.client_echo_cancellation,
+            "echo_db": self.echo_db,
+            "correlation": self.correlation,
+            "lag_frames": self.lag_frames,
+            "probe_progress": min(1.0, self.active_frames / max(1, self.probe_frames)),
+        }
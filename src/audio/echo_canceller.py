@@ -1,15 +1,22 @@
 """
 回声消除器模块
 Echo Cancellation Module
+
+所有逐帧计算都在预分配的 float32 工作缓冲区上原地完成 (ufunc out=)，
+缓冲区按帧长在首次处理时分配，帧长变化时才重新分配。
 """
 
 import time
 from collections import deque
+from itertools import islice
 
 import numpy as np
 
 from src.config.echo_config import EchoConfig
 
+# 参考信号取最近多少段参考音频
+REFERENCE_WINDOW_BLOCKS = 10
+
 
 class EchoCanceller:
     """
@@ -24,15 +31,29 @@ class EchoCanceller:
         buffer_params = EchoConfig.get_buffer_params()
         warmup_params = EchoConfig.get_warmup_params()
         noise_params = EchoConfig.get_noise_gate_params()
+        double_talk_params = EchoConfig.get_double_talk_params()
 
         # 自适应滤波器参数
         self.adaptive_filter_length = adaptive_params["filter_length"]
         self.adaptive_filter = np.zeros(self.adaptive_filter_length)
         self.learning_rate = adaptive_params["learning_rate"]
 
-        # 缓冲区
-        self.echo_buffer = deque(maxlen=buffer_params["echo_buffer_size"])
-        self.input_buffer = deque(maxlen=buffer_params["input_buffer_size"])
+        # 参考信号：最近 adaptive_filter_length 个参考样本 (倒序)，以及最近几段参考音频的长度
+        self.echo_buffer_size = buffer_params["echo_buffer_size"]
+        self.reference_history = np.zeros(self.adaptive_filter_length)
+        self.reference_lengths = deque(maxlen=REFERENCE_WINDOW_BLOCKS)
+        self.reference_blocks = 0
+
+        # 预测回声长度 (参考信号与滤波器 valid 卷积的长度)
+        self.predicted_echo = np.zeros(1)
+        self.gradient = np.zeros(1)
+        self.gradient_float32 = np.zeros(1, dtype=np.float32)
+
+        # 逐帧工作缓冲区，按帧长分配
+        self.frame_size = 0
+        self.work = None
+        self.scratch = None
+        self.output = None
 
         # 预热参数
         self.start_time = time.time()
@@ -44,9 +65,46 @@ class EchoCanceller:
         self.noise_gate_attenuation = noise_params["attenuation"]
         self.gain_factor = EchoConfig.GAIN_FACTOR
 
+        # 远端活动检测：记录每段参考音频的峰值，以及距最近一次远端有声音经过的帧数
+        self.far_end_threshold = double_talk_params["far_end_threshold"]
+        self.far_end_hangover = double_talk_params["far_end_hangover"]
+        self.far_end_peaks = deque(maxlen=buffer_params["echo_buffer_size"])
+        self.frames_since_far_end = self.far_end_hangover + 1
+
+        # Geigel 双讲检测
+        self.geigel_threshold = double_talk_params["geigel_threshold"]
+        self.double_talk_hangover = double_talk_params["double_talk_hangover"]
+        self.double_talk_frames_left = 0
+
+        # 最近一帧的输出能量 (均方值)，供管理器复用
+        self.output_energy = 0.0
+
         # 统计信息
         self.processed_frames = 0
         self.echo_detected_frames = 0
+        self.bypassed_frames = 0
+        self.double_talk_frames = 0
+
+    def _ensure_buffers(self, frame_size):
+        """按帧长分配工作缓冲区"""
+        if frame_size != self.frame_size:
+            self.frame_size = frame_size
+            self.work = np.zeros(frame_size, dtype=np.float32)
+            self.scratch = np.zeros(frame_size, dtype=np.float32)
+            self.output = np.zeros(frame_size, dtype=np.int16)
+
+    @staticmethod
+    def _clip(array, limit):
+        """原地限制到 [-limit, limit]，直接调用 ufunc，避免 np.clip 的包装开销"""
+        np.minimum(array, limit, out=array)
+        np.maximum(array, -limit, out=array)
+
+    @staticmethod
+    def _peak(audio):
+        """峰值绝对值，不创建临时数组"""
+        if len(audio) == 0:
+            return 0.0
+        return max(float(audio.max()), -float(audio.min()))
 
     def add_reference_audio(self, reference_audio):
         """
@@ -55,8 +113,53 @@ class EchoCanceller:
         Args:
             reference_audio: 参考音频数据 (numpy array)
         """
-        if reference_audio is not None:
-            self.echo_buffer.append(reference_audio.copy())
+        if reference_audio is None:
+            return
+
+        # 参考样本倒序存放 (最新的在前)，预测回声即为与滤波器的连续内存点积
+        length = len(reference_audio)
+        history = self.reference_history
+        if length >= len(history):
+            np.copyto(history, reference_audio[: -len(history) - 1 : -1], casting="unsafe")
+        elif length > 0:
+            history[length:] = history[:-length]
+            np.copyto(history[:length], reference_audio[::-1], casting="unsafe")
+        self.reference_lengths.append(length)
+        self.reference_blocks = min(self.reference_blocks + 1, self.echo_buffer_size)
+
+        peak = self._peak(reference_audio)
+        self.far_end_peaks.append(peak)
+        if peak > self.far_end_threshold:
+            self.frames_since_far_end = 0
+
+    @property
+    def far_end_active(self):
+        """远端最近 (含回声拖尾) 是否有声音"""
+        return self.frames_since_far_end <= self.far_end_hangover
+
+    @property
+    def double_talk(self):
+        """当前是否处于双讲 (含拖尾)"""
+        return self.double_talk_frames_left > 0
+
+    def _detect_double_talk(self, input_audio):
+        """
+        Geigel 双讲检测：近端峰值超过 geigel_threshold x 近期参考峰值时判定为双讲
+
+        Args:
+            input_audio: 输入音频数据 (int16)
+        """
+        # 回声拖尾范围内的参考峰值
+        count = min(len(self.far_end_peaks), self.far_end_hangover + 1)
+        far_peak = max(islice(reversed(self.far_end_peaks), count)) if count else 0.0
+        near_peak = self._peak(input_audio)
+
+        if near_peak > self.geigel_threshold * far_peak:
+            self.double_talk_frames_left = self.double_talk_hangover
+        elif self.double_talk_frames_left > 0:
+            self.double_talk_frames_left -= 1
+        if self.double_talk_frames_left > 0:
+            self.double_talk_frames += 1
 
     def process_audio(self, input_audio, reference_audio=None):
         """
@@ -67,7 +170,8 @@ class EchoCanceller:
             reference_audio: 当前的参考音频数据 (numpy array, optional)
 
         Returns:
-            numpy array: 处理后的音频数据
+            numpy array: 处理后的 int16 音频，为内部缓冲区，在下一次调用前有效；
+                远端静音时直接返回 input_audio 本身
         """
         self.processed_frames += 1
 
@@ -75,80 +179,75 @@ class EchoCanceller:
         if reference_audio is not None:
             self.add_reference_audio(reference_audio)
 
+        far_end_active = self.far_end_active
+        self.frames_since_far_end += 1
+        if not far_end_active:
+            # 远端静音 (超过回声拖尾)：麦克风中不会有回声，跳过滤波、噪声门限与预热处理
+            self.bypassed_frames += 1
+            self.double_talk_frames_left = 0
+            return input_audio
+
+        self._detect_double_talk(input_audio)
+
         # 转换为float32进行处理
-        audio_float = input_audio.astype(np.float32)
+        self._ensure_buffers(len(input_audio))
+        work = self.work
+        np.copyto(work, input_audio, casting="unsafe")
 
-        # 执行回声消除
-        cleaned_audio = self._echo_cancellation(audio_float)
+        # 执行回声消除与噪声门限
+        self._echo_cancellation(work)
 
         # 预热期间的特殊处理
-        cleaned_audio = self._warmup_processing(cleaned_audio)
+        self._warmup_processing(work)
 
-        # 转换回int16格式 - 安全的数值转换
-        # 检查数值有效性
-        if not np.all(np.isfinite(cleaned_audio)):
-            # 如果有无效值，用原始音频替代
-            cleaned_audio = np.where(np.isfinite(cleaned_audio), cleaned_audio, input_audio.astype(np.float32))
+        # 检查数值有效性：有无效值时用原始音频替代 (NaN 会使能量为 NaN)
+        energy = float(np.dot(work, work))
+        if not np.isfinite(energy):
+            invalid = ~np.isfinite(work)
+            work[invalid] = input_audio[invalid]
+            energy = float(np.dot(work, work))
 
         # 安全的范围限制和类型转换
-        cleaned_audio_clipped = np.clip(cleaned_audio, -32767, 32767)
-        return cleaned_audio_clipped.astype(np.int16)
+        self._clip(work, 32767)
+        self.output_energy = energy / len(work) if len(work) else 0.0
+        np.copyto(self.output, work, casting="unsafe")
+        return self.output
 
-    def _echo_cancellation(self, input_audio):
+    def _echo_cancellation(self, work):
         """
-        核心回声消除算法
+        核心回声消除算法，原地处理
 
         Args:
-            input_audio: 输入音频数据 (float32)
-
-        Returns:
-            numpy array: 消除回声后的音频数据
+            work: 输入音频数据 (float32 工作缓冲区)
         """
-        if len(self.echo_buffer) == 0:
-            # 没有参考音频时，只进行噪声门限处理
-            return self._noise_gate(input_audio)
-
-        # 获取最近的参考音频
-        ref_data = self._get_reference_signal()
-
-        if len(ref_data) < self.adaptive_filter_length:
-            return self._noise_gate(input_audio)
+        if self.reference_blocks == 0 or sum(self.reference_lengths) < self.adaptive_filter_length:
+            # 没有 (足够的) 参考音频时，只进行噪声门限处理
+            self._noise_gate(work)
+            return
 
-        # 截取适当长度的参考信号
-        ref_signal = ref_data[-self.adaptive_filter_length :]
+        # 计算预测的回声：参考信号与滤波器的 valid 卷积
+        self.predicted_echo[0] = np.dot(self.reference_history, self.adaptive_filter)
 
-        # 计算预测的回声
-        predicted_echo = np.convolve(ref_signal, self.adaptive_filter, mode="valid")
-
-        # 确保长度匹配并执行回声消除
-        cleaned_audio = self._subtract_echo(input_audio, predicted_echo, ref_signal)
+        # 执行回声消除
+        self._subtract_echo(work)
 
         # 应用噪声门限
-        return self._noise_gate(cleaned_audio)
+        self._noise_gate(work)
 
-    def _get_reference_signal(self):
-        """获取参考信号"""
-        if len(self.echo_buffer) >= 10:
-            return np.concatenate(list(self.echo_buffer)[-10:])
-        else:
-            return np.concatenate(list(self.echo_buffer))
-
-    def _subtract_echo(self, input_audio, predicted_echo, ref_signal):
+    def _subtract_echo(self, work):
         """执行回声减法和滤波器更新"""
-        min_len = min(len(input_audio), len(predicted_echo))
+        min_len = min(len(work), len(self.predicted_echo))
         if min_len <= 0:
-            return input_audio
+            return
 
         # 回声减法 - 使用更保守的方法
-        input_segment = input_audio[:min_len]
-        echo_segment = predicted_echo[:min_len]
-
-        # 计算输入信号的能量 - 使用安全的计算方式防止溢出
-        input_segment_float = input_segment.astype(np.float64)
-        echo_segment_float = echo_segment.astype(np.float64)
+        input_segment = work[:min_len]
+        echo_segment = self.predicted_echo[:min_len]
 
-        input_energy = np.mean(input_segment_float**2)
-        echo_energy = np.mean(echo_segment_float**2)
+        # 计算输入信号的能量
+        input_energy = float(np.dot(input_segment, input_segment)) / min_len
+        echo_energy = float(np.dot(echo_segment, echo_segment)) / min_len
+        input_magnitude = float(np.abs(input_segment, out=self.scratch[:min_len]).sum()) / min_len
 
         # 检查数值有效性
         if not np.isfinite(input_energy):
@@ -156,59 +255,46 @@ class EchoCanceller:
         if not np.isfinite(echo_energy):
             echo_energy = 0.0
 
-        # 如果预测的回声能量过高，可能是误判，减少回声消除强度
-        if echo_energy > input_energy * 0.8:
-            # 只消除部分回声，保留原始信号
-            echo_reduction_factor = 0.3  # 只消除30%的预测回声
-            cleaned_audio = input_segment - echo_segment * echo_reduction_factor
-        else:
-            # 正常回声消除，但仍然保守
-            echo_reduction_factor = 0.7  # 消除70%的预测回声
-            cleaned_audio = input_segment - echo_segment * echo_reduction_factor
-
-        # 更新自适应滤波器 (LMS算法) - 使用安全的数值计算
-        if len(ref_signal) >= len(input_segment):
-            error = cleaned_audio.astype(np.float64)  # 转换为float64防止溢出
-            ref_segment = ref_signal[: len(error)].astype(np.float64)
+        # 如果预测的回声能量过高，可能是误判，只消除30%的预测回声；否则消除70%
+        echo_reduction_factor = 0.3 if echo_energy > input_energy * 0.8 else 0.7
+        np.multiply(echo_segment, echo_reduction_factor, out=self.scratch[:min_len], casting="unsafe")
+        np.subtract(input_segment, self.scratch[:min_len], out=input_segment)
+        error = input_segment
 
-            # 计算梯度并更新滤波器
-            if len(error) <= len(self.adaptive_filter):
-                # 计算梯度，添加数值稳定性检查
-                gradient = self.learning_rate * error * ref_segment[: len(error)]
+        # 更新自适应滤波器 (LMS算法)；双讲期间冻结，避免近端语音使滤波器发散
+        if len(self.reference_history) >= min_len and not self.double_talk:
+            if min_len <= len(self.adaptive_filter):
+                gradient = self.gradient[:min_len]
+                # 参考信号最早的 min_len 个样本
+                np.multiply(error, self.reference_history[: -min_len - 1 : -1], out=gradient)
+                gradient *= self.learning_rate
 
                 # 检查梯度的有效性
-                if np.all(np.isfinite(gradient)):
+                if np.isfinite(gradient.sum()):
                     # 限制梯度大小，防止过大的更新
-                    gradient = np.clip(gradient, -1000, 1000)
-                    self.adaptive_filter[: len(error)] += gradient.astype(np.float32)
+                    self._clip(gradient, 1000)
+                    np.copyto(self.gradient_float32[:min_len], gradient, casting="unsafe")
+                    self.adaptive_filter[:min_len] += self.gradient_float32[:min_len]
 
                     # 限制滤波器系数的范围，防止发散
-                    self.adaptive_filter = np.clip(self.adaptive_filter, -10, 10)
+                    self._clip(self.adaptive_filter, 10)
 
                 # 统计回声检测
-                if np.mean(np.abs(error)) < np.mean(np.abs(input_segment)) * 0.8:
+                error_magnitude = float(np.abs(error, out=self.scratch[:min_len]).sum()) / min_len
+                if error_magnitude < input_magnitude * 0.8:
                     self.echo_detected_frames += 1
 
-        # 填充到原始长度
-        if len(cleaned_audio) < len(input_audio):
-            padding = np.zeros(len(input_audio) - len(cleaned_audio))
-            cleaned_audio = np.concatenate([cleaned_audio, padding])
-
-        return cleaned_audio[: len(input_audio)]
+        # 预测回声之外的部分填充为 0
+        work[min_len:] = 0
 
-    def _noise_gate(self, audio_data):
+    def _noise_gate(self, work):
         """
-        噪声门限处理 - 使用安全的数值计算
+        噪声门限处理，原地处理
 
         Args:
-            audio_data: 音频数据
-
-        Returns:
-            numpy array: 处理后的音频数据
+            work: 音频数据 (float32 工作缓冲区)
         """
-        # 计算音频的RMS值 - 使用float64防止溢出
-        audio_float64 = audio_data.astype(np.float64)
-        rms = np.sqrt(np.mean(audio_float64**2))
+        rms = np.sqrt(float(np.dot(work, work)) / len(work)) if len(work) else 0.0
 
         # 检查RMS值的有效性
         if not np.isfinite(rms):
@@ -216,32 +302,27 @@ class EchoCanceller:
 
         if rms < self.noise_gate_threshold:
             # 低于噪声门限时，使用配置的衰减系数
-            result = audio_data * self.noise_gate_attenuation
+            work *= self.noise_gate_attenuation
         else:
             # 高于门限时，正常处理
-            result = audio_data * self.gain_factor
+            work *= self.gain_factor
 
         # 确保结果在有效范围内
-        return np.clip(result, -32767, 32767)
+        self._clip(work, 32767)
 
-    def _warmup_processing(self, input_audio):
+    def _warmup_processing(self, work):
         """
-        预热期间的特殊处理
+        预热期间的特殊处理，原地处理
 
         Args:
-            input_audio: 输入音频数据
-
-        Returns:
-            numpy array: 处理后的音频数据
+            work: 音频数据 (float32 工作缓冲区)
         """
         elapsed_time = time.time() - self.start_time
 
         if elapsed_time < self.warmup_duration:
             # 预热期间，逐渐增加增益
             warmup_gain = elapsed_time / self.warmup_duration
-            return input_audio * warmup_gain * self.warmup_gain_factor
-
-        return input_audio
+            work *= warmup_gain * self.warmup_gain_factor
 
     def get_statistics(self):
         """
@@ -258,16 +339,26 @@ class EchoCanceller:
             "processed_frames": self.processed_frames,
             "echo_detected_frames": self.echo_detected_frames,
             "echo_detection_rate": echo_detection_rate,
+            "bypassed_frames": self.bypassed_frames,
+            "bypass_rate": self.bypassed_frames / max(1, self.processed_frames),
+            "double_talk_frames": self.double_talk_frames,
+            "far_end_active": self.far_end_active,
             "warmup_completed": time.time() - self.start_time > self.warmup_duration,
-            "buffer_size": len(self.echo_buffer),
+            "buffer_size": self.reference_blocks,
             "filter_coefficients_norm": np.linalg.norm(self.adaptive_filter),
         }
 
     def reset(self):
         """重置回声消除器状态"""
-        self.adaptive_filter = np.zeros(self.adaptive_filter_length)
-        self.echo_buffer.clear()
-        self.input_buffer.clear()
+        self.adaptive_filter[:] = 0
+        self.reference_history[:] = 0
+        self.reference_lengths.clear()
+        self.reference_blocks = 0
         self.start_time = time.time()
+        self.far_end_peaks.clear()
+        self.frames_since_far_end = self.far_end_hangover + 1
+        self.double_talk_frames_left = 0
         self.processed_frames = 0
         self.echo_detected_frames = 0
+        self.bypassed_frames = 0
+        self.double_talk_frames = 0
@@ -1,12 +1,21 @@
 """
 回声消除管理器
 Echo Cancellation Manager - 统一管理回声消除逻辑
+
+逐帧处理在预分配的 float32 缓冲区上原地完成，每帧的原始音频能量只计算一次并在
+策略、安全检查与调试输出之间共享。完整回声消除路径上的每帧临时内存分配不超过
+FRAME_ALLOCATION_BUDGET 字节 (只允许标量与数组视图等小对象，不允许与帧长成正比的临时数组)，
+由 `python -m benchmarks.aec_bench --check-budget` 检查。
 """
 
 import numpy as np
 
+from src.audio.aec_policy import AEC_BYPASS, AEC_FULL, AEC_LIGHT
 from src.audio.echo_canceller import EchoCanceller
 
+# 每帧临时内存分配预算 (字节)
+FRAME_ALLOCATION_BUDGET = 2048
+
 
 class EchoCancellationManager:
     """
@@ -18,16 +27,18 @@ class EchoCancellationManager:
     - 自适应参数调整
     """
 
-    def __init__(self, enable_echo_cancellation=True, enable_debug=False):
+    def __init__(self, enable_echo_cancellation=True, enable_debug=False, policy=None):
         """
         初始化回声消除管理器
 
         Args:
             enable_echo_cancellation: 是否启用回声消除
             enable_debug: 是否启用调试信息
+            policy: 回声消除策略 (AecPolicy)，为 None 时始终执行完整回声消除
         """
         self.enable_echo_cancellation = enable_echo_cancellation
         self.enable_debug = enable_debug
+        self.policy = policy
 
         # 初始化回声消除器
         self.echo_canceller = EchoCanceller()
@@ -35,9 +46,18 @@ class EchoCancellationManager:
         # 参考信号存储
         self.reference_audio = None
 
+        # 预分配的工作缓冲区 (按帧长分配，帧长变化时重新分配)
+        self.buffers = {}
+        self.output = None
+        self.silence = np.zeros(960, dtype=np.int16)
+        self.frame_input_energy = None
+
         # 统计信息
         self.frame_count = 0
         self.over_suppression_count = 0
+        self.policy_bypassed_frames = 0
+        self.light_frames = 0
+        self.residual_suppressed_frames = 0
 
         # 安全检查参数
         self.min_energy_ratio = 0.1  # 最小能量比例，防止过度抑制
@@ -47,6 +67,28 @@ class EchoCancellationManager:
         # 调试参数
         self.debug_interval = 200  # 调试信息输出间隔（帧数）
 
+    def _buffer(self, name, size):
+        """获取按长度预分配的 float32 工作缓冲区"""
+        buffer = self.buffers.get(name)
+        if buffer is None or len(buffer) != size:
+            buffer = self.buffers[name] = np.zeros(size, dtype=np.float32)
+        return buffer
+
+    def _energy(self, audio, name="scratch"):
+        """均方能量：先转换到 float32 工作缓冲区，再用点积计算"""
+        if len(audio) == 0:
+            return 0.0
+        buffer = self._buffer(name, len(audio))
+        np.copyto(buffer, audio, casting="unsafe")
+        energy = float(np.dot(buffer, buffer)) / len(buffer)
+        return energy if np.isfinite(energy) else 0.0
+
+    def _input_energy(self, input_audio):
+        """当前麦克风帧的能量，每帧只计算一次，float32 副本保留在 input 缓冲区中"""
+        if self.frame_input_energy is None:
+            self.frame_input_energy = self._energy(input_audio, "input")
+        return self.frame_input_energy
+
     def update_reference_audio(self, reference_samples):
         """
         更新参考音频信号
@@ -63,13 +105,19 @@ class EchoCancellationManager:
                 # self._log_debug("参考音频为空，跳过更新")
                 return
 
-            # 检查数值有效性
-            if not np.all(np.isfinite(reference_samples)):
+            # 检查数值有效性 (整数音频总是有效的)
+            if reference_samples.dtype.kind == "f" and not np.isfinite(reference_samples.sum()):
                 # self._log_debug("参考音频包含无效值，进行清理")
                 reference_samples = np.where(np.isfinite(reference_samples), reference_samples, 0)
 
-            self.reference_audio = reference_samples.copy()
-            # 同时添加到回声消除器的缓冲区
+            if self.policy is not None:
+                self.policy.observe_reference(np.sqrt(self._energy(reference_samples, "reference")))
+                if self.policy.mode != AEC_FULL:
+                    # 轻量 / 旁路模式不需要自适应滤波器的参考缓冲
+                    return
+
+            # 回声消除器会把参考音频复制到自己的缓冲区，这里只保留引用
+            self.reference_audio = reference_samples
             self.echo_canceller.add_reference_audio(reference_samples)
 
         except Exception as e:
@@ -84,33 +132,49 @@ class EchoCancellationManager:
             input_audio: 麦克风输入的音频数据 (numpy array, int16)
 
         Returns:
-            numpy array: 处理后的音频数据 (int16)
+            numpy array: 处理后的音频数据 (int16)；可能是 input_audio 本身或内部缓冲区，在下一次调用前有效
         """
         self.frame_count += 1
+        self.frame_input_energy = None
 
         # 输入验证
         if input_audio is None or len(input_audio) == 0:
             self._log_debug(f"Frame {self.frame_count}: 输入音频为空")
-            return np.zeros(960, dtype=np.int16)  # 返回静音帧
+            return self.silence  # 返回静音帧
 
-        # 检查输入音频的数值有效性
-        if not np.all(np.isfinite(input_audio)):
+        # 检查输入音频的数值有效性 (整数音频总是有效的)
+        if input_audio.dtype.kind == "f" and not np.isfinite(input_audio.sum()):
             self._log_debug(f"Frame {self.frame_count}: 输入音频包含无效值，使用零填充")
             input_audio = np.where(np.isfinite(input_audio), input_audio, 0)
 
+        if self.policy is not None and self.enable_echo_cancellation:
+            mic_rms = np.sqrt(self._input_energy(input_audio))
+            self.policy.observe_microphone(mic_rms)
+            if self.policy.mode == AEC_BYPASS:
+                self.policy_bypassed_frames += 1
+                return input_audio
+            if self.policy.mode == AEC_LIGHT:
+                self.light_frames += 1
+                return self._suppress_residual_echo(input_audio, mic_rms)
+
         # 如果回声消除未启用或没有参考信号，直接返回原始音频
         if not self.enable_echo_cancellation or self.reference_audio is None:
             # self._log_debug(f"Frame {self.frame_count}: 回声消除未启用或无参考信号")
             return input_audio
 
         # 执行回声消除 - 添加异常处理
+        # 参考音频已在 update_reference_audio 中加入回声消除器缓冲区，这里不再重复添加
         try:
-            cleaned_audio = self.echo_canceller.process_audio(input_audio, reference_audio=self.reference_audio)
+            cleaned_audio = self.echo_canceller.process_audio(input_audio)
         except Exception as e:
             self._log_debug(f"Frame {self.frame_count}: 回声消除处理失败: {e}")
             # 回声消除失败时，返回原始音频
             return input_audio
 
+        if cleaned_audio is input_audio:
+            # 远端静音，回声消除器未做处理，无需安全检查
+            return input_audio
+
         # 安全检查和后处理
         try:
             final_audio = self._safety_check_and_mix(input_audio, cleaned_audio)
@@ -124,6 +188,34 @@ class EchoCancellationManager:
 
         return final_audio
 
+    def _output_buffer(self, size):
+        """int16 输出缓冲区"""
+        if self.output is None or len(self.output) != size:
+            self.output = np.zeros(size, dtype=np.int16)
+        return self.output
+
+    def _suppress_residual_echo(self, input_audio, mic_rms):
+        """
+        轻量模式：远端播放期间，电平不超过预计残余回声的帧按噪声门限系数衰减
+
+        Args:
+            input_audio: 原始音频 (int16)
+            mic_rms: 原始音频 RMS
+
+        Returns:
+            numpy array: 处理后的音频 (int16)
+        """
+        expected_echo = self.policy.expected_echo_rms()
+        if expected_echo > 0 and mic_rms < expected_echo * 2:
+            self.residual_suppressed_frames += 1
+            # input 缓冲区中已有本帧的 float32 副本
+            work = self._buffer("input", len(input_audio))
+            work *= self.echo_canceller.noise_gate_attenuation
+            output = self._output_buffer(len(input_audio))
+            np.copyto(output, work, casting="unsafe")
+            return output
+        return input_audio
+
     def _safety_check_and_mix(self, original_audio, cleaned_audio):
         """
         安全检查和音频混合
@@ -135,18 +227,12 @@ class EchoCancellationManager:
         Returns:
             numpy array: 最终处理后的音频
         """
-        # 计算音频能量 - 使用安全的数值计算
-        original_float64 = original_audio.astype(np.float64)
-        cleaned_float64 = cleaned_audio.astype(np.float64)
-
-        original_rms = np.sqrt(np.mean(original_float64**2))
-        cleaned_rms = np.sqrt(np.mean(cleaned_float64**2))
-
-        # 检查RMS值的有效性
-        if not np.isfinite(original_rms):
-            original_rms = 0.0
-        if not np.isfinite(cleaned_rms):
-            cleaned_rms = 0.0
+        # 计算音频能量：原始音频每帧只算一次，回声消除器输出的能量由其直接提供
+        original_rms = np.sqrt(self._input_energy(original_audio))
+        if cleaned_audio is self.echo_canceller.output:
+            cleaned_rms = np.sqrt(self.echo_canceller.output_energy)
+        else:
+            cleaned_rms = np.sqrt(self._energy(cleaned_audio))
 
         # 检查是否过度抑制
         if cleaned_rms < original_rms * self.min_energy_ratio and original_rms > self.min_original_rms:
@@ -167,7 +253,7 @@ class EchoCancellationManager:
 
     def _mix_audio(self, original_audio, processed_audio, original_ratio):
         """
-        混合原始音频和处理后的音频
+        混合原始音频和处理后的音频，在工作缓冲区中原地完成
 
         Args:
             original_audio: 原始音频
@@ -175,13 +261,22 @@ class EchoCancellationManager:
             original_ratio: 原始音频的混合比例
 
         Returns:
-            numpy array: 混合后的音频
+            numpy array: 混合后的音频 (int16 输出缓冲区)
         """
         processed_ratio = 1.0 - original_ratio
-        mixed_audio = (
-            original_audio.astype(np.float32) * original_ratio + processed_audio.astype(np.float32) * processed_ratio
-        )
-        return mixed_audio.astype(np.int16)
+        size = len(original_audio)
+        mixed = self._buffer("mix", size)
+        scratch = self._buffer("scratch", size)
+
+        np.copyto(mixed, original_audio, casting="unsafe")
+        mixed *= original_ratio
+        np.copyto(scratch, processed_audio, casting="unsafe")
+        scratch *= processed_ratio
+        mixed += scratch
+
+        output = self._output_buffer(size)
+        np.copyto(output, mixed, casting="unsafe")
+        return output
 
     def _output_debug_info(self, original_audio, cleaned_audio, final_audio):
         """
@@ -195,9 +290,9 @@ class EchoCancellationManager:
         if not self.enable_debug or self.frame_count % self.debug_interval != 0:
             return
 
-        original_rms = np.sqrt(np.mean(original_audio.astype(np.float32) ** 2))
-        cleaned_rms = np.sqrt(np.mean(cleaned_audio.astype(np.float32) ** 2))
-        final_rms = np.sqrt(np.mean(final_audio.astype(np.float32) ** 2))
+        original_rms = np.sqrt(self._input_energy(original_audio))
+        cleaned_rms = np.sqrt(self._energy(cleaned_audio))
+        final_rms = np.sqrt(self._energy(final_audio))
 
         ratio = cleaned_rms / original_rms if original_rms > 0 else 0
 
@@ -236,8 +331,12 @@ class EchoCancellationManager:
                 "over_suppression_rate": self.over_suppression_count / max(1, self.frame_count),
                 "echo_cancellation_enabled": self.enable_echo_cancellation,
                 "has_reference_audio": self.reference_audio is not None,
+                "policy_bypassed_frames": self.policy_bypassed_frames,
+                "light_frames": self.light_frames,
+                "residual_suppressed_frames": self.residual_suppressed_frames,
             },
             "echo_canceller_stats": echo_stats,
+            "policy_stats": self.policy.get_statistics() if self.policy is not None else None,
         }
 
     def reset(self):
@@ -246,6 +345,9 @@ class EchoCancellationManager:
         self.reference_audio = None
         self.frame_count = 0
         self.over_suppression_count = 0
+        self.policy_bypassed_frames = 0
+        self.light_frames = 0
+        self.residual_suppressed_frames = 0
 
     def set_parameters(self, **kwargs):
         """
@@ -0,0 +1,105 @@
+"""
+服务端口型分析
+Lip Sync Analyzer - 对下行 TTS 音频逐帧计算张嘴程度 (RMS 包络) 与粗粒度口型，代替客户端自行分析解码后的音频
+
+一个音频块的所有帧一次性向量化计算：RMS、加窗 FFT 后的低频 / 高频能量占比，再按门限分类。
+"""
+
+import logging
+
+import numpy as np
+
+from src.config.lipsync_config import LipSyncConfig
+
+logger = logging.getLogger(__name__)
+
+# 口型编码，每帧一个字符："-" 为静音 (闭嘴)
+VISEMES = "-aiueo"
+VISEME_SILENCE, VISEME_A, VISEME_I, VISEME_U, VISEME_E, VISEME_O = range(len(VISEMES))
+
+# 频带划分 (Hz)
+VOICE_BAND = (80, 8000)
+LOW_BAND = (80, 800)
+HIGH_BAND = (2500, 8000)
+
+
+class LipSyncAnalyzer:
+    """
+    逐帧口型分析器 (单声道 int16 PCM)
+    """
+
+    def __init__(self, sample_rate=48000, frame_samples=960, **kwargs):
+        """
+        Args:
+            sample_rate: 采样率
+            frame_samples: 每帧采样数
+            **kwargs: 覆盖 LipSyncConfig.get_analyzer_params() 中的参数
+        """
+        params = LipSyncConfig.get_analyzer_params()
+        unknown = set(kwargs) - set(params)
+        if unknown:
+            raise ValueError("未知的口型分析参数: {}".format(", ".join(sorted(unknown))))
+        params.update(kwargs)
+        if not params["silence_dbfs"] < params["full_open_dbfs"]:
+            raise ValueError("电平范围需满足 silence_dbfs < full_open_dbfs")
+        self.params = params
+
+        self.sample_rate = sample_rate
+        self.frame_samples = frame_samples
+        self.window = np.hanning(frame_samples).astype(np.float32)
+        freqs = np.fft.rfftfreq(frame_samples, 1 / sample_rate)
+        self.voice_band = (freqs >= VOICE_BAND[0]) & (freqs < VOICE_BAND[1])
+        self.low_band = (freqs >= LOW_BAND[0]) & (freqs < LOW_BAND[1])
+        self.high_band = (freqs >= HIGH_BAND[0]) & (freqs < HIGH_BAND[1])
+
+        # int16 满幅为 0 dBFS
+        self.silence_rms = 32768 * 10 ** (params["silence_dbfs"] / 20)
+        self.db_range = params["full_open_dbfs"] - params["silence_dbfs"]
+
+        # 统计信息
+        self.frames = 0
+        self.silent_frames = 0
+
+    def analyze(self, samples):
+        """
+        分析一段音频，不足一帧的尾部忽略
+
+        Args:
+            samples: int16 PCM (numpy 数组)
+
+        Returns:
+            tuple: (每帧张嘴程度 0-100 的 list, 每帧口型字符组成的 str)
+        """
+        count = len(samples) // self.frame_samples
+        if count == 0:
+            return [], ""
+
+        frames = samples[: count * self.frame_samples].reshape(count, self.frame_samples).astype(np.float32)
+        rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / self.frame_samples)
+
+        # 张嘴程度：RMS 电平 (dBFS) 在 [silence, full_open] 区间内线性映射到 [0, 1]
+        level = 20 * np.log10(np.maximum(rms, 1.0) / 32768)
+        openness = np.clip((level - self.params["silence_dbfs"]) / self.db_range, 0.0, 1.0)
+
+        # 低频 / 高频能量占比
+        power = np.abs(np.fft.rfft(frames * self.window, axis=1)) ** 2
+        voice = power[:, self.voice_band].sum(axis=1) + 1e-9
+        low_share = power[:, self.low_band].sum(axis=1) / voice
+        high_share = power[:, self.high_band].sum(axis=1) / voice
+
+        wide = openness >= self.params["wide_open"]
+        classes = np.full(count, VISEME_A, dtype=np.int8)
+        spread = high_share >= self.params["spread_share"]
+        classes[spread] = np.where(wide[spread], VISEME_E, VISEME_I)
+        rounded = low_share >= self.params["round_share"]
+        classes[rounded] = np.where(wide[rounded], VISEME_O, VISEME_U)
+        silent = rms < self.silence_rms
+        classes[silent] = VISEME_SILENCE
+        openness[silent] = 0.0
+
+        self.frames += count
+        self.silent_frames += int(silent.sum())
+        return np.rint(openness * 100).astype(np.int32).tolist(), "".join(VISEMES[c] for c in classes)
+
+    def get_statistics(self):
+        return {"frames": self.frames, "silent_frames": self.silent_frames}
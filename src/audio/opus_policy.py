@@ -0,0 +1,118 @@
+"""
+下行 Opus 编码策略
+Opus Policy - 根据 RTCP 接收报告 (丢包、抖动、往返时延) 与服务端负载，在配置范围内选择码率、复杂度与帧长
+"""
+
+import logging
+
+from src.config.opus_config import OpusConfig
+
+logger = logging.getLogger(__name__)
+
+
+class OpusPolicy:
+    """
+    下行 Opus 编码策略
+
+    - 码率：丢包或抖动超过门限时按比例降低，网络良好时线性恢复 (AIMD)
+    - 预期丢包率：按平滑后的丢包率告知编码器，开启带内 FEC
+    - 复杂度：服务端事件循环延迟或 CPU 过高时降低，负载恢复后逐步提高
+    - 帧长：复杂度已降到最低仍过载时使用最长帧减少包数；码率已到下限仍拥塞或往返时延过高时使用第二档 (40ms)
+      降低包头开销；网络正常且负载恢复后回到最短帧
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Args:
+            **kwargs: 覆盖 OpusConfig.get_policy_params() 中的参数
+        """
+        params = OpusConfig.get_policy_params()
+        unknown = set(kwargs) - set(params)
+        if unknown:
+            raise ValueError("未知的 Opus 编码策略参数: {}".format(", ".join(sorted(unknown))))
+        params.update(kwargs)
+        if not params["min_bitrate"] <= params["max_bitrate"]:
+            raise ValueError("码率范围需满足 min_bitrate <= max_bitrate")
+        if not params["min_complexity"] <= params["max_complexity"]:
+            raise ValueError("复杂度范围需满足 min_complexity <= max_complexity")
+        self.params = params
+
+        self.bitrate = params["max_bitrate"]
+        self.complexity = params["max_complexity"]
+        self.frame_duration = params["frame_durations"][0]
+        self.loss = 0.0
+
+        # 统计信息
+        self.updates = 0
+        self.changes = 0
+
+    @property
+    def settings(self):
+        """当前编码参数 (AdaptiveOpusEncoder.configure 的参数)"""
+        return {
+            "bitrate": self.bitrate,
+            "complexity": self.complexity,
+            "frame_duration": self.frame_duration,
+            # 按 5% 取整，避免平滑值的细微变化导致编码器频繁重建
+            "packet_loss": min(self.params["max_packet_loss"], int(round(self.loss * 20)) * 5),
+        }
+
+    def update(self, loss=None, jitter=None, rtt=None, loop_lag=0.0, cpu=0.0):
+        """
+        按最新的测量值更新编码参数
+
+        Args:
+            loss: 最近一个接收报告周期的丢包率 (0-1)，尚未收到报告时为 None
+            jitter: 到达间隔抖动 (秒)
+            rtt: 往返时延 (秒)
+            loop_lag: 事件循环延迟 (秒)
+            cpu: 进程 CPU 占用 (占全部核心的比例)
+
+        Returns:
+            dict: 编码参数
+        """
+        p = self.params
+        previous = self.settings
+        self.updates += 1
+
+        congested = False
+        if loss is not None:
+            self.loss = 0.7 * self.loss + 0.3 * loss
+            congested = loss >= p["loss_high"] or (jitter or 0) >= p["jitter_high"]
+            if congested:
+                self.bitrate = max(p["min_bitrate"], int(self.bitrate * p["bitrate_decrease_factor"]))
+            elif loss <= p["loss_low"]:
+                self.bitrate = min(p["max_bitrate"], self.bitrate + p["bitrate_increase_step"])
+
+        overloaded = loop_lag >= p["loop_lag_high"] or cpu >= p["cpu_high"]
+        relaxed = loop_lag <= p["loop_lag_low"] and cpu <= p["cpu_low"]
+        if overloaded:
+            self.complexity = max(p["min_complexity"], self.complexity - 2)
+        elif relaxed:
+            self.complexity = min(p["max_complexity"], self.complexity + 1)
+
+        durations = p["frame_durations"]
+        slow_link = (congested and self.bitrate == p["min_bitrate"]) or (rtt or 0) >= p["rtt_high"]
+        if overloaded and self.complexity == p["min_complexity"]:
+            self.frame_duration = durations[-1]
+        elif slow_link:
+            self.frame_duration = durations[min(1, len(durations) - 1)]
+        elif relaxed:
+            self.frame_duration = durations[0]
+
+        settings = self.settings
+        if settings != previous:
+            self.changes += 1
+            logger.debug(
+                "Opus 编码参数: %s (丢包=%s, 抖动=%s, 往返时延=%s, 循环延迟=%.3fs, CPU=%.0f%%)",
+                settings,
+                loss,
+                jitter,
+                rtt,
+                loop_lag,
+                cpu * 100,
+            )
+        return settings
+
+    def get_statistics(self):
+        return dict(self.settings, loss=self.loss, updates=self.updates, changes=self.changes)
@@ -0,0 +1,204 @@
+"""
+下行音频队列
+Output Audio Queue - 有界、按字节/时长记账的 TTS 音频队列，积压时向后端读取方施加背压
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from src.config.output_queue_config import OutputQueueConfig
+
+logger = logging.getLogger(__name__)
+
+
+class AudioBudget:
+    """
+    所有会话共享的下行音频内存预算
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.peak_bytes = 0
+        # 等待预算释放的队列事件
+        self.waiters = set()
+
+    @property
+    def exhausted(self):
+        return self.bytes >= self.max_bytes
+
+    def acquire(self, nbytes):
+        self.bytes += nbytes
+        if self.bytes > self.peak_bytes:
+            self.peak_bytes = self.bytes
+
+    def release(self, nbytes):
+        self.bytes -= nbytes
+        if self.waiters and not self.exhausted:
+            for event in self.waiters:
+                event.set()
+
+    def get_statistics(self):
+        return {
+            "bytes": self.bytes,
+            "peak_bytes": self.peak_bytes,
+            "max_bytes": self.max_bytes,
+            "waiting_sessions": len(self.waiters),
+        }
+
+
+global_budget = AudioBudget(OutputQueueConfig.GLOBAL_MAX_BYTES)
+
+
+class BoundedAudioQueue:
+    """
+    有界下行音频队列，可替换 XiaoZhiWebsocket.output_audio_queue (deque)
+
+    - append / extend / popleft / clear / len 与 deque 用法一致
+    - 超过 max_ms 时按溢出策略丢弃帧
+    - 超过 high_water_ms 或全局预算耗尽时，wait_for_space() 阻塞，直到降到 low_water_ms 以下
+    """
+
+    def __init__(
+        self,
+        sample_rate=OutputQueueConfig.SAMPLE_RATE,
+        high_water_ms=OutputQueueConfig.HIGH_WATER_MS,
+        low_water_ms=OutputQueueConfig.LOW_WATER_MS,
+        max_ms=OutputQueueConfig.MAX_MS,
+        overflow_policy=OutputQueueConfig.OVERFLOW_POLICY,
+        budget=None,
+    ):
+        """
+        Args:
+            sample_rate: 队列中 PCM 的采样率
+            high_water_ms: 背压高水位 (毫秒)
+            low_water_ms: 背压解除水位 (毫秒)
+            max_ms: 硬上限 (毫秒)
+            overflow_policy: 溢出策略 drop_oldest / drop_newest
+            budget: 全局预算，默认为进程级共享预算
+        """
+        if overflow_policy not in OutputQueueConfig.OVERFLOW_POLICIES:
+            raise ValueError("未知的溢出策略: {}".format(overflow_policy))
+        if not low_water_ms <= high_water_ms <= max_ms:
+            raise ValueError("水位需满足 low_water_ms <= high_water_ms <= max_ms")
+
+        self.sample_rate = sample_rate
+        self.high_water_samples = sample_rate * high_water_ms // 1000
+        self.low_water_samples = sample_rate * low_water_ms // 1000
+        self.max_samples = sample_rate * max_ms // 1000
+        self.overflow_policy = overflow_policy
+        self.budget = budget if budget is not None else global_budget
+
+        self.frames = deque()
+        self.samples = 0
+        self.bytes = 0
+
+        # 背压状态
+        self.throttled = False
+        self.space = asyncio.Event()
+        self.space.set()
+
+        # 统计信息
+        self.peak_samples = 0
+        self.dropped_frames = 0
+        self.dropped_samples = 0
+        self.backpressure_count = 0
+        self.backpressure_seconds = 0.0
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        """队列中的音频时长 (秒)"""
+        return self.samples / self.sample_rate
+
+    def _push(self, frame):
+        self.frames.append(frame)
+        self.samples += len(frame)
+        self.bytes += frame.nbytes
+        self.budget.acquire(frame.nbytes)
+
+    def _pop(self):
+        frame = self.frames.popleft()
+        self.samples -= len(frame)
+        self.bytes -= frame.nbytes
+        self.budget.release(frame.nbytes)
+        return frame
+
+    def append(self, frame):
+        if self.samples + len(frame) > self.max_samples:
+            if self.overflow_policy == "drop_newest":
+                self._drop(frame)
+                return
+            while self.frames and self.samples + len(frame) > self.max_samples:
+                self._drop(self._pop())
+
+        self._push(frame)
+        if self.samples > self.peak_samples:
+            self.peak_samples = self.samples
+        if self.samples >= self.high_water_samples:
+            self.throttled = True
+
+    def extend(self, frames):
+        for frame in frames:
+            self.append(frame)
+
+    def _drop(self, frame):
+        if self.dropped_frames == 0:
+            logger.warning("下行音频队列溢出 (%.1fs)，按 %s 策略丢弃", self.duration, self.overflow_policy)
+        self.dropped_frames += 1
+        self.dropped_samples += len(frame)
+
+    def popleft(self):
+        frame = self._pop()
+        if self.throttled and self.samples <= self.low_water_samples:
+            self.space.set()
+        return frame
+
+    def clear(self):
+        """清空队列并归还全局预算"""
+        self.budget.release(self.bytes)
+        self.frames.clear()
+        self.samples = 0
+        self.bytes = 0
+        self.throttled = False
+        self.space.set()
+
+    def _can_resume(self):
+        return self.samples <= self.low_water_samples and not self.budget.exhausted
+
+    async def wait_for_space(self):
+        """
+        背压：队列超过高水位或全局预算耗尽时等待，由后端消息读取方在入队前调用
+        """
+        if not self.throttled and not self.budget.exhausted:
+            return
+
+        self.throttled = True
+        self.backpressure_count += 1
+        start = time.monotonic()
+        self.budget.waiters.add(self.space)
+        try:
+            while not self._can_resume():
+                self.space.clear()
+                await self.space.wait()
+        finally:
+            self.budget.waiters.discard(self.space)
+            self.backpressure_seconds += time.monotonic() - start
+        self.throttled = False
+
+    def get_statistics(self):
+        return {
+            "frames": len(self.frames),
+            "bytes": self.bytes,
+            "duration": self.duration,
+            "peak_duration": self.peak_samples / self.sample_rate,
+            "dropped_frames": self.dropped_frames,
+            "dropped_duration": self.dropped_samples / self.sample_rate,
+            "backpressure_count": self.backpressure_count,
+            "backpressure_seconds": self.backpressure_seconds,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,234 @@
+"""
+DataChannel 下行消息调度
+Channel Sender - 每个会话一个，负责合并、排序与限速发往客户端的 DataChannel 消息
+
+- 合并：BATCH_WINDOW_MS 内的多条消息合并为一帧 {"type": "batch", "messages": [...]}，只有一条时原样发送
+- 优先级：控制类消息 (工具动作、表情、视频控制) 排在文本之前，并且不等待合并窗口
+- 覆盖：合并键相同的待发消息只保留最新一条 (例如连续的音量设置、表情)
+- 背压：bufferedAmount 超过高水位时暂停发送，等 bufferedamountlow 事件再继续；
+  暂停期间积压超过上限时丢弃最早的低优先级消息
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+
+from src.config.channel_config import ChannelConfig
+
+logger = logging.getLogger(__name__)
+
+# 优先级，数值越小越先发送
+PRIORITY_CONTROL = 0  # 工具动作、表情、视频控制等，不丢弃
+PRIORITY_TEXT = 1  # 识别与合成文本、连接状态
+PRIORITY_BULK = 2  # 可丢弃的高频数据，积压时最先丢弃
+
+BATCH_PREFIX = '{"type": "batch", "messages": ['
+BATCH_SUFFIX = "]}"
+
+
+def classify(message):
+    """
+    按消息类型确定优先级与合并键
+
+    Returns:
+        tuple: (优先级, 合并键)；合并键为 None 的消息不会被覆盖
+    """
+    kind = message.get("type")
+    if kind == "video_control":
+        return PRIORITY_CONTROL, "video_control"
+    if kind == "llm":
+        # 表情只关心最新的一个
+        return PRIORITY_CONTROL, "emotion"
+    if kind == "tool":
+        if message.get("text") == "set_volume":
+            return PRIORITY_CONTROL, "tool.set_volume"
+        return PRIORITY_CONTROL, None
+    if kind == "music":
+        return PRIORITY_CONTROL, None
+    if kind == "tts" and message.get("state") in ("start", "stop"):
+        # 不带文本的播放状态，只有最新的状态有意义
+        return PRIORITY_TEXT, "tts.state"
+    return PRIORITY_TEXT, None
+
+
+class ChannelSender:
+    """
+    单个 DataChannel 的下行消息调度器 (只在事件循环线程中使用)
+    """
+
+    def __init__(
+        self,
+        channel,
+        batch_window=ChannelConfig.BATCH_WINDOW_MS / 1000,
+        max_batch_bytes=ChannelConfig.MAX_BATCH_BYTES,
+        high_water=ChannelConfig.HIGH_WATER_BYTES,
+        low_water=ChannelConfig.LOW_WATER_BYTES,
+        max_pending=ChannelConfig.MAX_PENDING,
+    ):
+        """
+        Args:
+            channel: aiortc RTCDataChannel
+            batch_window: 合并窗口 (秒)
+            max_batch_bytes: 单帧最大字节数
+            high_water: bufferedAmount 高水位 (字节)，超过时暂停发送
+            low_water: bufferedAmount 低水位 (字节)，降到以下时恢复发送
+            max_pending: 最多积压的消息条数
+        """
+        self.channel = channel
+        self.batch_window = batch_window
+        self.max_batch_bytes = max_batch_bytes
+        self.high_water = high_water
+        self.max_pending = max_pending
+
+        # 每个优先级一个队列，元素为 [json 文本, 合并键, 字节数]；被覆盖的消息文本置为 None
+        self.queues = tuple(deque() for _ in (PRIORITY_CONTROL, PRIORITY_TEXT, PRIORITY_BULK))
+        self.keyed = {}
+        self.pending = 0
+        self.flush_handle = None
+        self.flush_soon = False
+        self.blocked = False
+
+        # 统计信息
+        self.messages_sent = 0
+        self.frames_sent = 0
+        self.merged = 0
+        self.dropped = 0
+        self.stalls = 0
+
+        channel.bufferedAmountLowThreshold = low_water
+        channel.on("open", self._flush)
+        channel.on("bufferedamountlow", self._on_buffered_amount_low)
+        channel.on("close", self.close)
+
+    def send(self, message, priority=None, key=None):
+        """
+        排队一条消息
+
+        Args:
+            message: 可 JSON 序列化的 dict
+            priority: 优先级，默认按消息类型确定
+            key: 合并键，默认按消息类型确定；相同键的待发消息只保留最新一条
+        """
+        if self.channel.readyState == "closed":
+            return
+        if priority is None:
+            priority, key = classify(message)
+        data = json.dumps(message, ensure_ascii=False)
+        entry = [data, key, len(data.encode("utf-8"))]
+
+        if key is not None:
+            previous = self.keyed.get(key)
+            if previous is not None and previous[0] is not None:
+                previous[0] = None
+                self.pending -= 1
+                self.merged += 1
+            self.keyed[key] = entry
+
+        self.queues[priority].append(entry)
+        self.pending += 1
+        if self.pending > self.max_pending:
+            self._drop_oldest()
+        self._schedule(priority == PRIORITY_CONTROL)
+
+    def _schedule(self, immediate):
+        """安排一次发送；控制类消息在本轮事件循环结束时发送，其余等待合并窗口"""
+        if self.blocked or self.channel.readyState != "open":
+            # 由 open / bufferedamountlow 事件触发发送
+            return
+        if self.flush_handle is not None:
+            if self.flush_soon or not immediate:
+                return
+            self.flush_handle.cancel()
+        loop = asyncio.get_running_loop()
+        if immediate:
+            self.flush_handle = loop.call_soon(self._flush)
+        else:
+            self.flush_handle = loop.call_later(self.batch_window, self._flush)
+        self.flush_soon = immediate
+
+    def _drop_oldest(self):
+        """丢弃最早的一条低优先级消息"""
+        for queue in reversed(self.queues[PRIORITY_TEXT:]):
+            while queue:
+                entry = queue.popleft()
+                if entry[0] is None:
+                    continue
+                self._forget(entry)
+                self.pending -= 1
+                self.dropped += 1
+                return
+
+    def _forget(self, entry):
+        if entry[1] is not None and self.keyed.get(entry[1]) is entry:
+            del self.keyed[entry[1]]
+
+    def _next_frame(self):
+        """按优先级取出不超过 max_batch_bytes 的一批消息"""
+        parts = []
+        size = len(BATCH_PREFIX) + len(BATCH_SUFFIX)
+        for queue in self.queues:
+            while queue:
+                data, _, nbytes = entry = queue[0]
+                if data is None:
+                    queue.popleft()
+                    continue
+                # 单条超过上限的消息独占一帧
+                if parts and size + nbytes + 1 > self.max_batch_bytes:
+                    return parts
+                queue.popleft()
+                self._forget(entry)
+                self.pending -= 1
+                parts.append(data)
+                size += nbytes + 1
+        return parts
+
+    def _flush(self):
+        """发送积压的消息，直到队列为空或缓冲超过高水位"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        if self.channel.readyState != "open":
+            return
+
+        while self.pending:
+            if self.channel.bufferedAmount >= self.high_water:
+                if not self.blocked:
+                    self.blocked = True
+                    self.stalls += 1
+                    logger.debug("DataChannel 发送缓冲超过高水位，暂停发送 (%s 条待发)", self.pending)
+                return
+            parts = self._next_frame()
+            if not parts:
+                break
+            if len(parts) == 1:
+                self.channel.send(parts[0])
+            else:
+                self.channel.send(BATCH_PREFIX + ",".join(parts) + BATCH_SUFFIX)
+            self.frames_sent += 1
+            self.messages_sent += len(parts)
+
+    def _on_buffered_amount_low(self):
+        self.blocked = False
+        self._flush()
+
+    def close(self):
+        """丢弃所有待发消息"""
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        for queue in self.queues:
+            queue.clear()
+        self.keyed.clear()
+        self.pending = 0
+
+    def get_statistics(self):
+        return {
+            "pending": self.pending,
+            "blocked": self.blocked,
+            "messages_sent": self.messages_sent,
+            "frames_sent": self.frames_sent,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "stalls": self.stalls,
+        }
@@ -1,6 +1,15 @@
 import os
 
-OTA_URL = "https://api.tenclass.net/xiaozhi/ota"
+from src.config.mock_config import MockBackendConfig
+
+# 小智后端选择："cloud" 使用官方服务端，"mock" 在进程内启动本地模拟后端 (见 src/mock)
+XIAOZHI_BACKEND = os.getenv("XIAOZHI_BACKEND", "cloud")
+
+# 小智 OTA 地址，也可通过环境变量指向独立运行的模拟后端 (例如 http://127.0.0.1:8765/xiaozhi/ota)
+if XIAOZHI_BACKEND == "mock":
+    OTA_URL = MockBackendConfig.get_ota_url()
+else:
+    OTA_URL = os.getenv("OTA_URL", "https://api.tenclass.net/xiaozhi/ota")
 DEFAULT_MAC_ADDR = "00:00:00:00:00:AA"
 # 从环境变量读取端口，如果没有设置则使用默认值51000
 PORT = int(os.getenv("PORT", "51000"))
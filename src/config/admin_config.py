@@ -0,0 +1,10 @@
+# 管理接口配置
+# Admin API Configuration
+import os
+
+
+class AdminConfig:
+    """管理接口配置类"""
+
+    # 管理接口 (/api/admin/*) 的访问令牌，请求需携带 Authorization: Bearer <TOKEN>；为空时管理接口不可用
+    TOKEN = os.getenv("ADMIN_TOKEN", "")
@@ -0,0 +1,47 @@
+# 静态资源缓存配置
+# Asset Cache Configuration
+import os
+from fnmatch import fnmatch
+
+
+class AssetConfig:
+    """静态资源缓存配置类"""
+
+    # 页面 (HTML) 每次都需要用 ETag 重新验证，保证发布后立即生效
+    PAGE_CACHE_CONTROL = "no-cache"
+
+    # 普通静态资源的缓存时间 (秒)
+    STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+
+    # 内容不会变化的静态资源 (第三方库与 Live2D 模型)，也可在 URL 上带 ?v= 版本号使其视为不可变
+    IMMUTABLE_PATTERNS = ("js/*.min.js", "js/pixi.js", "hiyori_pro_zh/*")
+    IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+    # 必须每次重新验证的资源
+    NO_CACHE_PATTERNS = ("service-worker.js", "manifest.webmanifest")
+
+    # 超过该大小的文件不放入内存，直接由 aiohttp 从磁盘发送
+    MAX_CACHED_FILE_SIZE = int(os.getenv("MAX_CACHED_FILE_SIZE", str(4 * 1024 * 1024)))
+
+    # 预压缩参数：压缩后至少节省该比例才保留压缩版本
+    MIN_COMPRESSION_SAVING = 0.1
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 9
+
+    # 开发模式下检测文件修改时间，修改后自动重新加载
+    CHECK_MTIME = os.getenv("ASSET_CHECK_MTIME", "0") == "1"
+
+    @classmethod
+    def get_cache_control(cls, relative_path, versioned=False):
+        """
+        获取静态资源的 Cache-Control
+
+        Args:
+            relative_path: 相对 static 目录的路径
+            versioned: URL 是否带有版本号参数
+        """
+        if any(fnmatch(relative_path, pattern) for pattern in cls.NO_CACHE_PATTERNS):
+            return "no-cache"
+        if versioned or any(fnmatch(relative_path, pattern) for pattern in cls.IMMUTABLE_PATTERNS):
+            return "public, max-age={}, immutable".format(cls.IMMUTABLE_MAX_AGE)
+        return "public, max-age={}".format(cls.STATIC_MAX_AGE)
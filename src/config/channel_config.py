@@ -0,0 +1,32 @@
+# DataChannel 下行消息配置
+# Data Channel Configuration
+import os
+
+
+class ChannelConfig:
+    """DataChannel 下行消息调度配置类"""
+
+    # 合并窗口 (毫秒)：窗口内的多条消息合并为一帧 {"type": "batch", "messages": [...]} 发送；
+    # 控制类消息 (工具动作、表情等) 不等待窗口
+    BATCH_WINDOW_MS = float(os.getenv("CHANNEL_BATCH_WINDOW_MS", "20"))
+
+    # 单帧最大字节数，超过时拆成多帧
+    MAX_BATCH_BYTES = int(os.getenv("CHANNEL_MAX_BATCH_BYTES", "16384"))
+
+    # SCTP 发送缓冲水位 (字节)：bufferedAmount 超过高水位时暂停发送，降到低水位以下再恢复
+    HIGH_WATER_BYTES = int(os.getenv("CHANNEL_HIGH_WATER_BYTES", "65536"))
+    LOW_WATER_BYTES = int(os.getenv("CHANNEL_LOW_WATER_BYTES", "16384"))
+
+    # 暂停期间最多积压的消息条数，超过时先丢弃最早的低优先级消息 (控制类消息不丢弃)
+    MAX_PENDING = int(os.getenv("CHANNEL_MAX_PENDING", "256"))
+
+    @classmethod
+    def get_sender_params(cls):
+        """获取 ChannelSender 参数"""
+        return {
+            "batch_window": cls.BATCH_WINDOW_MS / 1000,
+            "max_batch_bytes": cls.MAX_BATCH_BYTES,
+            "high_water": cls.HIGH_WATER_BYTES,
+            "low_water": cls.LOW_WATER_BYTES,
+            "max_pending": cls.MAX_PENDING,
+        }
@@ -0,0 +1,32 @@
+# 后端连接配置
+# Backend Connection Configuration
+import os
+
+
+class ConnectionConfig:
+    """小智后端连接与重连配置类"""
+
+    # 指数退避：第 n 次失败后等待 min(MAX_DELAY, BASE_DELAY * 2**n) 乘以 [0.5, 1) 的随机抖动
+    RECONNECT_BASE_DELAY = float(os.getenv("RECONNECT_BASE_DELAY", "0.5"))
+    RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", "10"))
+
+    # 单次重连流程的最大尝试次数，全部失败后在 RECONNECT_MAX_DELAY 内不再尝试
+    RECONNECT_MAX_ATTEMPTS = int(os.getenv("RECONNECT_MAX_ATTEMPTS", "5"))
+
+    # /api/offer 中建立首次连接的尝试次数，失败时直接返回错误，避免应答被退避重试阻塞
+    START_MAX_ATTEMPTS = int(os.getenv("BACKEND_START_MAX_ATTEMPTS", "1"))
+
+    # 全局同时进行的连接数上限，避免后端抖动时所有会话同时重连
+    MAX_CONCURRENT_CONNECTS = int(os.getenv("MAX_CONCURRENT_CONNECTS", "8"))
+
+    # 单次连接 (OTA + websocket 握手) 超时 (秒)
+    CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "10"))
+
+    # 重连期间缓存的上行音频时长 (毫秒)，按 20ms 一帧计算帧数
+    PREROLL_MS = int(os.getenv("UPLINK_PREROLL_MS", "1000"))
+    PREROLL_FRAMES = max(1, PREROLL_MS // 20)
+
+    @classmethod
+    def get_backoff_delay(cls, attempt):
+        """第 attempt 次 (从 0 开始) 失败后的退避上限 (不含抖动)"""
+        return min(cls.RECONNECT_MAX_DELAY, cls.RECONNECT_BASE_DELAY * (2**attempt))
@@ -0,0 +1,28 @@
+# 排空 (滚动发布) 配置
+# Drain Configuration
+import os
+
+
+class DrainConfig:
+    """排空模式配置类"""
+
+    # 收到 SIGTERM 时进入排空模式，会话全部结束 (或到达期限) 后退出；再次收到 SIGTERM 立即退出
+    ON_SIGTERM = os.getenv("DRAIN_ON_SIGTERM", "1") == "1"
+
+    # 排空期限 (秒)：超过期限仍未结束的会话被关闭
+    DEADLINE = float(os.getenv("DRAIN_DEADLINE", "600"))
+
+    # 排空期间后端 websocket 的空闲休眠时间 (秒)，比平时更早休眠
+    BACKEND_IDLE_TIMEOUT = float(os.getenv("DRAIN_BACKEND_IDLE_TIMEOUT", "15"))
+
+    # 到达期限后，剩余会话在该时间内 (秒) 依次关闭，避免客户端同时重连
+    CLOSE_SPREAD = float(os.getenv("DRAIN_CLOSE_SPREAD", "30"))
+
+    @classmethod
+    def get_drain_params(cls):
+        """获取 DrainController 参数"""
+        return {
+            "deadline": cls.DEADLINE,
+            "backend_idle_timeout": cls.BACKEND_IDLE_TIMEOUT,
+            "close_spread": cls.CLOSE_SPREAD,
+        }
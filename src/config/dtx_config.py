@@ -0,0 +1,28 @@
+# 下行静音抑制 (DTX) 配置
+# Downlink Discontinuous Transmission Configuration
+import os
+
+
+class DtxConfig:
+    """下行静音抑制配置类"""
+
+    # 是否在助手不说话时暂停发送下行音频
+    ENABLED = os.getenv("DTX_ENABLED", "1") == "1"
+
+    # 下行帧时长 (毫秒)，静音帧按此长度生成
+    FRAME_MS = 20
+
+    # TTS 结束后继续发送静音帧的时长 (毫秒)，让客户端解码器平滑收尾
+    HANGOVER_MS = int(os.getenv("DTX_HANGOVER_MS", "200"))
+
+    # 暂停期间发送一个静音保活帧的间隔 (毫秒)，与 Opus DTX 的 400ms 一致
+    KEEPALIVE_MS = int(os.getenv("DTX_KEEPALIVE_MS", "400"))
+
+    @classmethod
+    def get_dtx_params(cls):
+        """获取静音抑制参数"""
+        return {
+            "enabled": cls.ENABLED,
+            "hangover_frames": cls.HANGOVER_MS // cls.FRAME_MS,
+            "keepalive_interval": cls.KEEPALIVE_MS / 1000,
+        }
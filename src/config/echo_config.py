@@ -21,10 +21,25 @@ class EchoConfig:
     NOISE_GATE_THRESHOLD = 200  # 更低的门限，但配合更温和的衰减
     NOISE_GATE_ATTENUATION = 0.3  # 减少衰减，保留更多音频信号
 
+    # 远端活动检测 - 参考信号静音超过拖尾时间后跳过回声消除
+    FAR_END_THRESHOLD = 300  # 参考信号峰值高于该值视为远端有声音
+    FAR_END_HANGOVER_FRAMES = 25  # 远端静音后仍按有回声处理的帧数 (约500ms，覆盖回声拖尾与播放缓冲)
+
+    # Geigel 双讲检测 - 麦克风峰值超过 阈值 x 近期参考峰值 时判定为双讲，冻结滤波器更新
+    GEIGEL_THRESHOLD = 0.5  # 假设回声路径至少有 6dB 衰减
+    DOUBLE_TALK_HANGOVER_FRAMES = 10  # 双讲结束后继续冻结的帧数
+
     # 音频处理参数
     GAIN_FACTOR = 1.0  # 正常增益因子
     SAMPLE_RATE = 48000  # 采样率
 
+    # 服务端回声消除策略 - 根据客户端上报与残余回声测量选择 full / light / bypass
+    POLICY_PROBE_SECONDS = 3.0  # 需要累计多少秒远端 (TTS) 播放才做出决定
+    POLICY_MAX_LAG_MS = 600  # 回声相对参考信号的最大延迟 (网络往返 + 播放缓冲)
+    POLICY_REF_ACTIVE_RMS = 300  # 参考信号 RMS 高于该值视为远端在播放
+    POLICY_BYPASS_ECHO_DB = -40.0  # 残余回声电平低于该值 (相对参考) 时关闭服务端回声消除
+    POLICY_LIGHT_ECHO_DB = -25.0  # 残余回声电平低于该值时只做轻量的残余回声抑制
+
     # 客户端音频约束参数 - 优化以增强回声消除效果
     CLIENT_AUDIO_CONSTRAINTS = {
         "echoCancellation": True,
@@ -65,3 +80,24 @@ class EchoConfig:
     def get_noise_gate_params(cls):
         """获取噪声门限参数"""
         return {"threshold": cls.NOISE_GATE_THRESHOLD, "attenuation": cls.NOISE_GATE_ATTENUATION}
+
+    @classmethod
+    def get_double_talk_params(cls):
+        """获取远端活动与双讲检测参数"""
+        return {
+            "far_end_threshold": cls.FAR_END_THRESHOLD,
+            "far_end_hangover": cls.FAR_END_HANGOVER_FRAMES,
+            "geigel_threshold": cls.GEIGEL_THRESHOLD,
+            "double_talk_hangover": cls.DOUBLE_TALK_HANGOVER_FRAMES,
+        }
+
+    @classmethod
+    def get_policy_params(cls):
+        """获取回声消除策略参数"""
+        return {
+            "probe_seconds": cls.POLICY_PROBE_SECONDS,
+            "max_lag_ms": cls.POLICY_MAX_LAG_MS,
+            "ref_active_rms": cls.POLICY_REF_ACTIVE_RMS,
+            "bypass_echo_db": cls.POLICY_BYPASS_ECHO_DB,
+            "light_echo_db": cls.POLICY_LIGHT_ECHO_DB,
+        }
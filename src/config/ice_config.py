@@ -1,40 +1,99 @@
+import base64
+import hashlib
+import hmac
 import os
-from typing import Any, Dict, List
+import time
+from typing import TYPE_CHECKING, Any, Dict, List
 
-from aiortc import RTCIceServer
+if TYPE_CHECKING:
+    from aiortc import RTCIceServer
+
+# 默认STUN服务器
+DEFAULT_STUN_URLS = [
+    "stun:stun.miwifi.com:3478",
+    "stun:stun.l.google.com:19302",
+    "stun:stun1.l.google.com:19302",
+    "stun:stun.stunprotocol.org:3478",
+]
+
+
+def _split_urls(value):
+    return [url.strip() for url in value.split(",") if url.strip()]
 
 
 class ICEConfig:
     """ICE服务器配置管理类"""
 
     def __init__(self):
-        # 默认STUN服务器
-        self.default_stun_urls = [
-            "stun:stun.miwifi.com:3478",
-            "stun:stun.l.google.com:19302",
-            "stun:stun1.l.google.com:19302",
-            "stun:stun.stunprotocol.org:3478",
-        ]
+        # STUN 服务器 (逗号分隔)，设为空字符串时不使用 STUN，只支持局域网直连
+        self.stun_urls = _split_urls(os.getenv("ICE_STUN_URLS", ",".join(DEFAULT_STUN_URLS)))
 
-    def get_ice_config(self) -> Dict[str, Any]:
-        """获取前端ICE配置"""
-        ice_servers = []
+        # TURN 服务器 (逗号分隔)，例如 turn:turn.example.com:3478?transport=udp
+        self.turn_urls = _split_urls(os.getenv("TURN_URLS", ""))
+        # 固定的 TURN 用户名与密码
+        self.turn_username = os.getenv("TURN_USERNAME", "")
+        self.turn_credential = os.getenv("TURN_CREDENTIAL", "")
+        # 设置共享密钥时按 TURN REST API (coturn use-auth-secret) 生成有时效的用户名与密码，优先于固定密码
+        self.turn_secret = os.getenv("TURN_SECRET", "")
+        self.turn_ttl = int(os.getenv("TURN_TTL", "86400"))
+
+        # 探测：周期性向各服务器发送 STUN Binding 请求，按往返时间排序，剔除不可达的服务器
+        self.probe_enabled = os.getenv("ICE_PROBE_ENABLED", "1") == "1"
+        self.probe_interval = float(os.getenv("ICE_PROBE_INTERVAL", "60"))
+        self.probe_timeout = float(os.getenv("ICE_PROBE_TIMEOUT", "1.5"))
+        # 连续探测失败该次数后不再下发
+        self.max_failures = int(os.getenv("ICE_PROBE_MAX_FAILURES", "2"))
+        # 下发给客户端的 STUN 服务器数量上限 (0 表示不限制)；服务端只使用排名第一的 STUN 服务器
+        self.max_stun_servers = int(os.getenv("ICE_MAX_STUN_SERVERS", "2"))
+
+        # /api/ice 响应的缓存时间 (秒)，带 TURN 临时密码时不超过密码剩余有效期的一半
+        self.cache_max_age = int(os.getenv("ICE_CACHE_MAX_AGE", "300"))
 
-        # 添加默认STUN服务器
-        for url in self.default_stun_urls:
-            ice_servers.append({"urls": url})
+    def turn_credentials(self, now=None):
+        """
+        获取 TURN 用户名与密码
+
+        Returns:
+            tuple: (username, credential, 过期时间戳)；固定密码时过期时间为 None，未配置时为 None
+        """
+        if self.turn_secret:
+            expires_at = int(now or time.time()) + self.turn_ttl
+            username = "{}:xiaozhi".format(expires_at)
+            digest = hmac.new(self.turn_secret.encode(), username.encode(), hashlib.sha1).digest()
+            return username, base64.b64encode(digest).decode(), expires_at
+        if self.turn_username:
+            return self.turn_username, self.turn_credential, None
+        return None
+
+    def build_ice_config(self, stun_urls, turn_urls, credentials=None) -> Dict[str, Any]:
+        """按给定的服务器列表构建前端ICE配置"""
+        ice_servers = [{"urls": url} for url in stun_urls]
+        if turn_urls:
+            turn = {"urls": list(turn_urls)}
+            if credentials:
+                turn["username"], turn["credential"] = credentials[0], credentials[1]
+            ice_servers.append(turn)
 
         return {"iceServers": ice_servers, "iceCandidatePoolSize": 10, "iceTransportPolicy": "all"}
 
-    def get_server_ice_servers(self) -> List[RTCIceServer]:
-        """获取服务器端ICE服务器对象"""
-        servers = []
+    def get_ice_config(self) -> Dict[str, Any]:
+        """获取前端ICE配置 (按配置顺序，未经探测)"""
+        return self.build_ice_config(self.stun_urls, self.turn_urls, self.turn_credentials())
+
+    def build_server_ice_servers(self, stun_urls) -> List["RTCIceServer"]:
+        """
+        按给定的 STUN 列表构建服务器端ICE服务器对象
+
+        服务端有公网地址，不经过 TURN 中继；aiortc 只使用列表中的第一个 STUN 服务器
+        """
+        # aiortc 在启动预热时导入，避免 import src 时加载
+        from aiortc import RTCIceServer
 
-        # 添加默认STUN服务器
-        for url in self.default_stun_urls:
-            servers.append(RTCIceServer(urls=url))
+        return [RTCIceServer(urls=url) for url in stun_urls]
 
-        return servers
+    def get_server_ice_servers(self) -> List["RTCIceServer"]:
+        """获取服务器端ICE服务器对象 (按配置顺序，未经探测)"""
+        return self.build_server_ice_servers(self.stun_urls)
 
 
 # 全局实例
@@ -0,0 +1,36 @@
+# 服务端口型 (唇形同步) 配置
+# Lip Sync Configuration
+import os
+
+
+class LipSyncConfig:
+    """服务端口型参数配置类"""
+
+    # 是否为请求了口型数据的客户端 (offer 中 lipSync 为 true) 发送口型参数
+    ENABLED = os.getenv("LIPSYNC_ENABLED", "1") == "1"
+
+    # 分析帧长 (毫秒)，与下行音频帧一致
+    FRAME_MS = 20
+
+    # 张嘴程度按帧 RMS 电平 (dBFS) 线性映射：低于 SILENCE_DBFS 为闭嘴 (静音)，高于 FULL_OPEN_DBFS 为完全张开
+    SILENCE_DBFS = float(os.getenv("LIPSYNC_SILENCE_DBFS", "-45"))
+    FULL_OPEN_DBFS = float(os.getenv("LIPSYNC_FULL_OPEN_DBFS", "-12"))
+
+    # 粗粒度口型分类的门限
+    # 低频 (80-800Hz) 能量占比不低于 ROUND_SHARE 时为圆唇 (o / u)
+    ROUND_SHARE = float(os.getenv("LIPSYNC_ROUND_SHARE", "0.75"))
+    # 高频 (2.5-8kHz) 能量占比不低于 SPREAD_SHARE 时为展唇 (e / i)
+    SPREAD_SHARE = float(os.getenv("LIPSYNC_SPREAD_SHARE", "0.25"))
+    # 张嘴程度不低于 WIDE_OPEN 时取开口较大的一类 (o / e)
+    WIDE_OPEN = float(os.getenv("LIPSYNC_WIDE_OPEN", "0.5"))
+
+    @classmethod
+    def get_analyzer_params(cls):
+        """获取 LipSyncAnalyzer 参数"""
+        return {
+            "silence_dbfs": cls.SILENCE_DBFS,
+            "full_open_dbfs": cls.FULL_OPEN_DBFS,
+            "round_share": cls.ROUND_SHARE,
+            "spread_share": cls.SPREAD_SHARE,
+            "wide_open": cls.WIDE_OPEN,
+        }
@@ -0,0 +1,33 @@
+# 日志配置
+# Logging Configuration
+import os
+
+
+class LogConfig:
+    """日志配置类"""
+
+    # 日志级别
+    LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+    # 输出格式："text" 为原有的单行文本，"json" 为每行一个 JSON 对象
+    FORMAT = os.getenv("LOG_FORMAT", "text")
+
+    # 日志队列容量；写入线程跟不上时丢弃新日志，不阻塞事件循环
+    QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # 每个日志类别 (category) 的速率限制：每秒条数与突发上限
+    RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "20"))
+    RATE_BURST = int(os.getenv("LOG_RATE_BURST", "50"))
+
+    # 按类别采样，例如 "backend.tts=0.2,client=0.5"；未列出的类别全部记录
+    SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+    @classmethod
+    def get_sample_rates(cls):
+        """解析按类别的采样率"""
+        rates = {}
+        for item in cls.SAMPLE_RATES.split(","):
+            name, _, rate = item.partition("=")
+            if name.strip() and rate.strip():
+                rates[name.strip()] = float(rate)
+        return rates
@@ -0,0 +1,71 @@
+# 本地模拟小智后端配置
+# Mock XiaoZhi Backend Configuration
+import os
+
+
+class MockBackendConfig:
+    """模拟后端配置类，所有参数均可通过环境变量覆盖"""
+
+    # 监听地址
+    HOST = os.getenv("MOCK_BACKEND_HOST", "127.0.0.1")
+    PORT = int(os.getenv("MOCK_BACKEND_PORT", "8765"))
+
+    # 上行语音检测
+    VOICE_THRESHOLD = int(os.getenv("MOCK_VOICE_THRESHOLD", "1000"))  # RMS 门限 (int16)
+    RELEASE_FRAMES = int(os.getenv("MOCK_RELEASE_FRAMES", "8"))  # 判定语音结束所需的连续静音帧数
+
+    # 脚本化回复
+    TTS_SENTENCES = int(os.getenv("MOCK_TTS_SENTENCES", "1"))  # 每次回复的句子 (音频突发) 数量
+    TTS_DURATION = float(os.getenv("MOCK_TTS_DURATION", "0.6"))  # 每句音频时长 (秒)
+    TTS_FREQUENCY = float(os.getenv("MOCK_TTS_FREQUENCY", "880"))  # 音频频率 (Hz)
+    TTS_SEND_RATE = float(os.getenv("MOCK_TTS_SEND_RATE", "1.0"))  # 发送速率 (1.0 为实时，0 为尽快发送)
+    EMOJI = os.getenv("MOCK_EMOJI", "😊")  # llm 消息中的表情，为空则不发送
+
+    # 网络模拟
+    LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", "0"))  # 首包回复前的固定延迟
+    JITTER_MS = float(os.getenv("MOCK_JITTER_MS", "0"))  # 每个音频包的随机抖动上限
+
+    # 连接关闭：完成 N 次回复后由服务端主动关闭 websocket (0 表示不关闭)
+    CLOSE_AFTER_UTTERANCES = int(os.getenv("MOCK_CLOSE_AFTER_UTTERANCES", "0"))
+
+    @classmethod
+    def get_listen_params(cls):
+        """获取上行语音检测参数"""
+        return {"voice_threshold": cls.VOICE_THRESHOLD, "release_frames": cls.RELEASE_FRAMES}
+
+    @classmethod
+    def get_reply_params(cls):
+        """获取脚本化回复参数"""
+        return {
+            "tts_sentences": cls.TTS_SENTENCES,
+            "tts_duration": cls.TTS_DURATION,
+            "tts_frequency": cls.TTS_FREQUENCY,
+            "tts_send_rate": cls.TTS_SEND_RATE,
+            "emoji": cls.EMOJI,
+        }
+
+    @classmethod
+    def get_network_params(cls):
+        """获取网络模拟参数"""
+        return {
+            "latency_ms": cls.LATENCY_MS,
+            "jitter_ms": cls.JITTER_MS,
+            "close_after_utterances": cls.CLOSE_AFTER_UTTERANCES,
+        }
+
+    @classmethod
+    def get_ota_url(cls):
+        """获取模拟后端的 OTA 地址"""
+        return "http://{}:{}/xiaozhi/ota".format(cls.HOST, cls.PORT)
+
+
+class MockStunConfig:
+    """模拟 STUN 服务器配置类，用于离线测试 ICE 服务器探测与排序"""
+
+    # 监听地址
+    HOST = os.getenv("MOCK_STUN_HOST", "127.0.0.1")
+    PORT = int(os.getenv("MOCK_STUN_PORT", "3478"))
+
+    # 网络模拟
+    DELAY_MS = float(os.getenv("MOCK_STUN_DELAY_MS", "0"))  # 响应前的固定延迟
+    LOSS = float(os.getenv("MOCK_STUN_LOSS", "0"))  # 丢弃请求的比例 (0~1)
@@ -0,0 +1,63 @@
+# 下行 Opus 编码自适应配置
+# Adaptive Opus Encoder Configuration
+import os
+
+
+class OpusConfig:
+    """下行 Opus 编码自适应配置类"""
+
+    # 是否根据网络与负载调整下行编码参数
+    ADAPTIVE = os.getenv("OPUS_ADAPTIVE", "1") == "1"
+
+    # 调整间隔 (秒)，RTCP 接收报告约每秒一个
+    ADAPT_INTERVAL = float(os.getenv("OPUS_ADAPT_INTERVAL", "2"))
+
+    # 码率范围 (bps)，单声道语音
+    MIN_BITRATE = int(os.getenv("OPUS_MIN_BITRATE", "16000"))
+    MAX_BITRATE = int(os.getenv("OPUS_MAX_BITRATE", "64000"))
+    BITRATE_DECREASE_FACTOR = 0.7  # 拥塞时按比例降低
+    BITRATE_INCREASE_STEP = 8000  # 网络良好时线性恢复
+
+    # 编码复杂度范围 (libopus 0-10)
+    MIN_COMPLEXITY = int(os.getenv("OPUS_MIN_COMPLEXITY", "3"))
+    MAX_COMPLEXITY = int(os.getenv("OPUS_MAX_COMPLEXITY", "10"))
+
+    # 可选的帧长 (毫秒)，默认使用最短的一个
+    FRAME_DURATIONS = (20, 40, 60)
+
+    # 网络门限：丢包率 (0-1)、抖动 (秒)、往返时延 (秒)
+    LOSS_HIGH = float(os.getenv("OPUS_LOSS_HIGH", "0.08"))
+    LOSS_LOW = float(os.getenv("OPUS_LOSS_LOW", "0.02"))
+    JITTER_HIGH = float(os.getenv("OPUS_JITTER_HIGH", "0.04"))
+    RTT_HIGH = float(os.getenv("OPUS_RTT_HIGH", "0.4"))
+
+    # 告知编码器的预期丢包率上限 (%)，用于带内 FEC
+    MAX_PACKET_LOSS = 30
+
+    # 服务端负载门限：事件循环延迟 (秒)、进程 CPU 占用 (以单核为单位，事件循环只能使用一个核心)
+    LOOP_LAG_HIGH = float(os.getenv("OPUS_LOOP_LAG_HIGH", "0.05"))
+    LOOP_LAG_LOW = float(os.getenv("OPUS_LOOP_LAG_LOW", "0.01"))
+    CPU_HIGH = float(os.getenv("OPUS_CPU_HIGH", "0.85"))
+    CPU_LOW = float(os.getenv("OPUS_CPU_LOW", "0.6"))
+
+    @classmethod
+    def get_policy_params(cls):
+        """获取编码自适应策略参数"""
+        return {
+            "min_bitrate": cls.MIN_BITRATE,
+            "max_bitrate": cls.MAX_BITRATE,
+            "bitrate_decrease_factor": cls.BITRATE_DECREASE_FACTOR,
+            "bitrate_increase_step": cls.BITRATE_INCREASE_STEP,
+            "min_complexity": cls.MIN_COMPLEXITY,
+            "max_complexity": cls.MAX_COMPLEXITY,
+            "frame_durations": cls.FRAME_DURATIONS,
+            "loss_high": cls.LOSS_HIGH,
+            "loss_low": cls.LOSS_LOW,
+            "jitter_high": cls.JITTER_HIGH,
+            "rtt_high": cls.RTT_HIGH,
+            "max_packet_loss": cls.MAX_PACKET_LOSS,
+            "loop_lag_high": cls.LOOP_LAG_HIGH,
+            "loop_lag_low": cls.LOOP_LAG_LOW,
+            "cpu_high": cls.CPU_HIGH,
+            "cpu_low": cls.CPU_LOW,
+        }
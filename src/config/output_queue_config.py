@@ -0,0 +1,34 @@
+# 下行音频队列配置
+# Output Audio Queue Configuration
+import os
+
+
+class OutputQueueConfig:
+    """下行 (TTS) 音频队列配置类"""
+
+    SAMPLE_RATE = 48000  # 队列中 PCM 的采样率 (单声道 int16)
+
+    # 单会话水位 (毫秒)：超过高水位时暂停读取后端消息，降到低水位以下再恢复
+    HIGH_WATER_MS = int(os.getenv("OUTPUT_QUEUE_HIGH_WATER_MS", "4000"))
+    LOW_WATER_MS = int(os.getenv("OUTPUT_QUEUE_LOW_WATER_MS", "2000"))
+
+    # 单会话硬上限 (毫秒)，超过时按溢出策略丢弃
+    MAX_MS = int(os.getenv("OUTPUT_QUEUE_MAX_MS", "15000"))
+
+    # 溢出策略: drop_oldest (丢弃最早的音频) / drop_newest (丢弃新到的音频)
+    OVERFLOW_POLICY = os.getenv("OUTPUT_QUEUE_OVERFLOW_POLICY", "drop_oldest")
+
+    # 所有会话合计的字节上限，超过时所有会话的后端读取都暂停
+    GLOBAL_MAX_BYTES = int(os.getenv("OUTPUT_QUEUE_GLOBAL_MAX_MB", "64")) * 1024 * 1024
+
+    OVERFLOW_POLICIES = ("drop_oldest", "drop_newest")
+
+    @classmethod
+    def get_queue_params(cls):
+        """获取单会话队列参数"""
+        return {
+            "high_water_ms": cls.HIGH_WATER_MS,
+            "low_water_ms": cls.LOW_WATER_MS,
+            "max_ms": cls.MAX_MS,
+            "overflow_policy": cls.OVERFLOW_POLICY,
+        }
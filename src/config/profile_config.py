@@ -0,0 +1,24 @@
+# 在线性能剖析配置
+# Live Profiling Configuration
+import os
+
+
+class ProfileConfig:
+    """在线性能剖析 (/api/admin/profile) 配置类"""
+
+    # 默认与最长采样时长 (秒)
+    DEFAULT_DURATION = float(os.getenv("PROFILE_DEFAULT_DURATION", "10"))
+    MAX_DURATION = float(os.getenv("PROFILE_MAX_DURATION", "60"))
+
+    # 采样间隔 (毫秒)，间隔越小开销越大
+    DEFAULT_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+    MIN_INTERVAL_MS = 1.0
+
+    # tracemalloc 记录的调用栈深度，内存剖析期间所有分配都会变慢
+    TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "16"))
+
+    # 内存剖析返回的分配位置数量
+    TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", "30"))
+
+    # 统计各会话内存占用时最多遍历的对象数
+    MAX_WALK_OBJECTS = int(os.getenv("PROFILE_MAX_WALK_OBJECTS", "2000000"))
@@ -0,0 +1,31 @@
+# 会话录制配置
+# Session Recording Configuration
+import os
+
+
+class RecordConfig:
+    """会话录制配置类"""
+
+    # 录制文件目录，为空时禁用录制
+    DIRECTORY = os.getenv("RECORD_DIR", "")
+
+    # 是否录制所有会话
+    ALL_SESSIONS = os.getenv("RECORD_ALL_SESSIONS", "0") == "1"
+
+    # 是否允许客户端在 offer 参数中以 "record": true 请求录制 (/api/offer 无需认证，默认不允许)
+    CLIENT_OPT_IN = os.getenv("RECORD_CLIENT_OPT_IN", "0") == "1"
+
+    # 录制文件每次扩容的大小 (约 20 秒的 48k 双声道麦克风 + 回声消除输出)
+    CHUNK_SIZE = int(os.getenv("RECORD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+    @classmethod
+    def should_record(cls, params):
+        """
+        判断会话是否需要录制
+
+        Args:
+            params: /api/offer 请求参数
+        """
+        if not cls.DIRECTORY:
+            return False
+        return cls.ALL_SESSIONS or (cls.CLIENT_OPT_IN and params.get("record") is True)
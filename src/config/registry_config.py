@@ -0,0 +1,49 @@
+# 多节点会话注册表配置
+# Session Registry Configuration
+import os
+import socket
+
+
+class RegistryConfig:
+    """会话注册表与 offer 路由配置类"""
+
+    # 注册表后端："memory" 仅本进程可见 (单节点)；"sqlite" 同一主机上的多个进程共享一个数据库文件
+    BACKEND = os.getenv("REGISTRY_BACKEND", "memory")
+
+    # sqlite 后端的数据库文件
+    SQLITE_PATH = os.getenv("REGISTRY_SQLITE_PATH", "registry.db")
+
+    # 本节点标识，默认为 主机名:端口
+    NODE_ID = os.getenv("NODE_ID") or "{}:{}".format(socket.gethostname(), os.getenv("PORT", "51000"))
+
+    # 其他节点重定向 offer 时使用的本节点地址 (例如 https://example.com/node-1)，为空时本节点不接受重定向
+    NODE_URL = os.getenv("NODE_URL", "").rstrip("/")
+
+    # 本节点最多承载的会话数，0 表示不限制
+    MAX_SESSIONS = int(os.getenv("NODE_MAX_SESSIONS", "0"))
+
+    # 进程 CPU 占用 (以单核为单位，事件循环只能使用一个核心) 不低于该值时视为满载，不再接受新会话；0 表示不检查
+    CPU_LIMIT = float(os.getenv("NODE_CPU_LIMIT", "0.9"))
+
+    # 事件循环延迟 (秒，平滑后) 不低于该值时视为满载；0 表示不检查
+    LOOP_LAG_LIMIT = float(os.getenv("NODE_LOOP_LAG_LIMIT", "0.1"))
+
+    # 心跳间隔与节点失效时间 (秒)：超过 NODE_TTL 没有心跳的节点及其会话视为不存在
+    HEARTBEAT_INTERVAL = float(os.getenv("REGISTRY_HEARTBEAT_INTERVAL", "5"))
+    NODE_TTL = float(os.getenv("REGISTRY_NODE_TTL", "15"))
+
+    # 拒绝 offer 时建议客户端重试的间隔 (秒，Retry-After)
+    RETRY_AFTER = int(os.getenv("REGISTRY_RETRY_AFTER", "5"))
+
+    @classmethod
+    def get_node_params(cls):
+        """获取 ClusterNode 参数"""
+        return {
+            "node_id": cls.NODE_ID,
+            "url": cls.NODE_URL,
+            "max_sessions": cls.MAX_SESSIONS,
+            "cpu_limit": cls.CPU_LIMIT,
+            "loop_lag_limit": cls.LOOP_LAG_LIMIT,
+            "heartbeat_interval": cls.HEARTBEAT_INTERVAL,
+            "retry_after": cls.RETRY_AFTER,
+        }
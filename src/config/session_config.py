@@ -0,0 +1,31 @@
+# 会话生命周期配置
+# Session Lifecycle Configuration
+import os
+
+
+class SessionConfig:
+    """会话生命周期配置类"""
+
+    # 从收到 offer 到 ICE/DTLS 连接成功的最长时间 (秒)
+    CONNECT_TIMEOUT = float(os.getenv("SESSION_CONNECT_TIMEOUT", "30"))
+
+    # 连接成功后持续收不到客户端媒体帧的最长时间 (秒)
+    MEDIA_INACTIVITY_TIMEOUT = float(os.getenv("SESSION_MEDIA_TIMEOUT", "60"))
+
+    # 没有说话、没有后端消息的时间超过该值后，关闭后端 websocket 进入休眠 (秒)
+    BACKEND_IDLE_TIMEOUT = float(os.getenv("SESSION_BACKEND_IDLE_TIMEOUT", "120"))
+
+    # 休眠状态下唤醒后端所需的上行语音 RMS 门限 (int16)
+    VOICE_THRESHOLD = int(os.getenv("SESSION_VOICE_THRESHOLD", "500"))
+
+    # 回收检查间隔 (秒)
+    REAP_INTERVAL = float(os.getenv("SESSION_REAP_INTERVAL", "5"))
+
+    @classmethod
+    def get_timeout_params(cls):
+        """获取超时参数"""
+        return {
+            "connect_timeout": cls.CONNECT_TIMEOUT,
+            "media_inactivity_timeout": cls.MEDIA_INACTIVITY_TIMEOUT,
+            "backend_idle_timeout": cls.BACKEND_IDLE_TIMEOUT,
+        }
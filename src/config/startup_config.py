@@ -0,0 +1,14 @@
+# 启动预热配置
+# Startup Warm-up Configuration
+import os
+
+
+class StartupConfig:
+    """启动预热配置类"""
+
+    # 是否在启动后于后台预热 (导入媒体模块、解码形象图片、预加载页面、校验 ICE 配置、初始化编码器)；
+    # 关闭时这些工作推迟到第一次请求
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+
+    # 预热未完成时，/api/offer 最多等待的时间 (秒)，超时后照常处理
+    OFFER_WAIT_TIMEOUT = float(os.getenv("WARMUP_OFFER_WAIT_TIMEOUT", "30"))
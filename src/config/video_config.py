@@ -0,0 +1,42 @@
+# 上行摄像头视频控制配置
+# Inbound Camera Video Configuration
+import os
+
+
+class VideoConfig:
+    """上行摄像头视频控制配置类"""
+
+    # 是否限制客户端上行摄像头 (画面只在拍照时使用)
+    CONTROL_ENABLED = os.getenv("VIDEO_CONTROL_ENABLED", "1") == "1"
+
+    # 平时的上行限制：码率 (bps)、帧率、分辨率缩小倍数
+    IDLE_BITRATE = int(os.getenv("VIDEO_IDLE_BITRATE", "100000"))
+    IDLE_FRAMERATE = float(os.getenv("VIDEO_IDLE_FRAMERATE", "3"))
+    IDLE_SCALE_DOWN = float(os.getenv("VIDEO_IDLE_SCALE_DOWN", "2"))
+
+    # 拍照时的上行限制，同时作为 SDP 中 b=AS / b=TIAS 的上限
+    PHOTO_BITRATE = int(os.getenv("VIDEO_PHOTO_BITRATE", "1500000"))
+    PHOTO_FRAMERATE = float(os.getenv("VIDEO_PHOTO_FRAMERATE", "15"))
+    PHOTO_SCALE_DOWN = 1.0
+
+    # 拍照时保持高画质的时长 (秒)，窗口内的连续拍照共用一次提升
+    PHOTO_BOOST_SECONDS = float(os.getenv("VIDEO_PHOTO_BOOST_SECONDS", "5"))
+
+    # 提升画质后等待的新帧数 (让编码器码率爬升)，以及最长等待时间 (秒)
+    PHOTO_SETTLE_FRAMES = int(os.getenv("VIDEO_PHOTO_SETTLE_FRAMES", "5"))
+    PHOTO_SETTLE_TIMEOUT = float(os.getenv("VIDEO_PHOTO_SETTLE_TIMEOUT", "1.5"))
+
+    @classmethod
+    def get_control_params(cls, boost=False):
+        """获取发给客户端的上行视频参数 (RTCRtpEncodingParameters 字段)"""
+        if boost:
+            return {
+                "maxBitrate": cls.PHOTO_BITRATE,
+                "maxFramerate": cls.PHOTO_FRAMERATE,
+                "scaleResolutionDownBy": cls.PHOTO_SCALE_DOWN,
+            }
+        return {
+            "maxBitrate": cls.IDLE_BITRATE,
+            "maxFramerate": cls.IDLE_FRAMERATE,
+            "scaleResolutionDownBy": cls.IDLE_SCALE_DOWN,
+        }
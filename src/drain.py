@@ -0,0 +1,190 @@
+"""
+排空模式
+Drain - 滚动发布时让节点逐步退出服务，而不是在关闭时同时断开所有通话
+
+进入排空后：
+- 新的 offer 被重定向到其他节点或以 503 + Retry-After 拒绝，/api/ready 返回 503
+- 已有会话继续运行，后端 websocket 更早进入休眠
+- 会话全部结束或到达期限后结束排空；期限到达时剩余会话分散在 close_spread 秒内依次关闭，
+  空闲 (后端已休眠) 的会话优先
+- 由 SIGTERM 触发的排空在结束后退出进程
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """
+    排空控制器
+    """
+
+    def __init__(self, session_manager, cluster, deadline=600.0, backend_idle_timeout=15.0, close_spread=30.0):
+        """
+        Args:
+            session_manager: SessionManager
+            cluster: ClusterNode，排空期间停止接受新会话
+            deadline: 默认排空期限 (秒)
+            backend_idle_timeout: 排空期间的后端空闲休眠时间 (秒)
+            close_spread: 到达期限后关闭剩余会话的分散时间 (秒)
+        """
+        self.session_manager = session_manager
+        self.cluster = cluster
+        self.deadline = deadline
+        self.backend_idle_timeout = backend_idle_timeout
+        self.close_spread = close_spread
+        self.task = None
+
+        self.draining = False
+        self.reason = None
+        self.exit_when_done = False
+        self.started_at = None
+        self.deadline_at = None
+        self.finished_at = None
+        self.saved_backend_idle_timeout = None
+
+        # 统计信息
+        self.initial_sessions = 0
+        self.closed_at_deadline = 0
+
+    @property
+    def remaining(self):
+        return len(self.session_manager.sessions)
+
+    async def begin(self, reason, deadline=None, exit_when_done=False):
+        """
+        进入排空模式
+
+        Args:
+            reason: 触发原因 (记录日志)
+            deadline: 排空期限 (秒)，默认取构造参数
+            exit_when_done: 排空结束后是否退出进程
+
+        Returns:
+            bool: 是否新进入排空 (已在排空中时只更新 exit_when_done)
+        """
+        if self.draining:
+            self.exit_when_done = self.exit_when_done or exit_when_done
+            return False
+        deadline = self.deadline if deadline is None else deadline
+
+        self.draining = True
+        self.reason = reason
+        self.exit_when_done = exit_when_done
+        self.started_at = time.monotonic()
+        self.deadline_at = self.started_at + deadline
+        self.finished_at = None
+        self.initial_sessions = self.remaining
+        self.closed_at_deadline = 0
+        logger.warning("进入排空模式 (%s)：剩余 %d 个会话，期限 %.0fs", reason, self.initial_sessions, deadline)
+
+        self.saved_backend_idle_timeout = self.session_manager.backend_idle_timeout
+        self.session_manager.backend_idle_timeout = min(self.saved_backend_idle_timeout, self.backend_idle_timeout)
+        try:
+            await self.cluster.begin_drain()
+        except Exception:
+            logger.exception("注册表排空状态更新失败")
+        self.task = asyncio.create_task(self.run())
+        return True
+
+    async def cancel(self):
+        """
+        取消排空，恢复接受新会话
+
+        Returns:
+            bool: 是否取消成功 (未在排空中时为 False)
+        """
+        if not self.draining:
+            return False
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        self._restore()
+        try:
+            await self.cluster.end_drain()
+        except Exception:
+            logger.exception("注册表排空状态更新失败")
+        logger.warning("取消排空模式：剩余 %d 个会话", self.remaining)
+        return True
+
+    def _restore(self):
+        self.draining = False
+        if self.saved_backend_idle_timeout is not None:
+            self.session_manager.backend_idle_timeout = self.saved_backend_idle_timeout
+            self.saved_backend_idle_timeout = None
+
+    async def run(self, interval=1.0, report_interval=30.0):
+        """等待会话结束，到达期限后关闭剩余会话"""
+        last_report = time.monotonic()
+        while self.remaining and time.monotonic() < self.deadline_at:
+            await asyncio.sleep(interval)
+            if time.monotonic() - last_report >= report_interval:
+                last_report = time.monotonic()
+                logger.info(
+                    "排空中：剩余 %d 个会话，距期限 %.0fs", self.remaining, max(0.0, self.deadline_at - last_report)
+                )
+
+        if self.remaining:
+            await self.close_remaining()
+        self.finished_at = time.monotonic()
+        logger.warning("排空完成，用时 %.1fs", self.finished_at - self.started_at)
+        if self.exit_when_done:
+            self.exit()
+
+    async def close_remaining(self):
+        """到达期限：按空闲程度依次关闭剩余会话，分散在 close_spread 秒内"""
+        sessions = sorted(
+            self.session_manager.sessions.values(),
+            key=lambda session: (session.xiaozhi.server is not None, session.xiaozhi.last_activity_at),
+        )
+        logger.warning("排空到达期限，在 %.0fs 内关闭剩余 %d 个会话", self.close_spread, len(sessions))
+        interval = self.close_spread / len(sessions)
+        for index, session in enumerate(sessions):
+            if index:
+                await asyncio.sleep(interval)
+            self.closed_at_deadline += 1
+            await self.session_manager.close(session.pc, "排空期限已到")
+
+    def exit(self):
+        """按 SIGINT 的处理方式 (aiohttp 优雅退出) 结束进程"""
+        os.kill(os.getpid(), signal.SIGINT)
+
+    def handle_sigterm(self):
+        """第一次 SIGTERM 进入排空并在结束后退出；排空中再次收到时立即退出"""
+        if self.draining:
+            logger.warning("排空中再次收到 SIGTERM，立即退出")
+            self.exit()
+        else:
+            asyncio.ensure_future(self.begin("SIGTERM", exit_when_done=True))
+
+    async def start(self, app):
+        """aiohttp on_startup 回调：由排空接管 SIGTERM (替换 aiohttp 默认的立即退出)"""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.handle_sigterm)
+        except (NotImplementedError, RuntimeError):  # 非 Unix 平台或不在主线程
+            logger.warning("当前平台不支持由 SIGTERM 触发排空")
+
+    async def stop(self, app):
+        """aiohttp on_shutdown 回调"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def get_statistics(self):
+        now = time.monotonic()
+        return {
+            "draining": self.draining,
+            "reason": self.reason,
+            "remaining_sessions": self.remaining,
+            "initial_sessions": self.initial_sessions,
+            "elapsed": now - self.started_at if self.started_at is not None else None,
+            "deadline_in": max(0.0, self.deadline_at - now) if self.draining and self.finished_at is None else None,
+            "finished": self.finished_at is not None,
+            "closed_at_deadline": self.closed_at_deadline,
+            "exit_when_done": self.exit_when_done,
+        }
@@ -0,0 +1,292 @@
+"""
+ICE 服务器探测与 /api/ice 缓存
+ICE Server Pool - 后台周期性向各 STUN / TURN 服务器发送 STUN Binding 请求，测量往返时间与可达性，
+按往返时间排序并剔除连续失败的服务器；/api/ice 的响应体、ETag 与服务端的 RTCIceServer 列表在探测后预先构建
+
+服务端的 aiortc 只使用第一个 STUN 服务器，排序直接决定服务端收集候选地址的耗时；
+浏览器会向下发的每个服务器发请求，剔除慢的或不可达的服务器可以缩短收集时间。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import time
+from urllib.parse import parse_qs
+
+from aiohttp import web
+
+from src.assets import etag_matches
+from src.config.ice_config import ice_config
+
+logger = logging.getLogger(__name__)
+
+# STUN (RFC 5389)
+STUN_BINDING_REQUEST = 0x0001
+STUN_MAGIC_COOKIE = 0x2112A442
+STUN_HEADER = struct.Struct("!HHI12s")
+DEFAULT_PORTS = {"stun": 3478, "turn": 3478, "stuns": 5349, "turns": 5349}
+
+
+def parse_ice_url(url):
+    """
+    解析 stun: / turn: 地址
+
+    Returns:
+        tuple: (scheme, host, port, transport)
+    """
+    scheme, _, rest = url.partition(":")
+    rest, _, query = rest.partition("?")
+    transport = parse_qs(query).get("transport", ["tcp" if scheme in ("stuns", "turns") else "udp"])[0]
+    if rest.startswith("["):
+        host, _, port = rest[1:].partition("]")
+        port = port.lstrip(":")
+    else:
+        host, _, port = rest.partition(":")
+    if scheme not in DEFAULT_PORTS or not host:
+        raise ValueError("无效的 ICE 服务器地址: {}".format(url))
+    return scheme, host, int(port) if port else DEFAULT_PORTS[scheme], transport
+
+
+class StunClientProtocol(asyncio.DatagramProtocol):
+    """接收 Binding 响应：匹配已发送的事务 ID 后唤醒等待者"""
+
+    def __init__(self):
+        self.sent = {}
+        self.response = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if len(data) < STUN_HEADER.size or self.response.done():
+            return
+        _, _, cookie, transaction_id = STUN_HEADER.unpack_from(data)
+        if cookie == STUN_MAGIC_COOKIE and transaction_id in self.sent:
+            # 成功与错误响应都说明服务器可达
+            self.response.set_result(time.monotonic() - self.sent[transaction_id])
+
+    def error_received(self, exc):
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+
+async def stun_rtt(host, port, timeout=1.5, attempts=3):
+    """
+    测量 STUN Binding 请求的往返时间 (不含 DNS 解析)，超时前按间隔重传
+
+    Returns:
+        float: 往返时间 (秒)
+
+    Raises:
+        asyncio.TimeoutError: 超时未收到响应
+        OSError: 地址解析或发送失败
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    infos = await asyncio.wait_for(loop.getaddrinfo(host, port, type=socket.SOCK_DGRAM), timeout)
+    family, _, _, _, address = infos[0]
+    transport, protocol = await loop.create_datagram_endpoint(StunClientProtocol, remote_addr=address, family=family)
+    try:
+        for attempt in range(attempts):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            transaction_id = os.urandom(12)
+            protocol.sent[transaction_id] = time.monotonic()
+            transport.sendto(STUN_HEADER.pack(STUN_BINDING_REQUEST, 0, STUN_MAGIC_COOKIE, transaction_id))
+            wait = remaining if attempt == attempts - 1 else min(remaining, timeout / attempts)
+            try:
+                return await asyncio.wait_for(asyncio.shield(protocol.response), wait)
+            except asyncio.TimeoutError:
+                continue
+        raise asyncio.TimeoutError()
+    finally:
+        transport.close()
+
+
+class IceServerPool:
+    """
+    探测、排序后的 ICE 服务器列表与预先构建的 /api/ice 响应
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.urls = list(dict.fromkeys(config.stun_urls + config.turn_urls))
+        # url -> 探测结果
+        self.probes = {
+            url: {"rtt": None, "reachable": None, "failures": 0, "probes": 0, "error": None} for url in self.urls
+        }
+        self.task = None
+        self.refresh_task = None
+        self.last_refresh = None
+        self.unreachable = []
+
+        # 预先构建的结果
+        self.stun_urls = []
+        self.turn_urls = []
+        self.client_config = None
+        self.body = b""
+        self.etag = None
+        self.cache_control = None
+        self.server_ice_servers = None
+        # TURN 临时密码及其更新时间 (有效期过半)
+        self.credentials = None
+        self.renew_at = None
+
+        # 统计信息
+        self.refreshes = 0
+        self.hits = 0
+        self.not_modified = 0
+
+        self.rebuild()
+
+    async def probe(self, url):
+        """探测一个服务器；通过 TCP / TLS 连接的服务器不探测"""
+        result = self.probes[url]
+        try:
+            _, host, port, transport = parse_ice_url(url)
+        except ValueError as e:
+            result["failures"] += 1
+            result["error"] = str(e)
+            return
+        if transport != "udp":
+            return
+        result["probes"] += 1
+        try:
+            rtt = await stun_rtt(host, port, self.config.probe_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            result["failures"] += 1
+            result["reachable"] = False
+            result["error"] = str(e) or type(e).__name__
+            return
+        # 往返时间做简单平滑，避免单次抖动改变排序
+        result["rtt"] = rtt if result["rtt"] is None else (result["rtt"] + rtt) / 2
+        result["failures"] = 0
+        result["reachable"] = True
+        result["error"] = None
+
+    async def refresh(self):
+        """探测全部服务器并重新构建响应；并发调用共享同一次探测"""
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh())
+        await asyncio.shield(self.refresh_task)
+
+    async def _refresh(self):
+        previous = self.stun_urls
+        await asyncio.gather(*(self.probe(url) for url in self.urls))
+        self.refreshes += 1
+        self.last_refresh = time.time()
+        self.rebuild()
+        if self.stun_urls != previous:
+            logger.info("ICE 服务器排序: %s", ", ".join(self.describe(url) for url in self.stun_urls))
+        unreachable = [url for url in self.urls if self.probes[url]["failures"] >= self.config.max_failures]
+        if unreachable != self.unreachable:
+            # 同类服务器全部不可达时 ranked 保留配置的列表，这些服务器仍在下发
+            served = set(self.stun_urls + self.turn_urls)
+            withheld = [url for url in unreachable if url not in served]
+            kept = [url for url in unreachable if url in served]
+            if withheld:
+                logger.warning("ICE 服务器不可达，已停止下发: %s", ", ".join(withheld))
+            if kept:
+                logger.warning("ICE 服务器全部不可达，保留配置的列表继续下发: %s", ", ".join(kept))
+            if not unreachable:
+                logger.info("ICE 服务器已全部恢复")
+            self.unreachable = unreachable
+
+    def describe(self, url):
+        rtt = self.probes[url]["rtt"]
+        return "{} {}".format(url, "{:.0f}ms".format(rtt * 1000) if rtt is not None else "-")
+
+    def ranked(self, urls):
+        """按往返时间排序并去掉连续失败的服务器；全部失败时保留配置的列表 (可能只是本机出站受限)"""
+        healthy = [url for url in urls if self.probes[url]["failures"] < self.config.max_failures]
+        # 未探测的服务器排在已探测的之后，保持配置顺序
+        healthy.sort(key=lambda url: (self.probes[url]["rtt"] is None, self.probes[url]["rtt"] or 0))
+        return healthy or list(urls)
+
+    def rebuild(self, now=None):
+        """按当前探测结果构建客户端配置、响应体与 ETag；TURN 临时密码在有效期过半时重新生成"""
+        now = now or time.time()
+        stun_urls = self.ranked(self.config.stun_urls)
+        if self.config.max_stun_servers:
+            stun_urls = stun_urls[: self.config.max_stun_servers]
+        turn_urls = self.ranked(self.config.turn_urls)
+        # TURN 密码在有效期过半前保持不变，探测刷新不改变 ETag
+        credentials = self.credentials
+        if turn_urls and (credentials is None or (self.renew_at is not None and now >= self.renew_at)):
+            credentials = self.credentials = self.config.turn_credentials(now)
+            self.renew_at = now + (credentials[2] - now) / 2 if credentials and credentials[2] is not None else None
+
+        if stun_urls != self.stun_urls:
+            self.server_ice_servers = None
+        self.stun_urls, self.turn_urls = stun_urls, turn_urls
+        self.client_config = self.config.build_ice_config(stun_urls, turn_urls, credentials)
+        self.body = json.dumps(self.client_config, ensure_ascii=False).encode()
+        self.etag = '"{}"'.format(hashlib.sha1(self.body).hexdigest()[:20])
+
+        max_age = self.config.cache_max_age
+        if self.renew_at is not None:
+            max_age = max(0, min(max_age, int(self.renew_at - now)))
+        # 带 TURN 密码的响应不允许共享缓存
+        self.cache_control = "{}, max-age={}".format("private" if credentials else "public", max_age)
+
+    def _refresh_credentials(self):
+        if self.renew_at is not None and time.time() >= self.renew_at:
+            self.rebuild()
+
+    def get_ice_config(self):
+        """前端ICE配置 (排序后)"""
+        self._refresh_credentials()
+        return self.client_config
+
+    def get_server_ice_servers(self):
+        """服务器端ICE服务器对象 (排序后，缓存到排序变化为止)"""
+        if self.server_ice_servers is None:
+            self.server_ice_servers = self.config.build_server_ice_servers(self.stun_urls)
+        return self.server_ice_servers
+
+    def response(self, request):
+        """/api/ice 响应：预先构建的响应体，支持 If-None-Match"""
+        self._refresh_credentials()
+        headers = {"ETag": self.etag, "Cache-Control": self.cache_control}
+        if etag_matches(request.headers.get("If-None-Match"), {self.etag}):
+            self.not_modified += 1
+            return web.Response(status=304, headers=headers)
+        self.hits += 1
+        return web.Response(body=self.body, content_type="application/json", charset="utf-8", headers=headers)
+
+    async def run(self):
+        """周期性探测，直到被取消"""
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("ICE 服务器探测失败")
+            await asyncio.sleep(self.config.probe_interval)
+
+    async def start(self, app):
+        """aiohttp on_startup 回调"""
+        if self.config.probe_enabled and self.urls:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self, app):
+        """aiohttp on_shutdown 回调"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def get_statistics(self):
+        return {
+            "stun": self.stun_urls,
+            "turn": self.turn_urls,
+            "unreachable": self.unreachable,
+            "probes": {url: dict(result) for url, result in self.probes.items()},
+            "refreshes": self.refreshes,
+            "last_refresh": self.last_refresh,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+        }
+
+
+ice_servers = IceServerPool(ice_config)
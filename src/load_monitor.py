@@ -0,0 +1,83 @@
+"""
+服务端负载监测
+Load Monitor - 周期性测量事件循环延迟与进程 CPU 占用，供各会话的自适应策略读取
+"""
+
+import asyncio
+import os
+import time
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # 非 Linux 平台
+        return os.cpu_count() or 1
+
+
+class LoadMonitor:
+    """
+    负载监测器
+
+    - loop_lag: 定时唤醒相对预期时间的延迟 (秒，指数平滑)，反映事件循环的拥挤程度
+    - cpu: 两次采样之间的进程 CPU 时间 / 墙钟时间，以单核为单位 (1.0 表示占满一个核心)。
+      事件循环受 GIL 限制只能使用一个核心，不按核心数归一化；编解码等释放 GIL 的线程可使其超过 1.0
+    """
+
+    def __init__(self, interval=0.1, smoothing=0.2):
+        """
+        Args:
+            interval: 采样间隔 (秒)
+            smoothing: 指数平滑系数，越大越偏重最新的测量
+        """
+        self.interval = interval
+        self.smoothing = smoothing
+        self.cpu_count = _cpu_count()
+        self.task = None
+
+        self.loop_lag = 0.0
+        self.cpu = 0.0
+        self.peak_loop_lag = 0.0
+
+    def _smooth(self, current, value):
+        return current + self.smoothing * (value - current)
+
+    async def run(self):
+        """持续采样，直到被取消"""
+        wall = time.monotonic()
+        cpu = time.process_time()
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self.loop_lag = self._smooth(self.loop_lag, lag)
+            if lag > self.peak_loop_lag:
+                self.peak_loop_lag = lag
+
+            process = time.process_time()
+            if now > wall:
+                usage = (process - cpu) / (now - wall)
+                self.cpu = self._smooth(self.cpu, usage)
+            wall, cpu = now, process
+
+    async def start(self, app):
+        """aiohttp on_startup 回调"""
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self, app):
+        """aiohttp on_shutdown 回调"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+
+    def get_statistics(self):
+        return {
+            "loop_lag": self.loop_lag,
+            "peak_loop_lag": self.peak_loop_lag,
+            "cpu": self.cpu,
+            "cpu_count": self.cpu_count,
+        }
+
+
+load_monitor = LoadMonitor()
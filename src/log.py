@@ -0,0 +1,212 @@
+"""
+日志管道
+Logging Pipeline - 日志记录在事件循环中只做过滤与入队，格式化与写出在后台线程完成
+
+- 会话字段：通过 bind_session() 写入 contextvar，之后在该上下文中创建的任务 (音频轨道、SDK 消息处理等)
+  输出的日志自动带上 session / mac / ip
+- 类别：高频日志通过 extra={"category": ...} 标注类别，按类别采样与限速，被抑制的条数附在该类别的下一条日志上
+- 非阻塞：队列有界，写入线程跟不上时丢弃并计数；消息参数在后台线程才格式化
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from src.config.log_config import LogConfig
+
+# 当前会话的日志字段
+session_context = contextvars.ContextVar("session_context", default=None)
+
+SESSION_FIELDS = ("session", "mac", "ip")
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def bind_session(session, mac, ip):
+    """为当前上下文 (及之后创建的任务) 绑定会话字段"""
+    session_context.set({"session": session, "mac": mac, "ip": ip})
+
+
+class SessionContextFilter(logging.Filter):
+    """把 contextvar 中的会话字段写入日志记录 (调用方通过 extra 显式传入的字段优先)"""
+
+    def filter(self, record):
+        fields = session_context.get()
+        if fields:
+            for name in SESSION_FIELDS:
+                if not hasattr(record, name):
+                    setattr(record, name, fields[name])
+        return True
+
+
+class CategoryFilter(logging.Filter):
+    """
+    按类别采样与限速 (令牌桶)
+
+    只作用于带有 category 属性的记录；类别的采样率按最长前缀匹配 ("backend" 覆盖 "backend.tts")
+    """
+
+    def __init__(self, rate_limit, burst, sample_rates=None):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.sample_rates = sample_rates or {}
+        # 类别 -> [令牌数, 上次补充时间, 已抑制条数]
+        self.buckets = {}
+        self.rates = {}
+        self.suppressed_total = 0
+
+    def _sample_rate(self, category):
+        rate = self.rates.get(category)
+        if rate is None:
+            rate = 1.0
+            name = category
+            while name:
+                if name in self.sample_rates:
+                    rate = self.sample_rates[name]
+                    break
+                name = name.rpartition(".")[0]
+            self.rates[category] = rate
+        return rate
+
+    def filter(self, record):
+        category = getattr(record, "category", None)
+        if category is None:
+            return True
+
+        bucket = self.buckets.get(category)
+        now = time.monotonic()
+        if bucket is None:
+            bucket = self.buckets[category] = [float(self.burst), now, 0]
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+
+        rate = self._sample_rate(category)
+        if bucket[0] < 1 or (rate < 1 and random.random() >= rate):
+            bucket[2] += 1
+            self.suppressed_total += 1
+            return False
+
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    入队时不格式化消息 (参数在写入线程中才格式化)；队列满时丢弃
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            # 异常在当前线程格式化，避免跨线程持有调用栈
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """原有的单行文本格式，被限速的类别附加抑制条数"""
+
+    def format(self, record):
+        message = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            message += " (此前 {} 条同类日志被抑制)".format(suppressed)
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """每行一个 JSON 对象"""
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in SESSION_FIELDS + ("category", "suppressed"):
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LogPipeline:
+    """根日志记录器的队列处理器与后台写入线程"""
+
+    def __init__(self):
+        self.queue = None
+        self.handler = None
+        self.category_filter = None
+        self.listener = None
+
+    def setup(self):
+        """替换根日志记录器的处理器并启动写入线程，可重复调用"""
+        if self.listener is not None:
+            return
+
+        stream = logging.StreamHandler()
+        if LogConfig.FORMAT == "json":
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(TextFormatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+
+        self.queue = queue.Queue(LogConfig.QUEUE_SIZE)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.handler.addFilter(SessionContextFilter())
+        self.category_filter = CategoryFilter(LogConfig.RATE_LIMIT, LogConfig.RATE_BURST, LogConfig.get_sample_rates())
+        self.handler.addFilter(self.category_filter)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(LogConfig.LEVEL)
+
+        self.listener = QueueListener(self.queue, stream, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """写完队列中剩余的日志并停止写入线程"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def get_statistics(self):
+        if self.handler is None:
+            return {}
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.handler.dropped,
+            "suppressed": self.category_filter.suppressed_total,
+        }
+
+
+pipeline = LogPipeline()
+
+
+def setup_logging():
+    pipeline.setup()
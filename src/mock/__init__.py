@@ -0,0 +1,6 @@
+"""
+本地模拟模块
+Local stand-ins for external services
+
+子模块可直接以 python -m 运行，这里不导入它们；使用时从子模块导入，例如 src.mock.xiaozhi_backend
+"""
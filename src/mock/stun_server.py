@@ -0,0 +1,133 @@
+"""
+STUN 模拟服务器
+Local STUN Server Stand-in - 回应 Binding 请求 (XOR-MAPPED-ADDRESS)，可模拟延迟与丢包，用于测试 ICE 服务器探测
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import logging
+import random
+import socket
+import struct
+
+from src.config.mock_config import MockStunConfig
+
+logger = logging.getLogger(__name__)
+
+# STUN (RFC 5389)
+STUN_BINDING_REQUEST = 0x0001
+STUN_BINDING_SUCCESS = 0x0101
+STUN_MAGIC_COOKIE = 0x2112A442
+STUN_HEADER = struct.Struct("!HHI12s")
+ATTR_XOR_MAPPED_ADDRESS = 0x0020
+
+
+def xor_mapped_address(host, port, transaction_id):
+    """构建 XOR-MAPPED-ADDRESS 属性"""
+    address = ipaddress.ip_address(host)
+    xport = port ^ (STUN_MAGIC_COOKIE >> 16)
+    key = struct.pack("!I", STUN_MAGIC_COOKIE) + (transaction_id if address.version == 6 else b"")
+    xaddress = bytes(a ^ b for a, b in zip(address.packed, key))
+    value = struct.pack("!BBH", 0, 0x01 if address.version == 4 else 0x02, xport) + xaddress
+    return struct.pack("!HH", ATTR_XOR_MAPPED_ADDRESS, len(value)) + value
+
+
+class StunServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < STUN_HEADER.size:
+            return
+        message_type, _, cookie, transaction_id = STUN_HEADER.unpack_from(data)
+        if message_type != STUN_BINDING_REQUEST or cookie != STUN_MAGIC_COOKIE:
+            return
+        self.server.requests += 1
+        if random.random() < self.server.loss:
+            self.server.dropped += 1
+            return
+        attribute = xor_mapped_address(addr[0], addr[1], transaction_id)
+        response = STUN_HEADER.pack(STUN_BINDING_SUCCESS, len(attribute), STUN_MAGIC_COOKIE, transaction_id)
+        if self.server.delay_ms > 0:
+            asyncio.get_running_loop().call_later(self.server.delay_ms / 1000, self.send, response + attribute, addr)
+        else:
+            self.send(response + attribute, addr)
+
+    def send(self, data, addr):
+        if not self.transport.is_closing():
+            self.transport.sendto(data, addr)
+
+
+class MockStunServer:
+    """
+    STUN 模拟服务器 (UDP)
+    """
+
+    def __init__(self, host=None, port=None, delay_ms=None, loss=None):
+        """
+        Args:
+            host: 监听地址，默认 MockStunConfig.HOST
+            port: 监听端口，默认 MockStunConfig.PORT
+            delay_ms: 响应延迟 (毫秒)
+            loss: 丢弃请求的比例 (0~1)
+        """
+        self.host = host or MockStunConfig.HOST
+        self.port = MockStunConfig.PORT if port is None else port
+        self.delay_ms = MockStunConfig.DELAY_MS if delay_ms is None else delay_ms
+        self.loss = MockStunConfig.LOSS if loss is None else loss
+        self.transport = None
+
+        # 统计信息
+        self.requests = 0
+        self.dropped = 0
+
+    @property
+    def url(self):
+        return "stun:{}:{}".format(self.host, self.port)
+
+    async def start(self):
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: StunServerProtocol(self), local_addr=(self.host, self.port), family=family
+        )
+        # 端口为 0 时取实际分配的端口
+        self.port = self.transport.get_extra_info("sockname")[1]
+        logger.info("STUN 模拟服务器已启动: %s (延迟 %.0fms，丢包 %.0f%%)", self.url, self.delay_ms, self.loss * 100)
+
+    async def stop(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+
+async def serve(args):
+    server = MockStunServer(host=args.host, port=args.port, delay_ms=args.delay_ms, loss=args.loss)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟 STUN 服务器 (其余参数见 MockStunConfig 环境变量)")
+    parser.add_argument("--host", default=MockStunConfig.HOST)
+    parser.add_argument("--port", type=int, default=MockStunConfig.PORT)
+    parser.add_argument("--delay-ms", type=float, default=MockStunConfig.DELAY_MS)
+    parser.add_argument("--loss", type=float, default=MockStunConfig.LOSS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+小智模拟后端
+Local XiaoZhi Backend Stand-in - 实现 OTA 引导与 websocket 协议，用于离线测试与压测
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import uuid
+
+import numpy as np
+from aiohttp import WSMsgType, web
+from xiaozhi_sdk.utils import setup_opus
+
+from src.config.mock_config import MockBackendConfig
+
+# 与 xiaozhi_sdk 一致：先定位内置的 libopus，再导入 opuslib
+setup_opus()
+import opuslib  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# 上行音频由 xiaozhi_sdk 固定编码为 16k 单声道 opus
+UPLINK_SAMPLE_RATE = 16000
+UPLINK_MAX_FRAME_SIZE = 1920  # 120ms @ 16k，opus 单包最大时长
+
+# 下行 TTS 音频参数 (与官方服务端 hello 中返回的一致)
+TTS_SAMPLE_RATE = 24000
+TTS_FRAME_DURATION = 60  # ms
+
+# 主动关闭 websocket 使用的关闭码：非 1000/1001 时 xiaozhi_sdk 才会上报 websocket close 事件
+CLOSE_CODE = 4000
+
+
+def tone_burst(frequency, duration, sample_rate, amplitude=12000):
+    """
+    生成带淡入淡出的正弦音频
+
+    Args:
+        frequency: 频率 (Hz)
+        duration: 时长 (秒)
+        sample_rate: 采样率
+        amplitude: 幅度 (int16)
+
+    Returns:
+        numpy array: int16 音频数据
+    """
+    count = int(duration * sample_rate)
+    t = np.arange(count, dtype=np.float32) / sample_rate
+    samples = np.sin(2 * np.pi * frequency * t) * amplitude
+
+    # 5ms 淡入淡出，避免起止爆音
+    fade = min(count // 2, int(0.005 * sample_rate))
+    if fade > 0:
+        ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+        samples[:fade] *= ramp
+        samples[-fade:] *= ramp[::-1]
+    return samples.astype(np.int16)
+
+
+def encode_opus_frames(pcm, sample_rate=TTS_SAMPLE_RATE, frame_duration=TTS_FRAME_DURATION):
+    """
+    将 PCM 编码为 opus 包列表，不足一帧的尾部补零
+
+    Args:
+        pcm: int16 单声道音频
+        sample_rate: 采样率
+        frame_duration: 帧时长 (ms)
+
+    Returns:
+        list: opus 包 (bytes)
+    """
+    encoder = opuslib.Encoder(sample_rate, 1, opuslib.APPLICATION_AUDIO)
+    frame_size = sample_rate * frame_duration // 1000
+    padded_len = -(-len(pcm) // frame_size) * frame_size
+    padded = np.zeros(padded_len, dtype=np.int16)
+    padded[: len(pcm)] = pcm
+
+    packets = []
+    for start in range(0, padded_len, frame_size):
+        packets.append(encoder.encode(padded[start : start + frame_size].tobytes(), frame_size))
+    return packets
+
+
+class MockSession:
+    """
+    模拟后端的单个 websocket 会话
+
+    检测到上行语音起始 (能量越过门限) 或收到唤醒词后，按脚本回复：
+    stt -> llm (表情) -> tts start -> [sentence_start -> 音频 -> sentence_end] * N -> tts stop
+    """
+
+    def __init__(self, backend, ws, device_id):
+        self.backend = backend
+        self.ws = ws
+        self.device_id = device_id
+        self.session_id = str(uuid.uuid4())
+        self.rng = random.Random(device_id)
+
+        self.decoder = opuslib.Decoder(UPLINK_SAMPLE_RATE, 1)
+        self.voice_active = False
+        self.quiet_frames = 0
+        self.speak_task = None
+
+        # MCP 状态
+        self.mcp_request_id = 0
+        self.mcp_tools = []
+        self.mcp_results = []
+
+        # 统计信息
+        self.uplink_frames = 0
+        self.utterances = 0
+
+    async def run(self):
+        """会话主循环"""
+        async for msg in self.ws:
+            if msg.type == WSMsgType.BINARY:
+                await self.handle_audio(msg.data)
+            elif msg.type == WSMsgType.TEXT:
+                await self.handle_text(json.loads(msg.data))
+            elif msg.type == WSMsgType.ERROR:
+                break
+
+        if self.speak_task:
+            self.speak_task.cancel()
+
+    async def send_json(self, data):
+        data["session_id"] = self.session_id
+        await self.ws.send_json(data, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    async def handle_text(self, data):
+        """处理客户端 JSON 消息"""
+        message_type = data.get("type")
+        if message_type == "hello":
+            await self.send_json(
+                {
+                    "type": "hello",
+                    "transport": "websocket",
+                    "audio_params": {
+                        "format": "opus",
+                        "sample_rate": TTS_SAMPLE_RATE,
+                        "channels": 1,
+                        "frame_duration": TTS_FRAME_DURATION,
+                    },
+                }
+            )
+            if data.get("features", {}).get("mcp"):
+                await self.send_mcp("initialize", {"capabilities": {"vision": self.backend.vision_params}})
+        elif message_type == "listen" and data.get("state") == "detect":
+            text = data.get("text", "")
+            if text.startswith("tool:"):
+                # 脚本化工具调用，例如 "tool:take_photo"
+                await self.call_tool(text[len("tool:") :])
+            else:
+                self.start_speaking(text)
+        elif message_type == "mcp":
+            await self.handle_mcp(data.get("payload", {}))
+
+    async def send_mcp(self, method, params=None):
+        """向设备发送 MCP 请求"""
+        self.mcp_request_id += 1
+        payload = {"jsonrpc": "2.0", "id": self.mcp_request_id, "method": method}
+        if params is not None:
+            payload["params"] = params
+        await self.send_json({"type": "mcp", "payload": payload})
+
+    async def handle_mcp(self, payload):
+        """处理设备返回的 MCP 响应"""
+        result = payload.get("result", {})
+        if "protocolVersion" in result:
+            await self.send_json({"type": "mcp", "payload": {"jsonrpc": "2.0", "method": "notifications/initialized"}})
+            await self.send_mcp("tools/list")
+        elif "tools" in result:
+            self.mcp_tools = [tool["name"] for tool in result["tools"]]
+        elif "content" in result:
+            self.mcp_results.append(result)
+
+    async def call_tool(self, name, arguments=None):
+        """调用设备端 MCP 工具"""
+        if arguments is None:
+            arguments = {"question": "这张图片里有什么？"} if name == "take_photo" else {}
+        await self.send_mcp("tools/call", {"name": name, "arguments": arguments})
+
+    async def handle_audio(self, opus):
+        """处理上行 opus 音频，检测语音起始"""
+        self.uplink_frames += 1
+        try:
+            pcm = np.frombuffer(self.decoder.decode(opus, UPLINK_MAX_FRAME_SIZE), dtype=np.int16)
+        except opuslib.OpusError:
+            return
+        if len(pcm) == 0:
+            return
+
+        rms = np.sqrt(np.mean(pcm.astype(np.float32) ** 2))
+        if rms >= self.backend.voice_threshold:
+            self.quiet_frames = 0
+            if not self.voice_active:
+                self.voice_active = True
+                self.start_speaking("你好")
+        else:
+            # 连续静音若干帧后才认为一句话结束，避免一句话内多次触发
+            self.quiet_frames += 1
+            if self.quiet_frames >= self.backend.release_frames:
+                self.voice_active = False
+
+    def start_speaking(self, text):
+        """开始一次回复，正在回复时忽略新的语音"""
+        if self.speak_task and not self.speak_task.done():
+            return
+        self.utterances += 1
+        self.speak_task = asyncio.create_task(self.speak(text))
+
+    async def speak(self, text):
+        """按脚本发送 stt / llm / tts 消息与音频"""
+        backend = self.backend
+        try:
+            if backend.latency_ms > 0:
+                await asyncio.sleep(backend.latency_ms / 1000)
+
+            await self.send_json({"type": "stt", "text": text})
+            if backend.emoji:
+                await self.send_json({"type": "llm", "text": backend.emoji, "emotion": "happy"})
+            await self.send_json({"type": "tts", "state": "start"})
+
+            for index in range(backend.tts_sentences):
+                await self.send_json({"type": "tts", "state": "sentence_start", "text": "第{}句".format(index + 1)})
+                await self.send_audio(backend.tts_packets)
+                await self.send_json({"type": "tts", "state": "sentence_end", "text": "第{}句".format(index + 1)})
+
+            await self.send_json({"type": "tts", "state": "stop"})
+
+            if backend.close_after_utterances and self.utterances >= backend.close_after_utterances:
+                await self.ws.close(code=CLOSE_CODE, message=b"mock session closed")
+        except (ConnectionResetError, RuntimeError):
+            # 客户端已断开
+            pass
+
+    async def send_audio(self, packets):
+        """按发送速率与抖动发送音频包"""
+        backend = self.backend
+        frame_interval = TTS_FRAME_DURATION / 1000 / backend.tts_send_rate if backend.tts_send_rate > 0 else 0
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for index, packet in enumerate(packets):
+            jitter = self.rng.uniform(0, backend.jitter_ms / 1000) if backend.jitter_ms > 0 else 0
+            delay = start + index * frame_interval + jitter - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self.ws.send_bytes(packet)
+
+
+class MockXiaoZhiBackend:
+    """
+    本地模拟小智后端
+
+    提供:
+    - POST /xiaozhi/ota/ : OTA 引导，返回 websocket 地址与 token
+    - GET  /xiaozhi/v1/ : websocket 协议 (hello / listen / mcp / opus 音频 / stt / llm / tts)
+    - POST /vision/explain : 图片解析 (take_photo 工具)
+    """
+
+    def __init__(self, host=None, port=None, **params):
+        """
+        初始化模拟后端，未指定的参数取自 MockBackendConfig
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+            **params: 覆盖 MockBackendConfig 中的监听、回复与网络模拟参数，例如
+                voice_threshold / release_frames / tts_sentences / tts_duration / tts_frequency /
+                tts_send_rate / emoji / latency_ms / jitter_ms / close_after_utterances
+        """
+        self.host = host or MockBackendConfig.HOST
+        self.port = port or MockBackendConfig.PORT
+
+        settings = {}
+        settings.update(MockBackendConfig.get_listen_params())
+        settings.update(MockBackendConfig.get_reply_params())
+        settings.update(MockBackendConfig.get_network_params())
+        unknown = set(params) - set(settings)
+        if unknown:
+            raise ValueError("未知的模拟后端参数: {}".format(", ".join(sorted(unknown))))
+        settings.update(params)
+
+        self.voice_threshold = settings["voice_threshold"]
+        self.release_frames = settings["release_frames"]
+        self.tts_sentences = settings["tts_sentences"]
+        self.tts_send_rate = settings["tts_send_rate"]
+        self.emoji = settings["emoji"]
+        self.latency_ms = settings["latency_ms"]
+        self.jitter_ms = settings["jitter_ms"]
+        self.close_after_utterances = settings["close_after_utterances"]
+
+        # 预编码脚本化 TTS 音频，所有会话共享
+        self.tts_packets = encode_opus_frames(
+            tone_burst(settings["tts_frequency"], settings["tts_duration"], TTS_SAMPLE_RATE)
+        )
+
+        self.sessions = set()
+        self.total_sessions = 0
+        self.total_utterances = 0
+        self.vision_requests = 0
+        self.runner = None
+
+    @property
+    def ota_url(self):
+        return "http://{}:{}/xiaozhi/ota".format(self.host, self.port)
+
+    @property
+    def websocket_url(self):
+        return "ws://{}:{}/xiaozhi/v1/".format(self.host, self.port)
+
+    @property
+    def vision_params(self):
+        return {"url": "http://{}:{}/vision/explain".format(self.host, self.port), "token": "mock-token"}
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_post("/xiaozhi/ota/", self.ota)
+        app.router.add_get("/xiaozhi/v1/", self.websocket)
+        app.router.add_post("/vision/explain", self.vision)
+        return app
+
+    async def ota(self, request):
+        """OTA 引导：返回 websocket 连接信息，设备视为已激活"""
+        return web.json_response(
+            {
+                "server_time": {"timestamp": 0, "timezone_offset": 480},
+                "firmware": {"version": "0.0.0", "url": ""},
+                "websocket": {"url": self.websocket_url, "token": "mock-token"},
+            }
+        )
+
+    async def vision(self, request):
+        """图片解析：只校验收到了图片"""
+        data = await request.post()
+        self.vision_requests += 1
+        if "file" not in data:
+            return web.json_response({"success": False, "error": "missing file"})
+        return web.json_response({"success": True, "text": "模拟图片描述"})
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        session = MockSession(self, ws, request.headers.get("Device-Id", ""))
+        self.sessions.add(session)
+        self.total_sessions += 1
+        try:
+            await session.run()
+        finally:
+            self.sessions.discard(session)
+            self.total_utterances += session.utterances
+        return ws
+
+    async def start(self):
+        """在当前事件循环中启动"""
+        self.runner = web.AppRunner(self.create_app(), access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info("Mock XiaoZhi backend listening on %s", self.ota_url)
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def get_statistics(self):
+        return {
+            "active_sessions": len(self.sessions),
+            "total_sessions": self.total_sessions,
+            "utterances": self.total_utterances + sum(session.utterances for session in self.sessions),
+            "vision_requests": self.vision_requests,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟小智后端 (其余参数见 MockBackendConfig 环境变量)")
+    parser.add_argument("--host", default=MockBackendConfig.HOST)
+    parser.add_argument("--port", type=int, default=MockBackendConfig.PORT)
+    parser.add_argument("--latency-ms", type=float, default=MockBackendConfig.LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=MockBackendConfig.JITTER_MS)
+    parser.add_argument("--tts-sentences", type=int, default=MockBackendConfig.TTS_SENTENCES)
+    parser.add_argument("--close-after", type=int, default=MockBackendConfig.CLOSE_AFTER_UTTERANCES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    backend = MockXiaoZhiBackend(
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tts_sentences=args.tts_sentences,
+        close_after_utterances=args.close_after,
+    )
+    web.run_app(backend.create_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
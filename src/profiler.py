@@ -0,0 +1,387 @@
+"""
+在线性能剖析
+Profiler - 在运行中的服务上按需采样 CPU 调用栈与内存分配，并按会话归属
+
+CPU：事件循环线程由 setitimer(ITIMER_REAL) 定时信号在该线程上采样，信号处理函数读取被中断的调用栈与
+当时正在运行的 asyncio 任务，并按距上一次采样的墙钟时间加权 (长时间持有 GIL 的 C 调用期间合并的信号
+不会少计)。后台线程读取的样本只在事件循环线程释放 GIL (多数在 select 中) 时才能取得，会严重偏向
+让出 GIL 的代码，因此只用于其他线程 (编解码线程池等)；事件循环不在主线程或平台不支持 setitimer 时
+退回后台线程采样，结果中 loop_sampler 为 "thread"，此时各会话占比与 loop_busy 不可靠。
+
+会话由 attribute() 写入 contextvar (轨道 recv、XiaoZhiServer 回调与会话建立时调用)，任务工厂在创建任务时
+读取该 contextvar 并记录任务所属的会话，之后由该上下文派生的任务 (上行处理、RTP 发送、后端连接等)
+都归属到同一个会话。输出为 flamegraph.pl / speedscope 可直接读取的折叠调用栈 (权重为微秒)。
+
+其余限制：信号只在字节码之间处理，等待 GIL 的时间计入事件循环线程恢复执行时所在的调用栈；
+采样期间定时信号每个间隔唤醒一次事件循环。
+
+内存：采样期间开启 tracemalloc，比较开始与结束时的快照；各会话的常驻内存通过从会话对象出发遍历
+对象图估算，同时可从模块全局变量到达的对象视为共享，不计入任何会话。
+"""
+
+import asyncio
+import contextvars
+import gc
+import logging
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import types
+import weakref
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 当前执行上下文所属的会话 (session_id)
+session_var = contextvars.ContextVar("profile_session", default=None)
+
+# 事件循环调度代码，折叠调用栈时省略 (到 Handle._run 为止)
+LOOP_SCAFFOLD_END = "asyncio.events.Handle._run"
+
+# 其他线程停在这些函数中时视为空闲等待，不计入样本
+WAIT_FRAMES = {
+    "threading.Condition.wait",
+    "threading.Thread._wait_for_tstate_lock",
+    "concurrent.futures.thread._worker",
+}
+
+# 遍历会话对象图时不深入的类型：代码、模块与类定义属于全局；任务与事件循环会连到其他会话
+OPAQUE_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.CodeType,
+    types.FrameType,
+    weakref.ReferenceType,
+    asyncio.AbstractEventLoop,
+    asyncio.Future,
+    threading.Thread,
+    logging.Logger,
+)
+
+
+def attribute(session_id):
+    """
+    标记当前上下文 (及当前任务) 属于某个会话，在热点入口调用，开销为一次 contextvar 读写
+    """
+    if session_var.get() != session_id:
+        session_var.set(session_id)
+    profiler.tag_current_task(session_id)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    # co_qualname 自 Python 3.11 起提供
+    return "{}.{}".format(frame.f_globals.get("__name__", "?"), getattr(code, "co_qualname", code.co_name))
+
+
+def _stack(frame, max_depth):
+    """调用栈 (从根到叶)，去掉事件循环的调度部分"""
+    names = []
+    while frame is not None and len(names) < max_depth:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    try:
+        start = len(names) - 1 - names[::-1].index(LOOP_SCAFFOLD_END)
+        names = names[start + 1 :]
+    except ValueError:
+        pass
+    return tuple(names)
+
+
+def _is_idle(stack):
+    """事件循环在 select 中等待"""
+    return bool(stack) and stack[-1].startswith("selectors.") and stack[-1].endswith(".select")
+
+
+def fold(counter, scale=1):
+    """折叠调用栈格式：每行 "根;...;叶 权重"，按权重降序；权重乘以 scale 后取整"""
+    return "\n".join("{} {}".format(";".join(stack), round(weight * scale)) for stack, weight in counter.most_common())
+
+
+class SamplingProfiler:
+    """
+    采样剖析器，同一时间只运行一次采样
+    """
+
+    def __init__(self, max_depth=128):
+        self.max_depth = max_depth
+        # 任务 -> 会话；任务结束后自动移除
+        self.task_sessions = weakref.WeakKeyDictionary()
+        self.loop = None
+        self.running = False
+        self.counters = {"loop": Counter(), "threads": Counter()}
+        self.ticks = 0
+        self.last_tick = 0.0
+        self.previous_handler = None
+
+    def tag_current_task(self, session_id):
+        task = asyncio.current_task()
+        if task is not None and self.task_sessions.get(task) != session_id:
+            self.task_sessions[task] = session_id
+
+    def _task_factory(self, loop, coro, **kwargs):
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        session_id = session_var.get()
+        if session_id is not None:
+            self.task_sessions[task] = session_id
+        return task
+
+    async def start(self, app=None):
+        """aiohttp on_startup 回调：安装任务工厂 (已有其他任务工厂时只依赖 attribute() 的直接标记)"""
+        self.loop = asyncio.get_running_loop()
+        if self.loop.get_task_factory() is None:
+            self.loop.set_task_factory(self._task_factory)
+        else:
+            logger.warning("事件循环已设置任务工厂，剖析只能归属直接标记的任务")
+
+    def _loop_key(self, frame):
+        """事件循环线程的样本键：空闲，或 (会话/loop, 调用栈...)"""
+        stack = _stack(frame, self.max_depth)
+        if _is_idle(stack):
+            return ("idle",)
+        task = asyncio.tasks._current_tasks.get(self.loop)
+        session_id = self.task_sessions.get(task) if task is not None else None
+        return ("session:{}".format(session_id) if session_id else "loop",) + stack
+
+    def _on_signal(self, signum, frame):
+        """定时信号处理函数，运行在事件循环线程上；按距上一次采样的时间加权"""
+        now = time.perf_counter()
+        weight, self.last_tick = now - self.last_tick, now
+        self.counters["loop"][self._loop_key(frame)] += weight
+        self.ticks += 1
+
+    def _start_signal_sampling(self, interval):
+        """在事件循环线程上安装定时信号采样；不支持时返回 False"""
+        if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+            return False
+        self.previous_handler = signal.signal(signal.SIGALRM, self._on_signal)
+        self.last_tick = time.perf_counter()
+        signal.setitimer(signal.ITIMER_REAL, interval, interval)
+        return True
+
+    def _stop_signal_sampling(self):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, self.previous_handler)
+        self.previous_handler = None
+
+    def _sample(self, loop_thread, sample_loop, interval, deadline, stop):
+        """后台线程采样：其他线程，以及 (sample_loop 时) 事件循环线程"""
+        loop_samples, threads = self.counters["loop"], self.counters["threads"]
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        last = time.perf_counter()
+        while not stop.is_set() and time.monotonic() < deadline:
+            stop.wait(interval)
+            now = time.perf_counter()
+            weight, last = now - last, now
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if ident == loop_thread:
+                    if sample_loop:
+                        loop_samples[self._loop_key(frame)] += weight
+                        self.ticks += 1
+                    continue
+                stack = _stack(frame, self.max_depth)
+                if stack and stack[-1] not in WAIT_FRAMES:
+                    if ident not in names:
+                        names = {thread.ident: thread.name for thread in threading.enumerate()}
+                    threads[("thread:{}".format(names.get(ident, ident)),) + stack] += weight
+
+    async def profile(self, duration, interval, memory=False, tracemalloc_frames=16, top_allocations=30):
+        """
+        采样 duration 秒
+
+        Args:
+            duration: 采样时长 (秒)
+            interval: 采样间隔 (秒)
+            memory: 是否同时比较 tracemalloc 快照
+            tracemalloc_frames: tracemalloc 记录的调用栈深度
+            top_allocations: 返回的分配位置数量
+
+        Returns:
+            dict: 采样结果，见 summarize()
+        """
+        if self.running:
+            raise RuntimeError("已有剖析正在进行")
+        self.running = True
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        started_tracing = False
+        signal_sampling = False
+        try:
+            if memory and not tracemalloc.is_tracing():
+                tracemalloc.start(tracemalloc_frames)
+                started_tracing = True
+            before = tracemalloc.take_snapshot() if memory else None
+
+            # 计数值为墙钟秒数
+            self.counters = {"loop": Counter(), "threads": Counter()}
+            self.ticks = 0
+            stop = threading.Event()
+            start = time.monotonic()
+            signal_sampling = self._start_signal_sampling(interval)
+            if not signal_sampling:
+                logger.warning("无法在事件循环线程上定时采样，退回后台线程采样，会话占比与 loop_busy 有偏差")
+            sampler = threading.Thread(
+                target=self._sample,
+                args=(threading.get_ident(), not signal_sampling, interval, start + duration, stop),
+                name="profiler",
+                daemon=True,
+            )
+            sampler.start()
+            try:
+                await asyncio.sleep(duration)
+            finally:
+                if signal_sampling:
+                    self._stop_signal_sampling()
+                stop.set()
+                await asyncio.get_running_loop().run_in_executor(None, sampler.join)
+            elapsed = time.monotonic() - start
+
+            result = self.summarize(self.counters, elapsed, interval, self.ticks)
+            result["loop_sampler"] = "signal" if signal_sampling else "thread"
+            if memory:
+                after = tracemalloc.take_snapshot()
+                result["memory"] = self.compare_snapshots(before, after, top_allocations)
+            return result
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+            self.running = False
+
+    @staticmethod
+    def summarize(counters, elapsed, interval, ticks):
+        """
+        Args:
+            counters: {"loop": Counter, "threads": Counter}，值为各调用栈的墙钟秒数
+            elapsed: 实际采样时长 (秒)
+            interval: 采样间隔 (秒)
+            ticks: 事件循环线程的采样次数
+        """
+        loop_samples, threads = counters["loop"], counters["threads"]
+        total = sum(loop_samples.values())
+        idle = loop_samples.get(("idle",), 0.0)
+        busy = total - idle
+
+        sessions = {}
+        self_time = {}
+        for stack, seconds in loop_samples.items():
+            root = stack[0]
+            if root == "idle":
+                continue
+            entry = sessions.setdefault(root, {"cpu_seconds": 0.0})
+            entry["cpu_seconds"] += seconds
+            if len(stack) > 1:
+                self_time.setdefault(root, Counter())[stack[-1]] += seconds
+        for root, entry in sessions.items():
+            entry["share"] = entry["cpu_seconds"] / busy if busy else 0.0
+            entry["top"] = [
+                (name, round(seconds, 6)) for name, seconds in self_time.get(root, Counter()).most_common(10)
+            ]
+
+        return {
+            "duration": elapsed,
+            "interval": interval,
+            "samples": ticks,
+            "loop_busy": busy / total if total else 0.0,
+            # 键为 "session:<id>"；"loop" 为不属于任何会话的事件循环工作
+            "sessions": dict(sorted(sessions.items(), key=lambda item: -item[1]["cpu_seconds"])),
+            "folded": fold(loop_samples + threads, scale=1e6),
+        }
+
+    @staticmethod
+    def compare_snapshots(before, after, top):
+        """两次 tracemalloc 快照之间按调用栈增长最多的分配"""
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "traceback")
+        growth = [stat for stat in stats if stat.size_diff > 0][:top]
+        folded = Counter()
+        for stat in growth:
+            # tracemalloc 的调用栈从叶到根
+            frames = tuple("{}:{}".format(frame.filename, frame.lineno) for frame in reversed(stat.traceback))
+            folded[frames] += stat.size_diff
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "growth": [
+                {
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "where": "{}:{}".format(stat.traceback[0].filename, stat.traceback[0].lineno),
+                }
+                for stat in growth
+            ],
+            # 权重为字节数
+            "folded": fold(folded),
+        }
+
+
+def _object_size(obj, ndarray):
+    size = sys.getsizeof(obj, 0)
+    # numpy 数组的数据缓冲区不一定计入 getsizeof (视图不拥有数据)
+    if isinstance(obj, ndarray) and obj.base is None:
+        size = max(size, obj.nbytes)
+    return size
+
+
+def _walk(roots, seen, stop_ids, limit):
+    """从 roots 出发遍历对象图，返回新访问到的对象 (不经过 stop_ids 与 OPAQUE_TYPES)"""
+    found = []
+    pending = [obj for obj in roots if id(obj) not in seen]
+    while pending and len(seen) < limit:
+        obj = pending.pop()
+        key = id(obj)
+        if key in seen:
+            continue
+        seen.add(key)
+        found.append(obj)
+        for child in gc.get_referents(obj):
+            if id(child) not in seen and id(child) not in stop_ids and not isinstance(child, OPAQUE_TYPES):
+                pending.append(child)
+    return found
+
+
+def measure_sessions(roots_by_session, limit=2000000):
+    """
+    估算各会话独占的常驻内存
+
+    Args:
+        roots_by_session: {session_id: [会话根对象]}，例如 PeerConnection 与 XiaoZhiServer
+        limit: 最多遍历的对象数，超过后结果偏小
+
+    Returns:
+        dict: {session_id: {"bytes", "objects", "top_types"}}，以及 "shared_objects"、"truncated"
+    """
+    import numpy as np
+
+    stop_ids = {id(root) for roots in roots_by_session.values() for root in roots}
+    seen = set()
+
+    # 可从模块全局变量到达 (不经过任何会话) 的对象视为共享，例如形象图片缓存、全局统计
+    module_globals = [vars(module) for module in list(sys.modules.values()) if module is not None]
+    shared = len(_walk(module_globals, seen, stop_ids, limit))
+
+    result = {}
+    for session_id, roots in roots_by_session.items():
+        objects = _walk(roots, seen, stop_ids - {id(root) for root in roots}, limit)
+        by_type = Counter()
+        for obj in objects:
+            by_type[type(obj).__name__] += _object_size(obj, np.ndarray)
+        result[session_id] = {
+            "bytes": sum(by_type.values()),
+            "objects": len(objects),
+            "top_types": by_type.most_common(8),
+        }
+    return {"sessions": result, "shared_objects": shared, "truncated": len(seen) >= limit}
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,8 @@
+"""
+会话录制模块
+Session Recording Module
+"""
+
+from .capture import CaptureReader, CaptureWriter, SessionRecorder
+
+__all__ = ["CaptureReader", "CaptureWriter", "SessionRecorder"]
@@ -0,0 +1,219 @@
+"""
+会话录制文件格式
+Session Capture Format - 基于内存映射的追加写入二进制格式
+
+文件布局:
+    文件头 (32 字节): magic(8s) version(u32) sample_rate(u32) start_time(f64, unix 秒) reserved(8s)
+    记录 (16 字节头 + 负载): type(u8) channels(u8) reserved(u16) length(u32) timestamp_ns(i64) payload
+
+- 音频记录的负载为 int16 PCM 原始字节，事件记录的负载为 UTF-8 JSON
+- timestamp_ns 为相对录制开始的单调时钟纳秒数
+- 文件按块预分配并以 0 填充，type 为 0 的记录头表示数据结束，因此进程异常退出后文件仍可读取
+"""
+
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"XZCAP\x00\x00\x00"
+VERSION = 1
+
+FILE_HEADER = struct.Struct("<8sIId8s")
+RECORD_HEADER = struct.Struct("<BBHIq")
+
+# 记录类型
+RECORD_END = 0
+RECORD_MIC = 1  # 麦克风原始音频
+RECORD_AEC_OUT = 2  # 回声消除后的上行音频
+RECORD_REFERENCE = 3  # 参考音频 (TTS 下行)
+RECORD_EVENT_IN = 4  # 客户端 DataChannel 消息
+RECORD_EVENT_OUT = 5  # 后端 / 服务端发给客户端的消息
+
+RECORD_NAMES = {
+    RECORD_MIC: "mic",
+    RECORD_AEC_OUT: "aec_out",
+    RECORD_REFERENCE: "reference",
+    RECORD_EVENT_IN: "event_in",
+    RECORD_EVENT_OUT: "event_out",
+}
+
+
+class CaptureWriter:
+    """
+    追加写入的录制文件
+
+    每帧只有一次 struct.pack_into 与一次内存拷贝，空间不足时按块扩容并重新映射。
+    """
+
+    def __init__(self, path, sample_rate=48000, chunk_size=8 * 1024 * 1024):
+        """
+        Args:
+            path: 录制文件路径
+            sample_rate: 音频采样率
+            chunk_size: 每次扩容的字节数
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        # 独占创建 (O_EXCL)：文件已存在时抛出 FileExistsError，不截断其他会话正在写入的映射
+        self.file = open(path, "x+b")
+        self.capacity = 0
+        self.mmap = None
+        self._grow(FILE_HEADER.size)
+
+        FILE_HEADER.pack_into(self.mmap, 0, MAGIC, VERSION, sample_rate, time.time(), b"")
+        self.offset = FILE_HEADER.size
+        self.start_ns = time.monotonic_ns()
+        self.records = 0
+
+    def _grow(self, required):
+        """扩容到至少能容纳 required 字节"""
+        capacity = self.capacity
+        while capacity < required:
+            capacity += self.chunk_size
+        if self.mmap is not None:
+            self.mmap.close()
+        self.file.truncate(capacity)
+        self.mmap = mmap.mmap(self.file.fileno(), capacity)
+        self.capacity = capacity
+
+    def write(self, record_type, payload, channels=0):
+        """
+        追加一条记录
+
+        Args:
+            record_type: 记录类型 (RECORD_*)
+            payload: 支持缓冲区协议的对象 (bytes / memoryview / numpy array)
+            channels: 音频声道数，事件记录为 0
+        """
+        if self.mmap is None:
+            return
+        data = memoryview(payload).cast("B")
+        end = self.offset + RECORD_HEADER.size + data.nbytes
+        # 额外保留一个记录头的空间，保证结束标记始终为 0
+        if end + RECORD_HEADER.size > self.capacity:
+            self._grow(end + RECORD_HEADER.size)
+
+        RECORD_HEADER.pack_into(
+            self.mmap, self.offset, record_type, channels, 0, data.nbytes, time.monotonic_ns() - self.start_ns
+        )
+        self.mmap[self.offset + RECORD_HEADER.size : end] = data
+        self.offset = end
+        self.records += 1
+
+    def write_audio(self, record_type, samples, channels=1):
+        """写入 int16 音频"""
+        self.write(record_type, np.ascontiguousarray(samples, dtype=np.int16), channels)
+
+    def write_event(self, record_type, message):
+        """写入 JSON 事件"""
+        if not isinstance(message, str):
+            message = json.dumps(message, ensure_ascii=False)
+        self.write(record_type, message.encode("utf-8"))
+
+    def close(self):
+        """截断未使用的预分配空间并关闭文件"""
+        if self.mmap is None:
+            return
+        self.mmap.flush()
+        self.mmap.close()
+        self.mmap = None
+        self.file.truncate(self.offset)
+        self.file.close()
+
+
+class CaptureReader:
+    """
+    只读方式映射录制文件
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.sample_rate, self.start_time, _ = FILE_HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError("不是有效的录制文件: {}".format(path))
+        if version != VERSION:
+            raise ValueError("不支持的录制文件版本: {}".format(version))
+
+    def __iter__(self):
+        """
+        按写入顺序遍历记录
+
+        Yields:
+            tuple: (record_type, channels, timestamp_ns, payload memoryview)
+        """
+        view = memoryview(self.mmap)
+        offset = FILE_HEADER.size
+        size = len(self.mmap)
+        while offset + RECORD_HEADER.size <= size:
+            record_type, channels, _, length, timestamp_ns = RECORD_HEADER.unpack_from(self.mmap, offset)
+            if record_type == RECORD_END:
+                break
+            start = offset + RECORD_HEADER.size
+            if start + length > size:
+                # 写入中途被中断的记录
+                break
+            yield record_type, channels, timestamp_ns, view[start : start + length]
+            offset = start + length
+
+    def audio(self, payload):
+        """将音频负载转为 int16 数组 (零拷贝)"""
+        return np.frombuffer(payload, dtype=np.int16)
+
+    def event(self, payload):
+        """将事件负载解析为 JSON"""
+        return json.loads(bytes(payload).decode("utf-8"))
+
+    def close(self):
+        try:
+            self.mmap.close()
+        except BufferError:
+            # 调用方仍持有零拷贝的负载视图，交由垃圾回收释放映射
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionRecorder:
+    """
+    单个会话的录制器，由 XiaoZhiServer 持有，音频轨道与消息回调调用对应方法
+    """
+
+    def __init__(self, directory, mac_address, session_id, chunk_size=8 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        # 未指定 MAC 的客户端共用默认 MAC，文件名带上会话 ID 避免同一秒开始的会话冲突
+        filename = "{}-{}-{}.xzcap".format(mac_address.replace(":", ""), time.strftime("%Y%m%d-%H%M%S"), session_id)
+        self.writer = CaptureWriter(os.path.join(directory, filename), chunk_size=chunk_size)
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    def record_mic(self, samples, channels):
+        self.writer.write_audio(RECORD_MIC, samples, channels)
+
+    def record_aec_output(self, samples, channels):
+        self.writer.write_audio(RECORD_AEC_OUT, samples, channels)
+
+    def record_reference(self, samples):
+        self.writer.write_audio(RECORD_REFERENCE, samples, 1)
+
+    def record_event_in(self, message):
+        self.writer.write_event(RECORD_EVENT_IN, message)
+
+    def record_event_out(self, message):
+        self.writer.write_event(RECORD_EVENT_OUT, message)
+
+    def close(self):
+        self.writer.close()
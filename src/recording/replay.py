@@ -0,0 +1,137 @@
+"""
+录制回放工具
+Capture Replay - 将录制文件以快于实时的速度重新送入回声消除与上行编码链路
+
+用法:
+    python -m src.recording.replay capture.xzcap [--no-uplink] [--profile replay.prof] [--output out.raw]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import time
+
+import numpy as np
+
+from src.audio.echo_manager import EchoCancellationManager
+from src.recording.capture import (
+    RECORD_AEC_OUT,
+    RECORD_EVENT_IN,
+    RECORD_EVENT_OUT,
+    RECORD_MIC,
+    RECORD_NAMES,
+    RECORD_REFERENCE,
+    CaptureReader,
+)
+
+
+async def replay(path, uplink=True, warmup=False, output=None, show_events=False):
+    """
+    回放录制文件
+
+    Args:
+        path: 录制文件路径
+        uplink: 是否同时执行上行 opus 编码 (与 XiaoZhiWebsocket.send_audio 相同的路径)
+        warmup: 是否保留基于墙钟时间的回声消除预热
+        output: 回声消除输出的原始 PCM 写入路径
+        show_events: 是否打印事件记录
+
+    Returns:
+        dict: 回放统计
+    """
+    manager = EchoCancellationManager(enable_echo_cancellation=True, enable_debug=False)
+    if not warmup:
+        manager.echo_canceller.warmup_duration = 0
+
+    audio_opus = None
+    counts = dict.fromkeys(RECORD_NAMES, 0)
+    last_output = None
+    diffs = []
+    opus_bytes = 0
+    last_timestamp = 0
+    output_file = open(output, "wb") if output else None
+
+    start = time.perf_counter()
+    with CaptureReader(path) as reader:
+        for record_type, channels, timestamp_ns, payload in reader:
+            counts[record_type] = counts.get(record_type, 0) + 1
+            last_timestamp = timestamp_ns
+
+            if record_type == RECORD_REFERENCE:
+                manager.update_reference_audio(reader.audio(payload))
+
+            elif record_type == RECORD_MIC:
+                last_output = manager.process_microphone_audio(reader.audio(payload))
+                if output_file:
+                    output_file.write(last_output.tobytes())
+                if uplink:
+                    if audio_opus is None:
+                        from xiaozhi_sdk.opus import AudioOpus
+
+                        audio_opus = AudioOpus(reader.sample_rate, channels or 1, 60)
+                    opus_bytes += len(await audio_opus.pcm_to_opus(last_output.tobytes()))
+
+            elif record_type == RECORD_AEC_OUT and last_output is not None:
+                # 与录制时的回声消除输出对比，用于回归检查
+                recorded = reader.audio(payload)
+                if len(recorded) == len(last_output):
+                    diffs.append(np.mean(np.abs(recorded.astype(np.float32) - last_output)))
+
+            elif record_type in (RECORD_EVENT_IN, RECORD_EVENT_OUT) and show_events:
+                print(
+                    "{:>10.3f}s {:<9} {}".format(timestamp_ns / 1e9, RECORD_NAMES[record_type], reader.event(payload))
+                )
+
+    elapsed = time.perf_counter() - start
+    if output_file:
+        output_file.close()
+
+    captured = last_timestamp / 1e9
+    return {
+        "records": {RECORD_NAMES.get(k, str(k)): v for k, v in counts.items()},
+        "captured_seconds": captured,
+        "replay_seconds": elapsed,
+        "realtime_factor": captured / elapsed if elapsed > 0 else 0.0,
+        "mic_frames_per_sec": counts[RECORD_MIC] / elapsed if elapsed > 0 else 0.0,
+        "opus_bytes": opus_bytes,
+        "aec_mean_abs_diff": float(np.mean(diffs)) if diffs else None,
+        "aec_mismatch_frames": int(np.sum(np.asarray(diffs) > 1.0)) if diffs else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制回放工具")
+    parser.add_argument("path", help="录制文件 (.xzcap)")
+    parser.add_argument("--no-uplink", action="store_true", help="不执行上行 opus 编码")
+    parser.add_argument("--warmup", action="store_true", help="保留基于墙钟时间的回声消除预热")
+    parser.add_argument("--events", action="store_true", help="打印 DataChannel 与后端事件")
+    parser.add_argument("--output", help="回声消除输出写入原始 int16 PCM 文件")
+    parser.add_argument("--profile", help="使用 cProfile 采集并写入该文件")
+    args = parser.parse_args()
+
+    coro = replay(args.path, uplink=not args.no_uplink, warmup=args.warmup, output=args.output, show_events=args.events)
+    if args.profile:
+        profiler = cProfile.Profile()
+        stats = profiler.runcall(asyncio.run, coro)
+        profiler.dump_stats(args.profile)
+    else:
+        stats = asyncio.run(coro)
+
+    print("records:            {}".format(stats["records"]))
+    print(
+        "captured / replay:  {:.2f}s / {:.2f}s ({:.1f}x realtime)".format(
+            stats["captured_seconds"], stats["replay_seconds"], stats["realtime_factor"]
+        )
+    )
+    print("mic frames/sec:     {:.0f}".format(stats["mic_frames_per_sec"]))
+    print("uplink opus bytes:  {}".format(stats["opus_bytes"]))
+    if stats["aec_mean_abs_diff"] is not None:
+        print(
+            "aec diff vs capture: mean={:.2f} mismatched frames={}".format(
+                stats["aec_mean_abs_diff"], stats["aec_mismatch_frames"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,471 @@
+"""
+多节点会话注册表
+Session Registry - 记录各节点的负载 (心跳) 与设备会话的归属节点，/api/offer 据此接受、重定向或拒绝
+
+- MemoryRegistry: 进程内，单节点部署 (默认)
+- SQLiteRegistry: 同一主机上的多个进程共享一个数据库文件，用于本地多节点部署与测试
+其他后端 (例如 Redis) 实现 SessionRegistry 的同名方法即可。
+
+节点超过 node_ttl 没有心跳即视为下线，其名下的设备会话同时失效，不需要逐个会话续期。
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config.registry_config import RegistryConfig
+
+logger = logging.getLogger(__name__)
+
+# offer 路由结果
+ACCEPT, REDIRECT, REJECT = "accept", "redirect", "reject"
+Route = namedtuple("Route", ["action", "url", "replace"])
+
+
+class SessionRegistry:
+    """
+    注册表接口
+
+    节点记录为 dict：node_id、url、sessions、capacity、cpu、load、accepting、updated_at
+    设备会话归属为 (node_id, session_id)
+    """
+
+    def __init__(self, node_ttl=None):
+        self.node_ttl = node_ttl or RegistryConfig.NODE_TTL
+
+    def is_alive(self, node, now=None):
+        return (now or time.time()) - node["updated_at"] <= self.node_ttl
+
+    async def heartbeat(self, node):
+        """写入 (或更新) 节点记录，updated_at 取当前时间"""
+        raise NotImplementedError
+
+    async def remove_node(self, node_id):
+        """删除节点及其名下的全部设备会话"""
+        raise NotImplementedError
+
+    async def nodes(self):
+        """在线节点列表"""
+        raise NotImplementedError
+
+    async def claim(self, mac, node_id, session_id):
+        """
+        登记设备会话的归属 (覆盖旧的归属)
+
+        Returns:
+            tuple: 之前在线的归属 (node_id, session_id)，没有时为 None
+        """
+        raise NotImplementedError
+
+    async def release(self, mac, session_id):
+        """设备会话结束：仅当归属仍是该会话时删除"""
+        raise NotImplementedError
+
+    async def owners(self, macs):
+        """
+        查询设备会话的归属，归属节点已下线的不返回
+
+        Returns:
+            dict: mac -> (node_id, session_id)
+        """
+        raise NotImplementedError
+
+    async def owner(self, mac):
+        return (await self.owners([mac])).get(mac)
+
+    async def node(self, node_id):
+        """在线节点记录，不存在或已下线时为 None"""
+        for node in await self.nodes():
+            if node["node_id"] == node_id:
+                return node
+        return None
+
+    async def close(self):
+        pass
+
+
+class MemoryRegistry(SessionRegistry):
+    """进程内注册表"""
+
+    def __init__(self, node_ttl=None):
+        super().__init__(node_ttl)
+        self._nodes = {}
+        # mac -> (node_id, session_id)
+        self._sessions = {}
+
+    def _alive_node_ids(self):
+        now = time.time()
+        return {node_id for node_id, node in self._nodes.items() if self.is_alive(node, now)}
+
+    async def heartbeat(self, node):
+        self._nodes[node["node_id"]] = dict(node, updated_at=time.time())
+
+    async def remove_node(self, node_id):
+        self._nodes.pop(node_id, None)
+        for mac, (owner, _) in list(self._sessions.items()):
+            if owner == node_id:
+                del self._sessions[mac]
+
+    async def nodes(self):
+        now = time.time()
+        return [dict(node) for node in self._nodes.values() if self.is_alive(node, now)]
+
+    async def claim(self, mac, node_id, session_id):
+        previous = self._sessions.get(mac)
+        self._sessions[mac] = (node_id, session_id)
+        if previous is not None and previous[0] in self._alive_node_ids():
+            return previous
+        return None
+
+    async def release(self, mac, session_id):
+        if self._sessions.get(mac, (None, None))[1] == session_id:
+            del self._sessions[mac]
+
+    async def owners(self, macs):
+        alive = self._alive_node_ids()
+        return {mac: self._sessions[mac] for mac in macs if mac in self._sessions and self._sessions[mac][0] in alive}
+
+
+class SQLiteRegistry(SessionRegistry):
+    """
+    SQLite 注册表：数据库操作在单独的线程中顺序执行，不阻塞事件循环
+    """
+
+    NODE_COLUMNS = ("node_id", "url", "sessions", "capacity", "cpu", "load", "accepting", "updated_at")
+
+    def __init__(self, path=None, node_ttl=None):
+        super().__init__(node_ttl)
+        self.path = path or RegistryConfig.SQLITE_PATH
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="registry")
+        self.db = None
+
+    def _connect(self):
+        if self.db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, url TEXT, sessions INTEGER, "
+                "capacity INTEGER, cpu REAL, load REAL, accepting INTEGER, updated_at REAL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (mac TEXT PRIMARY KEY, node_id TEXT, session_id TEXT, "
+                "claimed_at REAL)"
+            )
+            self.db = db
+        return self.db
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _heartbeat(self, node):
+        record = dict(node, updated_at=time.time())
+        self._connect().execute(
+            "INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [record[column] for column in self.NODE_COLUMNS],
+        )
+
+    def _remove_node(self, node_id):
+        db = self._connect()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM sessions WHERE node_id = ?", (node_id,))
+            db.execute("DELETE FROM nodes WHERE node_id = ?", (node_id,))
+
+    def _nodes(self):
+        rows = self._connect().execute(
+            "SELECT {} FROM nodes WHERE updated_at >= ?".format(", ".join(self.NODE_COLUMNS)),
+            (time.time() - self.node_ttl,),
+        )
+        return [dict(zip(self.NODE_COLUMNS, row), accepting=bool(row[6])) for row in rows]
+
+    def _claim(self, mac, node_id, session_id):
+        db = self._connect()
+        # BEGIN IMMEDIATE：查询旧归属与写入之间不会插入其他进程的写操作
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            previous = db.execute(
+                "SELECT s.node_id, s.session_id FROM sessions s JOIN nodes n ON s.node_id = n.node_id "
+                "WHERE s.mac = ? AND n.updated_at >= ?",
+                (mac, time.time() - self.node_ttl),
+            ).fetchone()
+            db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", (mac, node_id, session_id, time.time()))
+        return tuple(previous) if previous else None
+
+    def _release(self, mac, session_id):
+        self._connect().execute("DELETE FROM sessions WHERE mac = ? AND session_id = ?", (mac, session_id))
+
+    def _owners(self, macs):
+        macs = list(macs)
+        if not macs:
+            return {}
+        rows = self._connect().execute(
+            "SELECT s.mac, s.node_id, s.session_id FROM sessions s JOIN nodes n ON s.node_id = n.node_id "
+            "WHERE s.mac IN ({}) AND n.updated_at >= ?".format(", ".join("?" * len(macs))),
+            (*macs, time.time() - self.node_ttl),
+        )
+        return {mac: (node_id, session_id) for mac, node_id, session_id in rows}
+
+    def _close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def heartbeat(self, node):
+        await self._run(self._heartbeat, node)
+
+    async def remove_node(self, node_id):
+        await self._run(self._remove_node, node_id)
+
+    async def nodes(self):
+        return await self._run(self._nodes)
+
+    async def claim(self, mac, node_id, session_id):
+        return await self._run(self._claim, mac, node_id, session_id)
+
+    async def release(self, mac, session_id):
+        await self._run(self._release, mac, session_id)
+
+    async def owners(self, macs):
+        return await self._run(self._owners, macs)
+
+    async def close(self):
+        await self._run(self._close)
+        self.executor.shutdown(wait=False)
+
+
+def create_registry(backend=None):
+    """按配置创建注册表"""
+    backend = backend or RegistryConfig.BACKEND
+    if backend == "memory":
+        return MemoryRegistry()
+    if backend == "sqlite":
+        return SQLiteRegistry()
+    raise ValueError("未知的注册表后端: {}".format(backend))
+
+
+class ClusterNode:
+    """
+    本节点在注册表中的代表
+
+    - 周期性心跳：上报会话数、容量与 CPU 占用
+    - offer 路由：设备已有会话时重定向到归属节点 (同一设备只保留一个会话)；本节点满载时重定向到
+      负载最低的可用节点，没有可用节点时拒绝
+    - 心跳时核对本节点的设备会话，归属已被其他节点的新会话取代的会话被关闭
+    - 排空期间不接受新会话，并注销本节点的设备会话归属，同一设备重新连接时由其他节点接手
+    """
+
+    def __init__(
+        self,
+        registry,
+        session_manager,
+        load_monitor,
+        node_id,
+        url="",
+        max_sessions=0,
+        cpu_limit=0.9,
+        loop_lag_limit=0.1,
+        heartbeat_interval=5.0,
+        retry_after=5,
+    ):
+        self.registry = registry
+        self.session_manager = session_manager
+        self.load_monitor = load_monitor
+        self.node_id = node_id
+        self.url = url
+        self.max_sessions = max_sessions
+        self.cpu_limit = cpu_limit
+        self.loop_lag_limit = loop_lag_limit
+        self.heartbeat_interval = heartbeat_interval
+        self.retry_after = retry_after
+        self.task = None
+        self.draining = False
+
+        # 本节点登记过的设备会话：session_id -> mac
+        self.claims = {}
+
+        # 统计信息
+        self.routes = {ACCEPT: 0, REDIRECT: 0, REJECT: 0}
+        self.replaced = 0
+        self.superseded = 0
+
+        session_manager.add_close_listener(self.release)
+
+    @property
+    def sessions(self):
+        return len(self.session_manager.sessions)
+
+    @property
+    def load(self):
+        """负载：会话数、CPU 占用与事件循环延迟相对各自上限的最大比例，不低于 1.0 时视为满载 (上限为 0 的项不计)"""
+        ratios = [0.0]
+        if self.max_sessions:
+            ratios.append(self.sessions / self.max_sessions)
+        if self.cpu_limit:
+            ratios.append(self.load_monitor.cpu / self.cpu_limit)
+        if self.loop_lag_limit:
+            ratios.append(self.load_monitor.loop_lag / self.loop_lag_limit)
+        return max(ratios)
+
+    @property
+    def accepting(self):
+        """本节点是否还能接受新会话"""
+        return not self.draining and self.load < 1.0
+
+    def record(self):
+        """心跳写入的节点记录"""
+        load = self.load
+        return {
+            "node_id": self.node_id,
+            "url": self.url,
+            "sessions": self.sessions,
+            "capacity": self.max_sessions,
+            "cpu": self.load_monitor.cpu,
+            "load": load,
+            "accepting": not self.draining and load < 1.0,
+        }
+
+    async def route(self, mac=None, redirected=False):
+        """
+        决定 offer 由谁处理
+
+        Args:
+            mac: 客户端指定的设备 MAC，未指定 (共用默认 MAC) 时不做设备唯一性检查
+            redirected: 是否已由其他节点重定向而来；此时不再重定向，避免节点间往返
+
+        Returns:
+            Route: action 为 ACCEPT / REDIRECT / REJECT；url 为重定向的 offer 地址；
+                   replace 为本节点上需要被替换的旧会话 session_id
+        """
+        route = await self._route(mac, redirected)
+        self.routes[route.action] += 1
+        return route
+
+    async def _route(self, mac, redirected):
+        if mac:
+            owner = await self.registry.owner(mac)
+            if owner is not None:
+                node_id, session_id = owner
+                if node_id == self.node_id and not self.draining:
+                    # 同一设备重新连接：替换旧会话，不额外占用容量
+                    return Route(ACCEPT, None, session_id)
+                if not redirected:
+                    node = await self.registry.node(node_id)
+                    if node is not None and node["url"]:
+                        return Route(REDIRECT, self.offer_url(node), None)
+                # 无法交给归属节点时在本节点建立，归属节点在下次心跳时关闭旧会话
+
+        if self.accepting:
+            return Route(ACCEPT, None, None)
+        if not redirected:
+            node = await self.least_loaded()
+            if node is not None:
+                return Route(REDIRECT, self.offer_url(node), None)
+        return Route(REJECT, None, None)
+
+    async def least_loaded(self):
+        """负载最低的其他可用节点，没有时为 None"""
+        candidates = [
+            node
+            for node in await self.registry.nodes()
+            if node["node_id"] != self.node_id and node["url"] and node["accepting"]
+        ]
+        return min(candidates, key=lambda node: node["load"], default=None)
+
+    @staticmethod
+    def offer_url(node):
+        return node["url"] + "/api/offer?redirected=1"
+
+    async def claim(self, mac, session_id):
+        """登记本节点新建立的设备会话"""
+        self.claims[session_id] = mac
+        previous = await self.registry.claim(mac, self.node_id, session_id)
+        if previous is not None and previous[0] != self.node_id:
+            logger.info("设备 %s 的会话由节点 %s 转移到本节点", mac, previous[0])
+
+    async def release(self, pc):
+        """会话关闭 (SessionManager 关闭回调)"""
+        mac = self.claims.pop(pc.session_id, None)
+        if mac is not None:
+            try:
+                await self.registry.release(mac, pc.session_id)
+            except Exception:
+                logger.exception("注销设备会话失败: %s", mac)
+
+    async def replace(self, session_id):
+        """关闭本节点上同一设备的旧会话"""
+        pc = self.session_manager.find(session_id)
+        if pc is not None:
+            self.replaced += 1
+            await self.session_manager.close(pc, "同一设备建立了新会话")
+
+    async def heartbeat(self):
+        """上报本节点状态，并核对设备会话的归属"""
+        await self.registry.heartbeat(self.record())
+        if not self.claims:
+            return
+        owners = await self.registry.owners(set(self.claims.values()))
+        for session_id, mac in list(self.claims.items()):
+            owner = owners.get(mac)
+            if owner is None:
+                # 注册表丢失了记录 (例如被清空)，重新登记；排空期间保持注销
+                if not self.draining:
+                    await self.registry.claim(mac, self.node_id, session_id)
+            elif owner != (self.node_id, session_id):
+                pc = self.session_manager.find(session_id)
+                self.claims.pop(session_id, None)
+                if pc is not None:
+                    self.superseded += 1
+                    await self.session_manager.close(pc, "设备已在节点 {} 建立新会话".format(owner[0]))
+
+    async def begin_drain(self):
+        """进入排空：不再接受新会话，注销设备会话归属 (会话本身继续运行)"""
+        self.draining = True
+        for session_id, mac in list(self.claims.items()):
+            await self.registry.release(mac, session_id)
+        await self.registry.heartbeat(self.record())
+
+    async def end_drain(self):
+        """取消排空：恢复接受新会话，重新登记仍在本节点的设备会话"""
+        self.draining = False
+        await self.heartbeat()
+
+    async def run(self):
+        """周期性心跳，直到被取消"""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception:
+                logger.exception("注册表心跳失败")
+
+    async def start(self, app):
+        """aiohttp on_startup 回调：清除本节点上一次运行遗留的记录后开始心跳"""
+        await self.registry.remove_node(self.node_id)
+        await self.registry.heartbeat(self.record())
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self, app):
+        """aiohttp on_cleanup 回调：注销本节点"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        try:
+            await self.registry.remove_node(self.node_id)
+        except Exception:
+            logger.exception("注销节点失败")
+        await self.registry.close()
+
+    def get_statistics(self):
+        return {
+            "node_id": self.node_id,
+            "sessions": self.sessions,
+            "accepting": self.accepting,
+            "draining": self.draining,
+            "devices": len(self.claims),
+            "routes": dict(self.routes),
+            "replaced": self.replaced,
+            "superseded": self.superseded,
+        }
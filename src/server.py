@@ -1,48 +1,284 @@
+import asyncio
 import json
 import logging
+import random
+import time
+from collections import deque
 
 import cv2
+from websockets.protocol import State as WebsocketState
 from xiaozhi_sdk import XiaoZhiWebsocket
 
+from src.audio.output_queue import BoundedAudioQueue
+from src.channel import ChannelSender
 from src.config import OTA_URL
+from src.config.channel_config import ChannelConfig
+from src.config.connection_config import ConnectionConfig
+from src.config.output_queue_config import OutputQueueConfig
+from src.profiler import attribute
+from src.track.video_control import InboundVideoController
 
 logger = logging.getLogger(__name__)
 
 
+# 连接状态
+STATE_IDLE = "idle"  # 未连接 (初始、休眠或后端断开)，等待下一次需要时连接
+STATE_CONNECTING = "connecting"
+STATE_BACKOFF = "backoff"  # 连接失败，退避等待下一次尝试
+STATE_CONNECTED = "connected"
+STATE_CLOSED = "closed"  # 会话已结束，不再连接
+
+# 全局连接并发上限，在首次使用时创建
+_connect_semaphore = None
+
+
+def get_connect_semaphore():
+    global _connect_semaphore
+    if _connect_semaphore is None:
+        _connect_semaphore = asyncio.Semaphore(ConnectionConfig.MAX_CONCURRENT_CONNECTS)
+    return _connect_semaphore
+
+
+class BufferedXiaoZhiWebsocket(XiaoZhiWebsocket):
+    """
+    下行音频写入有界队列；队列积压时暂停读取后端消息，由 TCP 流控把背压传给后端
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_audio_queue = BoundedAudioQueue(**OutputQueueConfig.get_queue_params())
+
+    async def _handle_websocket_message(self, message):
+        if isinstance(message, bytes):
+            await self.output_audio_queue.wait_for_space()
+        await super()._handle_websocket_message(message)
+
+    async def close(self):
+        await super().close()
+        # 归还全局下行音频预算
+        self.output_audio_queue.clear()
+
+
 class XiaoZhiServer(object):
     def __init__(self, pc):
         self.pc = pc
         self.channel = pc.createDataChannel("chat")
+        # 下行消息合并、按优先级发送，并遵守 SCTP 发送缓冲水位
+        self.channel_sender = ChannelSender(self.channel, **ChannelConfig.get_sender_params())
+        # 上行摄像头控制，并保存最近一帧画面供拍照使用
+        self.video_control = InboundVideoController(self)
+        # 仅在 STATE_CONNECTED 时不为 None
         self.server = None
+        # 会话录制器 (可选)，见 src/recording
+        self.recorder = None
+
+        # 连接状态机：同一时间最多一个连接流程
+        self.state = STATE_IDLE
+        self.connect_task = None
+        self.failures = 0
+        self.retry_after = 0.0
+        # 连接建立前的上行音频 (有界)，连接成功后按顺序补发
+        self.preroll = deque(maxlen=ConnectionConfig.PREROLL_FRAMES)
+
+        # 会话活动时间 (time.monotonic)，由 SessionManager 用于超时回收与休眠
+        self.last_media_at = time.monotonic()
+        self.last_activity_at = time.monotonic()
+
+    def touch_media(self):
+        """收到客户端媒体帧"""
+        self.last_media_at = time.monotonic()
+
+    def touch_activity(self):
+        """用户说话或后端有消息/音频"""
+        self.last_activity_at = time.monotonic()
+
+    def send_channel_message(self, message, priority=None, key=None):
+        """
+        通过 DataChannel 发送消息给客户端 (经 ChannelSender 排队，可能与其它消息合并为一帧)
+
+        Args:
+            message: 消息 dict
+            priority: 优先级，默认按消息类型确定，见 src/channel.py
+            key: 合并键，相同键的待发消息只保留最新一条
+        """
+        if self.recorder:
+            self.recorder.record_event_out(message)
+        self.channel_sender.send(message, priority, key)
 
     async def message_handler_callback(self, message):
-        logger.info("Received message: %s %s %s", self.pc.mac_address, self.pc.client_ip, message)
+        # 运行在 SDK 的消息处理任务中
+        attribute(self.pc.session_id)
+        logger.info(
+            "Received message: %s %s %s",
+            self.pc.mac_address,
+            self.pc.client_ip,
+            message,
+            extra={"category": "backend.{}".format(message.get("type"))},
+        )
+        self.touch_activity()
         if message["type"] == "websocket" and message["state"] == "close":
-            await self.server.close()
-            self.server = None
+            self.on_backend_closed()
+            # 会话仍在进行：客户端只需提示，下一次说话时自动重连 (页面收到 close 会结束通话)
+            if self.state != STATE_CLOSED:
+                message = {"type": "websocket", "state": "reconnecting"}
 
-        self.channel.send(json.dumps(message, ensure_ascii=False))
+        self.send_channel_message(message)
         if message["type"] == "llm" and hasattr(self.pc, "video_track"):
             self.pc.video_track.set_emoji(message["text"])
 
+    def on_backend_closed(self):
+        """后端断开：回到 IDLE，下一次说话或客户端消息时再重连"""
+        server, self.server = self.server, None
+        if self.state == STATE_CONNECTED:
+            self.state = STATE_IDLE
+        if server:
+            # 回调可能运行在 SDK 的消息处理任务中，不能在这里等待它被取消
+            asyncio.create_task(server.close())
+
     async def start(self):
-        self.server = XiaoZhiWebsocket(
+        """
+        建立后端连接，失败时抛出 ConnectionError
+
+        在 /api/offer 中调用，只尝试 START_MAX_ATTEMPTS 次，不阻塞应答太久
+        """
+        task = self._schedule_connect(ConnectionConfig.START_MAX_ATTEMPTS)
+        if task is None or not await asyncio.shield(task):
+            raise ConnectionError("无法连接小智后端")
+
+    async def connect(self):
+        """
+        确保后端已连接，并发调用共享同一个连接流程
+
+        Returns:
+            bool: 是否已连接
+        """
+        if self.state == STATE_CONNECTED:
+            return True
+        task = self._schedule_connect()
+        if task is None:
+            return False
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                # 连接流程被 hibernate / close 取消
+                return False
+            raise
+
+    def wake(self):
+        """检测到语音时在后台发起连接，不等待结果"""
+        if self.connect_task is not None and not self.connect_task.done():
+            return
+        if self._schedule_connect() is not None:
+            logger.info("检测到语音，连接后端 [%s %s]", self.pc.mac_address, self.pc.client_ip)
+
+    def _schedule_connect(self, attempts=None):
+        """返回进行中的连接流程，必要时新建；会话已关闭或仍在冷却期时返回 None"""
+        if self.connect_task is not None and not self.connect_task.done():
+            return self.connect_task
+        if self.state == STATE_CLOSED or time.monotonic() < self.retry_after:
+            return None
+        self.connect_task = asyncio.create_task(self._connect(attempts or ConnectionConfig.RECONNECT_MAX_ATTEMPTS))
+        return self.connect_task
+
+    async def _connect(self, attempts):
+        """带抖动指数退避的连接流程"""
+        self.touch_activity()
+        for attempt in range(attempts):
+            self.state = STATE_CONNECTING
+            try:
+                async with get_connect_semaphore():
+                    server = await asyncio.wait_for(self._open(), ConnectionConfig.CONNECT_TIMEOUT)
+            except Exception as e:
+                self.failures += 1
+                logger.warning("连接后端失败 [%s] (第 %s 次): %s", self.pc.mac_address, attempt + 1, e)
+                if attempt + 1 == attempts:
+                    break
+                self.state = STATE_BACKOFF
+                delay = ConnectionConfig.get_backoff_delay(attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                continue
+
+            # 补发连接期间缓存的上行音频，期间新到的音频继续进入缓存
+            try:
+                while self.preroll:
+                    await server.send_audio(self.preroll.popleft())
+            except BaseException:
+                await server.close()
+                raise
+            self.server = server
+            self.state = STATE_CONNECTED
+            self.failures = 0
+            return True
+
+        self.state = STATE_IDLE
+        self.retry_after = time.monotonic() + ConnectionConfig.RECONNECT_MAX_DELAY
+        return False
+
+    async def _open(self):
+        """创建并初始化一个 XiaoZhiWebsocket"""
+        server = BufferedXiaoZhiWebsocket(
             self.message_handler_callback, ota_url=OTA_URL, audio_sample_rate=48000, audio_channels=2
         )
-        await self.server.set_mcp_tool(self.mcp_tool_func())
-        await self.server.init_connection(self.pc.mac_address)
+        try:
+            await server.set_mcp_tool(self.mcp_tool_func())
+            await server.init_connection(self.pc.mac_address)
+            # SDK 在 OTA 未返回 websocket 地址或握手失败时只记录日志并正常返回
+            if server.websocket is None or server.websocket.state != WebsocketState.OPEN:
+                raise ConnectionError("后端 websocket 未建立")
+        except BaseException:
+            await server.close()
+            raise
+        return server
+
+    async def send_audio(self, pcm, wake=False):
+        """
+        发送上行音频；未连接时写入有界缓存
+
+        Args:
+            pcm: PCM 字节或 memoryview；视图指向复用的缓冲区，只在本次调用期间有效
+            wake: 未连接时是否发起连接 (检测到语音)
+        """
+        if self.state == STATE_CONNECTED:
+            # SDK 在第一次挂起前就完成了 PCM 的读取与编码，可以直接传递视图
+            await self.server.send_audio(pcm)
+            return
+        self.preroll.append(bytes(pcm))
+        if wake:
+            self.wake()
+
+    async def hibernate(self):
+        """关闭后端连接，会话本身保持，下一次需要时重新连接"""
+        if self.connect_task is not None and not self.connect_task.done():
+            self.connect_task.cancel()
+        server, self.server = self.server, None
+        if self.state != STATE_CLOSED:
+            self.state = STATE_IDLE
+        self.preroll.clear()
+        if server:
+            await server.close()
+
+    async def close(self):
+        """释放会话持有的后端连接与录制器"""
+        self.state = STATE_CLOSED
+        self.video_control.close()
+        self.channel_sender.close()
+        await self.hibernate()
+        if self.recorder:
+            self.recorder.close()
+            self.recorder = None
 
     def mcp_tool_func(self):
         def tool_set_volume(data):
-            self.channel.send(json.dumps({"type": "tool", "text": "set_volume", "value": data["volume"]}))
+            self.send_channel_message({"type": "tool", "text": "set_volume", "value": data["volume"]})
             return "", False
 
         def tool_open_tab(data):
-            self.channel.send(json.dumps({"type": "tool", "text": "open_tab", "value": data["url"]}))
+            self.send_channel_message({"type": "tool", "text": "open_tab", "value": data["url"]})
             return "", False
 
         def tool_stop_music(data):
-            self.channel.send(json.dumps({"type": "tool", "text": "stop_music"}))
+            self.send_channel_message({"type": "tool", "text": "stop_music"})
             return "", False
 
         def tool_get_device_status(data):
@@ -57,8 +293,13 @@ class XiaoZhiServer(object):
                 False,
             )
 
-        def tool_take_photo(data):
-            img_obj = self.server.video_frame.to_ndarray(format="bgr24")
+        async def tool_take_photo(data):
+            attribute(self.pc.session_id)
+            # 临时提高上行画质，等待清晰的新画面
+            frame = await self.video_control.capture()
+            if frame is None:
+                return "没有摄像头画面", True
+            img_obj = frame.to_ndarray(format="bgr24")
             # 直接使用 OpenCV 编码图片
             _, img_byte = cv2.imencode(".jpg", img_obj)
             img_byte = img_byte.tobytes()
@@ -74,11 +315,14 @@ class XiaoZhiServer(object):
             take_photo,
         )
 
-        take_photo["tool_func"] = tool_take_photo
-        get_device_status["tool_func"] = tool_get_device_status
-        set_volume["tool_func"] = tool_set_volume
-        open_tab["tool_func"] = tool_open_tab
-        stop_music["tool_func"] = tool_stop_music
+        # 工具定义是 SDK 中各会话共享的模块级 dict，每个会话复制一份再绑定自己的回调，
+        # 否则 (重) 连接会把其他会话的工具改绑到最近连接的会话
+        # 拍照需要等待新画面，使用异步工具
+        take_photo = dict(take_photo, tool_func=tool_take_photo, is_async=True)
+        get_device_status = dict(get_device_status, tool_func=tool_get_device_status)
+        set_volume = dict(set_volume, tool_func=tool_set_volume)
+        open_tab = dict(open_tab, tool_func=tool_open_tab)
+        stop_music = dict(stop_music, tool_func=tool_stop_music)
 
         return [
             take_photo,
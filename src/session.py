@@ -0,0 +1,164 @@
+"""
+会话生命周期管理
+Session Manager - 回收未完成连接、媒体中断的会话，并让空闲的后端连接进入休眠
+"""
+
+import asyncio
+import logging
+import time
+
+from src.config.session_config import SessionConfig
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """
+    单个 WebRTC 会话：PeerConnection 与对应的 XiaoZhiServer
+    """
+
+    __slots__ = ("pc", "xiaozhi", "created_at", "connected_at", "closing")
+
+    def __init__(self, pc, xiaozhi):
+        self.pc = pc
+        self.xiaozhi = xiaozhi
+        self.created_at = time.monotonic()
+        self.connected_at = None
+        self.closing = False
+
+
+class SessionManager:
+    """
+    会话生命周期管理器
+
+    - 连接超时: offer 之后在 CONNECT_TIMEOUT 内没有进入 connected 状态的会话被关闭
+    - 媒体超时: 连接后超过 MEDIA_INACTIVITY_TIMEOUT 没有收到客户端媒体帧的会话被关闭
+    - 后端休眠: 超过 BACKEND_IDLE_TIMEOUT 没有语音与后端消息时关闭后端 websocket，
+      下一次检测到上行语音时由音频轨道重新连接
+    """
+
+    def __init__(self, pcs, connect_timeout=None, media_inactivity_timeout=None, backend_idle_timeout=None):
+        """
+        Args:
+            pcs: 全局 PeerConnection 集合，关闭会话时同步移除
+            connect_timeout: 连接超时 (秒)，默认取 SessionConfig
+            media_inactivity_timeout: 媒体超时 (秒)，默认取 SessionConfig
+            backend_idle_timeout: 后端空闲休眠时间 (秒)，默认取 SessionConfig
+        """
+        self.pcs = pcs
+        self.sessions = {}
+        self.connect_timeout = connect_timeout or SessionConfig.CONNECT_TIMEOUT
+        self.media_inactivity_timeout = media_inactivity_timeout or SessionConfig.MEDIA_INACTIVITY_TIMEOUT
+        self.backend_idle_timeout = backend_idle_timeout or SessionConfig.BACKEND_IDLE_TIMEOUT
+        self.task = None
+        # 会话关闭时依次调用的协程函数 (参数为 pc)
+        self.close_listeners = []
+
+        # 统计信息
+        self.reaped = {"connect_timeout": 0, "media_timeout": 0}
+        self.hibernations = 0
+
+    def register(self, pc, xiaozhi):
+        """登记新会话"""
+        self.pcs.add(pc)
+        self.sessions[pc] = Session(pc, xiaozhi)
+
+    def add_close_listener(self, callback):
+        """登记会话关闭回调"""
+        self.close_listeners.append(callback)
+
+    def find(self, session_id):
+        """按 session_id 查找会话的 PeerConnection"""
+        for pc in self.sessions:
+            if pc.session_id == session_id:
+                return pc
+        return None
+
+    def mark_connected(self, pc):
+        """连接建立，开始按媒体活动计时"""
+        session = self.sessions.get(pc)
+        if session is not None and session.connected_at is None:
+            session.connected_at = time.monotonic()
+            session.xiaozhi.touch_media()
+
+    async def close(self, pc, reason):
+        """
+        关闭会话并释放其持有的全部资源，可重复调用
+        """
+        session = self.sessions.pop(pc, None)
+        self.pcs.discard(pc)
+        if session is None or session.closing:
+            await pc.close()
+            return
+        session.closing = True
+        logger.info("关闭会话 [%s %s]: %s", pc.mac_address, pc.client_ip, reason)
+
+        try:
+            await session.xiaozhi.close()
+        except Exception as e:
+            logger.warning("关闭后端连接失败 [%s]: %s", pc.mac_address, e)
+        await pc.close()
+
+        # 停止轨道 (结束上行任务)，断开轨道与会话之间的引用，及时释放回声消除状态与头像图片
+        for name in ("audio_track", "video_track"):
+            track = getattr(pc, name, None)
+            if track is not None:
+                track.stop()
+                delattr(pc, name)
+
+        for callback in self.close_listeners:
+            try:
+                await callback(pc)
+            except Exception:
+                logger.exception("会话关闭回调失败 [%s]", pc.mac_address)
+
+    async def reap(self):
+        """执行一次回收检查"""
+        now = time.monotonic()
+        for pc, session in list(self.sessions.items()):
+            xiaozhi = session.xiaozhi
+            if session.connected_at is None:
+                if now - session.created_at > self.connect_timeout:
+                    self.reaped["connect_timeout"] += 1
+                    await self.close(pc, "连接超时")
+                continue
+
+            if now - xiaozhi.last_media_at > self.media_inactivity_timeout:
+                self.reaped["media_timeout"] += 1
+                await self.close(pc, "媒体超时")
+                continue
+
+            if xiaozhi.server is not None and now - xiaozhi.last_activity_at > self.backend_idle_timeout:
+                self.hibernations += 1
+                logger.info("后端连接空闲，进入休眠 [%s %s]", pc.mac_address, pc.client_ip)
+                await xiaozhi.hibernate()
+
+    async def run(self, interval=None):
+        """周期性回收，直到被取消"""
+        interval = interval or SessionConfig.REAP_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reap()
+            except Exception:
+                logger.exception("会话回收失败")
+
+    async def start(self, app):
+        """aiohttp on_startup 回调"""
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self, app):
+        """aiohttp on_shutdown 回调：停止回收并关闭所有会话"""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        await asyncio.gather(*(self.close(pc, "服务关闭") for pc in list(self.pcs)))
+
+    def get_statistics(self):
+        return {
+            "sessions": len(self.sessions),
+            "connecting": sum(1 for s in self.sessions.values() if s.connected_at is None),
+            "backend_connected": sum(1 for s in self.sessions.values() if s.xiaozhi.server is not None),
+            "reaped": dict(self.reaped),
+            "hibernations": self.hibernations,
+        }
@@ -2,6 +2,14 @@
  * Live2D 管理器
  * 负责 Live2D 模型的初始化、嘴部动画控制等功能
  */
+
+// 服务端口型字符对应的嘴型参数 (ParamMouthForm：-1 圆唇，1 展唇)
+const VISEME_FORMS = { '-': 0, 'a': 0, 'i': 1, 'u': -0.8, 'e': 0.6, 'o': -0.5 };
+// 服务端口型没有 RTP 时间戳时，按到达时间加上估计的播放延迟 (毫秒)
+const LIPSYNC_FALLBACK_DELAY_MS = 120;
+// 最多缓存的口型帧数
+const LIPSYNC_MAX_FRAMES = 500;
+
 class Live2DManager {
     constructor() {
         this.live2dApp = null;
@@ -9,9 +17,15 @@ class Live2DManager {
         this.isTalking = false;
         this.mouthAnimationId = null;
         this.mouthParam = 'ParamMouthOpenY';
+        this.mouthFormParam = 'ParamMouthForm';
         this.audioContext = null;
         this.analyser = null;
         this.dataArray = null;
+        // 服务端口型参数：收到后不再分析音频，按接收端当前播放的 RTP 时间戳取帧
+        this.serverLipSync = false;
+        this.lipSyncFrames = [];
+        this.audioReceiver = null;
+        this.mouthValue = 0;
         // 单/双击判定配置与状态
         this._lastClickTime = 0;
         this._lastClickPos = { x: 0, y: 0 };
@@ -270,9 +284,16 @@ class Live2DManager {
         if (internal && internal.coreModel) {
             const coreModel = internal.coreModel;
 
-            // 获取音频分贝值
             let mouthValue = 0;
-            if (this.analyser && this.dataArray) {
+            if (this.serverLipSync) {
+                // 使用服务端口型参数
+                const frame = this.currentLipSyncFrame();
+                const target = frame ? frame.open : 0;
+                this.mouthValue += (target - this.mouthValue) * 0.6;
+                mouthValue = this.mouthValue;
+                coreModel.setParameterValueById(this.mouthFormParam, frame ? frame.form : 0);
+            } else if (this.analyser && this.dataArray) {
+                // 获取音频分贝值
                 this.analyser.getByteFrequencyData(this.dataArray);
                 const average = this.dataArray.reduce((a, b) => a + b) / this.dataArray.length;
                 // 将0-255的值转换为0-1的范围，并应用一些平滑处理
@@ -285,6 +306,65 @@ class Live2DManager {
         this.mouthAnimationId = requestAnimationFrame(() => this.animateMouth());
     }
 
+    /**
+     * 设置下行音频的 RTCRtpReceiver，用于读取当前播放的 RTP 时间戳
+     * @param {RTCRtpReceiver} receiver - 远端音频轨道的接收端
+     */
+    setAudioReceiver(receiver) {
+        this.audioReceiver = receiver;
+    }
+
+    /**
+     * 缓存服务端发送的一段逐帧口型参数
+     * @param {Object} message - lipsync 消息：{pts, rtp, frame_ms, open: [0-100], viseme: "-aiueo"}
+     */
+    pushLipSync(message) {
+        const now = performance.now();
+        // Opus 的 RTP 时钟为 48kHz
+        const ticks = message.frame_ms * 48;
+        for (let i = 0; i < message.open.length; i++) {
+            this.lipSyncFrames.push({
+                rtp: message.rtp === undefined ? null : (message.rtp + i * ticks) >>> 0,
+                due: now + LIPSYNC_FALLBACK_DELAY_MS + i * message.frame_ms,
+                duration: message.frame_ms,
+                open: message.open[i] / 100,
+                form: VISEME_FORMS[message.viseme[i]] || 0,
+            });
+        }
+        if (this.lipSyncFrames.length > LIPSYNC_MAX_FRAMES) {
+            this.lipSyncFrames.splice(0, this.lipSyncFrames.length - LIPSYNC_MAX_FRAMES);
+        }
+        this.serverLipSync = true;
+    }
+
+    /**
+     * 接收端最近播放的音频 RTP 时间戳，浏览器不支持时返回 null
+     */
+    currentPlayoutRtp() {
+        if (!this.audioReceiver || !this.audioReceiver.getSynchronizationSources) return null;
+        const sources = this.audioReceiver.getSynchronizationSources();
+        if (!sources.length || sources[0].rtpTimestamp === undefined) return null;
+        return sources[0].rtpTimestamp;
+    }
+
+    /**
+     * 取出当前播放位置的口型帧，并丢弃已经播放过的帧
+     * @returns {Object|null} 当前没有对应的帧 (静音或尚未播放到) 时返回 null
+     */
+    currentLipSyncFrame() {
+        const rtp = this.currentPlayoutRtp();
+        const now = performance.now();
+        while (this.lipSyncFrames.length) {
+            const frame = this.lipSyncFrames[0];
+            // 当前播放位置相对该帧起点的时长 (毫秒)，RTP 时间戳按 32 位回绕计算
+            const offset = (frame.rtp !== null && rtp !== null) ? ((rtp - frame.rtp) | 0) / 48 : now - frame.due;
+            if (offset < 0) return null;
+            if (offset < frame.duration) return frame;
+            this.lipSyncFrames.shift();
+        }
+        return null;
+    }
+
     /**
      * 开始说话动画
      * @param {MediaStream} remoteStream - 远程音频流
@@ -315,8 +395,11 @@ class Live2DManager {
         if (internal && internal.coreModel) {
             const coreModel = internal.coreModel;
             coreModel.setParameterValueById(this.mouthParam, 0);
+            coreModel.setParameterValueById(this.mouthFormParam, 0);
             coreModel.update();
         }
+        this.lipSyncFrames = [];
+        this.mouthValue = 0;
     }
 
     /**
@@ -346,6 +429,8 @@ class Live2DManager {
         }
         this.analyser = null;
         this.dataArray = null;
+        this.audioReceiver = null;
+        this.serverLipSync = false;
 
         // 清理 Live2D 应用
         if (this.live2dApp) {
@@ -0,0 +1,64 @@
+"""
+aiortc 私有属性
+aiortc internals - 下行编码自适应、口型 RTP 对齐与 REMB 码率上限依赖 aiortc 的私有属性 (名称改写后的属性名)
+
+这些属性不是 aiortc 的公开接口，升级后可能改名或消失：使用前先检查，缺失时记录一次警告并退回 aiortc 的默认行为；
+启动预热时在一个临时连接上检查一遍，尽早在日志与 /api/ready 中暴露。
+"""
+
+import logging
+
+import aiortc
+from aiortc import RTCPeerConnection
+
+logger = logging.getLogger(__name__)
+
+TRANSCEIVER_CODECS = "_codecs"
+SENDER_ENCODER = "_RTCRtpSender__encoder"
+SENDER_PACKET_COUNT = "_RTCRtpSender__packet_count"
+SENDER_RTP_TIMESTAMP = "_RTCRtpSender__rtp_timestamp"
+RECEIVER_ESTIMATOR = "_RTCRtpReceiver__remote_bitrate_estimator"
+
+# 已记录过警告的功能
+warned = set()
+
+
+def missing_attributes(obj, *names):
+    """返回 obj 上不存在的属性名"""
+    return [name for name in names if not hasattr(obj, name)]
+
+
+def warn_missing(feature, names):
+    """记录一次某功能因缺少私有属性而停用"""
+    if feature in warned:
+        return
+    warned.add(feature)
+    logger.warning(
+        "当前 aiortc %s 缺少私有属性 %s，%s已停用，使用 aiortc 的默认行为",
+        aiortc.__version__,
+        ", ".join(names),
+        feature,
+    )
+
+
+async def check_internals():
+    """
+    在一个不连接的临时 RTCPeerConnection 上检查全部依赖的私有属性 (需在事件循环中调用)
+
+    Returns:
+        list: 缺失的属性名，为空表示当前 aiortc 版本全部支持
+    """
+    pc = RTCPeerConnection()
+    try:
+        audio = pc.addTransceiver("audio")
+        video = pc.addTransceiver("video")
+        missing = (
+            missing_attributes(audio, TRANSCEIVER_CODECS)
+            + missing_attributes(audio.sender, SENDER_ENCODER, SENDER_PACKET_COUNT, SENDER_RTP_TIMESTAMP)
+            + missing_attributes(video.receiver, RECEIVER_ESTIMATOR)
+        )
+    finally:
+        await pc.close()
+    if missing:
+        logger.warning("当前 aiortc %s 缺少私有属性 %s，相关功能将停用", aiortc.__version__, ", ".join(missing))
+    return missing
@@ -1,71 +1,285 @@
-from fractions import Fraction
+import asyncio
+import logging
+import time
 
 import av
 import numpy as np
 from aiortc import AudioStreamTrack
+from aiortc.mediastreams import MediaStreamError
 
+from src.audio.aec_policy import AecPolicy
 from src.audio.echo_manager import EchoCancellationManager
+from src.audio.lipsync import LipSyncAnalyzer
+from src.channel import PRIORITY_BULK
+from src.config.dtx_config import DtxConfig
+from src.config.opus_config import OpusConfig
+from src.config.session_config import SessionConfig
+from src.profiler import attribute
+from src.track.aiortc_internals import SENDER_PACKET_COUNT, SENDER_RTP_TIMESTAMP, missing_attributes, warn_missing
+from src.track.frame_pool import AudioFramePool
+from src.track.opus_encoder import OpusController, install_adaptive_encoder, rtp_timestamp_origin
+
+logger = logging.getLogger(__name__)
 
 resampler = av.AudioResampler(format="s16", layout="mono", rate=48000)
 
 
 class AudioFaceSwapper(AudioStreamTrack):
+    """
+    上行：后台任务持续读取麦克风、回声消除后发送给后端
+    下行：按采样数自行定时逐 20ms 输出 TTS；助手不说话时进入 DTX，只周期性发送静音保活帧；
+    Opus 编码参数由 OpusController 按网络与负载调整；客户端请求时随 TTS 发送逐帧口型参数
+    """
+
     kind = "audio"
 
-    def __init__(self, xiaozhi, track):
+    def __init__(self, xiaozhi, track, audio_processing=None, lipsync=False):
         super().__init__()
         self.track = track
         self.sample_rate = 48000
         self.xiaozhi = xiaozhi
 
-        # 初始化回声消除管理器
-        self.echo_manager = EchoCancellationManager(enable_echo_cancellation=True, enable_debug=True)
+        # 初始化回声消除管理器，按客户端上报的音频处理能力与残余回声测量选择强度
+        self.echo_manager = EchoCancellationManager(
+            enable_echo_cancellation=True, enable_debug=True, policy=AecPolicy(audio_processing)
+        )
 
-    def empty_frame(self):
-        samples = np.zeros(960, dtype=np.float32)
-        samples = (samples * 32767).astype(np.int16)
-        new_frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout="mono")
-        new_frame.sample_rate = self.sample_rate
-        new_frame.pts = 0
-        return new_frame
+        # 下行帧复用，pts 按采样数连续递增
+        self.frame_pool = AudioFramePool(self.sample_rate)
+        # 语音检测用的 float32 工作缓冲区
+        self.speech_buffer = None
 
-    async def recv(self):
-        if not self.xiaozhi.server:
-            return self.empty_frame()
+        # 上行任务在第一次 recv 时启动
+        self.uplink_task = None
+        self.uplink_ended = False
+        # 上行每处理一帧检查一次下行队列，有 TTS 时唤醒处于 DTX 的下行
+        self.downlink_ready = asyncio.Event()
+
+        # 下行定时与静音抑制
+        dtx_params = DtxConfig.get_dtx_params()
+        self.dtx_enabled = dtx_params["enabled"]
+        self.hangover_frames = dtx_params["hangover_frames"]
+        self.keepalive_interval = dtx_params["keepalive_interval"]
+        self.frame_samples = self.sample_rate * DtxConfig.FRAME_MS // 1000
+        self.next_frame_time = None
+        self.silent_frames = 0
+
+        # 正在逐帧输出的 TTS 音频块 (后端每块 60ms) 及其偏移
+        self.downlink_block = None
+        self.downlink_offset = 0
+
+        # 下行编码自适应，在第一次 recv 时安装
+        self.encoder_controller = None
+        self.encoder_task = None
+
+        # 口型参数 (可选)：RTP 时间戳偏移在第一次需要时从发送端换算
+        self.lipsync = LipSyncAnalyzer(self.sample_rate, self.frame_samples) if lipsync else None
+        self.sender = None
+        self.encoder = None
+        self.rtp_origin = None
 
-        # 接收原始音频帧
+        # 统计信息
+        self.sent_frames = 0
+        self.keepalive_frames = 0
+        self.suppressed_seconds = 0.0
+
+    def _start(self):
+        """第一次 recv：启动上行任务，并在 aiortc 创建编码器之前换上自适应 Opus 编码器"""
+        self.uplink_task = asyncio.create_task(self._run_uplink())
+        if not OpusConfig.ADAPTIVE:
+            return
+        pc = self.xiaozhi.pc
+        sender = next((s for s in pc.getSenders() if s.track is self), None)
+        encoder = install_adaptive_encoder(pc, sender) if sender else None
+        if encoder is not None:
+            self.sender = sender
+            self.encoder = encoder
+            self.encoder_controller = OpusController(sender, encoder)
+            self.encoder_task = asyncio.create_task(self.encoder_controller.run())
+
+    async def _run_uplink(self):
+        """上行循环，麦克风轨道结束时结束下行"""
+        try:
+            while True:
+                await self._process_uplink()
+        except MediaStreamError:
+            pass
+        except Exception:
+            logger.exception("上行音频处理失败")
+        finally:
+            self.uplink_ended = True
+            self.downlink_ready.set()
+
+    async def _process_uplink(self):
+        # 接收原始音频帧 (后端未连接时也持续读取，避免接收队列堆积)
         original_frame = await self.track.recv()
+        self.xiaozhi.touch_media()
         pcm_data = np.frombuffer(original_frame.planes[0], dtype=np.int16)
 
+        recorder = self.xiaozhi.recorder
+        if recorder:
+            channels = len(original_frame.layout.channels)
+            recorder.record_mic(pcm_data, channels)
+
         # 使用回声消除管理器处理麦克风音频
         cleaned_pcm_data = self.echo_manager.process_microphone_audio(pcm_data)
+        if recorder:
+            recorder.record_aec_output(cleaned_pcm_data, channels)
+
+        speech = self.is_speech(cleaned_pcm_data)
+        if speech:
+            self.xiaozhi.touch_activity()
+
+        # 发送处理后的音频到服务端 (memoryview，不拷贝)；未连接时进入预缓存，检测到语音则发起连接
+        await self.xiaozhi.send_audio(cleaned_pcm_data.data, wake=speech)
 
-        # 发送处理后的音频到服务端
-        await self.xiaozhi.server.send_audio(cleaned_pcm_data.tobytes())
+        if self._downlink_pending():
+            self.downlink_ready.set()
 
-        if not self.xiaozhi.server:
-            return self.empty_frame()
+    def _downlink_pending(self):
+        return self.downlink_block is not None or bool(self.xiaozhi.server and self.xiaozhi.server.output_audio_queue)
 
-        # 处理服务端返回的音频
-        if self.xiaozhi.server and self.xiaozhi.server.output_audio_queue:
-            samples = self.xiaozhi.server.output_audio_queue.popleft()
+    def _next_downlink_samples(self):
+        """取出下一帧 TTS 音频；没有时返回 None"""
+        if self.downlink_block is None:
+            if not (self.xiaozhi.server and self.xiaozhi.server.output_audio_queue):
+                return None
+            block = self.xiaozhi.server.output_audio_queue.popleft()
+            self.xiaozhi.touch_activity()
 
             # 更新回声消除管理器的参考音频
-            self.echo_manager.update_reference_audio(samples)
+            self.echo_manager.update_reference_audio(block)
+            recorder = self.xiaozhi.recorder
+            if recorder:
+                recorder.record_reference(block)
+            if self.lipsync is not None:
+                self._send_lipsync(block)
+            self.downlink_block = block
+            self.downlink_offset = 0
+
+        start = self.downlink_offset
+        end = start + self.frame_samples
+        samples = self.downlink_block[start:end]
+        if end >= len(self.downlink_block):
+            self.downlink_block = None
+        else:
+            self.downlink_offset = end
+        return samples
+
+    def _send_lipsync(self, block):
+        """
+        发送一个 TTS 音频块的逐帧口型参数，在该块的第一帧输出之前发出
+
+        pts 为块内第一帧的 pts；能换算 RTP 时间戳时附带 rtp，客户端按接收端实际播放的 RTP 时间戳对齐
+        """
+        openness, visemes = self.lipsync.analyze(block)
+        if not visemes:
+            return
+        if self.rtp_origin is None and self.encoder is not None:
+            try:
+                self.rtp_origin = rtp_timestamp_origin(self.sender, self.encoder)
+            except AttributeError:
+                # aiortc 缺少发送端的私有属性：不再换算 RTP 时间戳，只发送 pts
+                warn_missing(
+                    "口型 RTP 对齐", missing_attributes(self.sender, SENDER_PACKET_COUNT, SENDER_RTP_TIMESTAMP)
+                )
+                self.encoder = None
+
+        pts = self.frame_pool.pts
+        message = {"type": "lipsync", "pts": pts, "frame_ms": DtxConfig.FRAME_MS, "open": openness, "viseme": visemes}
+        if self.rtp_origin is not None:
+            message["rtp"] = (self.rtp_origin + pts) & 0xFFFFFFFF
+        # 由下行音频派生的数据，不写入会话录制；积压时可丢弃
+        self.xiaozhi.channel_sender.send(message, PRIORITY_BULK)
+
+    async def _pace(self):
+        """按已输出的采样数实时定时"""
+        now = time.monotonic()
+        if self.next_frame_time is None:
+            self.next_frame_time = now
+        elif self.next_frame_time > now:
+            await asyncio.sleep(self.next_frame_time - now)
+
+    async def _suspend(self):
+        """
+        DTX：暂停发送，直到下行有 TTS 或到达保活时间；
+        恢复时 pts 跳过暂停的时长，客户端按 RTP 时间戳识别这段静音
+        """
+        if not self._downlink_pending() and not self.uplink_ended:
+            self.downlink_ready.clear()
+            try:
+                await asyncio.wait_for(self.downlink_ready.wait(), self.keepalive_interval)
+            except asyncio.TimeoutError:
+                pass
+
+        now = time.monotonic()
+        if self.next_frame_time is not None and now > self.next_frame_time:
+            gap = now - self.next_frame_time
+            skipped = int(gap * self.sample_rate) // self.frame_samples * self.frame_samples
+            self.frame_pool.pts += skipped
+            self.suppressed_seconds += skipped / self.sample_rate
+        self.next_frame_time = now
+
+    async def recv(self):
+        # 剖析归属：RTP 发送任务 (编码、SRTP) 以及在此创建的上行任务都属于该会话
+        attribute(self.xiaozhi.pc.session_id)
+        if self.readyState != "live":
+            raise MediaStreamError
+        if self.uplink_task is None:
+            self._start()
+
+        if self.dtx_enabled and self.silent_frames >= self.hangover_frames:
+            await self._suspend()
+        else:
+            await self._pace()
+        if self.uplink_ended:
+            self.stop()
+            raise MediaStreamError
+
+        # 处理服务端返回的音频，每次输出一帧 (20ms)，由编码器决定打包时长
+        samples = self._next_downlink_samples()
+        if samples is not None:
+            frame = self.frame_pool.frame(samples)
+            self.silent_frames = 0
+        else:
+            if self.dtx_enabled and self.silent_frames >= self.hangover_frames:
+                self.keepalive_frames += 1
+            frame = self.frame_pool.silence(self.frame_samples)
+            self.silent_frames += 1
+
+        self.sent_frames += 1
+        self.next_frame_time += frame.samples / self.sample_rate
+        return frame
 
-            # 创建音频帧返回给客户端
-            new_frame = av.AudioFrame.from_ndarray(
-                samples.reshape(1, -1),
-                format="s16",
-                layout="mono",
-            )
-            new_frame.sample_rate = self.sample_rate
-            new_frame.pts = original_frame.pts
-            new_frame.time_base = Fraction(1, self.sample_rate)
+    def stop(self):
+        for task in (self.uplink_task, self.encoder_task):
+            if task is not None and not task.done():
+                task.cancel()
+        super().stop()
 
-            return new_frame
+    def is_speech(self, samples):
+        """按 RMS 判断当前帧是否有语音 (在预分配的 float32 缓冲区上计算)"""
+        if len(samples) == 0:
+            return False
+        buffer = self.speech_buffer
+        if buffer is None or len(buffer) != len(samples):
+            buffer = self.speech_buffer = np.empty(len(samples), dtype=np.float32)
+        np.copyto(buffer, samples, casting="unsafe")
+        energy = float(np.dot(buffer, buffer)) / len(buffer)
+        return energy > SessionConfig.VOICE_THRESHOLD**2
 
-        return self.empty_frame()
+    def get_downlink_stats(self):
+        """获取下行发送与静音抑制统计信息"""
+        return {
+            "dtx_enabled": self.dtx_enabled,
+            "dtx_active": self.dtx_enabled and self.silent_frames >= self.hangover_frames,
+            "sent_frames": self.sent_frames,
+            "keepalive_frames": self.keepalive_frames,
+            "suppressed_seconds": self.suppressed_seconds,
+            "frame_pool": self.frame_pool.get_statistics(),
+            "encoder": self.encoder_controller.get_statistics() if self.encoder_controller else None,
+            "lipsync": self.lipsync.get_statistics() if self.lipsync else None,
+        }
 
     def get_echo_cancellation_stats(self):
         """获取回声消除统计信息"""
@@ -0,0 +1,73 @@
+"""
+数字人形象图片
+Avatar Images - 表情对应的形象图片在进程内只解码一次，所有会话共享 (只读)
+"""
+
+import os
+import threading
+
+import cv2
+
+IMAGE_DIR = os.path.join(os.path.dirname(__file__), "..", "image")
+DEFAULT_IMAGE = "szr.png"
+
+# 表情 -> 图片文件
+EMOJI_IMAGES = {
+    "😄": "szr-happy.png",
+    "😌": "szr-happy.png",
+    "😋": "szr-happy.png",
+    "😊": "szr-happy.png",
+    "😆": "szr-happy.png",
+    "😂": "szr-joy.png",
+    "😭": "szr-joy.png",
+    "😱": "szr-panic.png",
+    "😡": "szr-angry.png",
+    "🥰": "szr-love.png",
+    "😍": "szr-love.png",
+    "😏": "szr-smirk.png",
+    "😉": "szr-smirk.png",
+    "😘": "szr-kiss.png",
+    "😴": "szr-sleep.png",
+    "😎": "szr-cool-2.png",
+    "😔": "szr-sad.png",
+}
+
+_images = None
+_lock = threading.Lock()
+
+
+def load_avatar_images():
+    """
+    获取形象图片，首次调用时解码并校验 (可在线程池中调用)
+
+    Returns:
+        dict: 表情 -> BGR 图像 (只读 numpy 数组)，"default" 为默认形象
+
+    Raises:
+        RuntimeError: 图片缺失、无法解码或尺寸不一致
+    """
+    global _images
+    if _images is None:
+        with _lock:
+            if _images is None:
+                _images = _decode_images()
+    return _images
+
+
+def _decode_images():
+    decoded = {}
+    for name in sorted({DEFAULT_IMAGE, *EMOJI_IMAGES.values()}):
+        image = cv2.imread(os.path.join(IMAGE_DIR, name))
+        if image is None:
+            raise RuntimeError("无法读取形象图片: {}".format(name))
+        # 各会话共享，禁止修改
+        image.setflags(write=False)
+        decoded[name] = image
+
+    shapes = {image.shape for image in decoded.values()}
+    if len(shapes) != 1:
+        raise RuntimeError("形象图片尺寸不一致: {}".format(sorted(shapes)))
+
+    images = {emoji: decoded[name] for emoji, name in EMOJI_IMAGES.items()}
+    images["default"] = decoded[DEFAULT_IMAGE]
+    return images
@@ -0,0 +1,98 @@
+"""
+音频帧池
+Audio Frame Pool - 每个会话复用下行 av.AudioFrame，避免每个 20ms 周期重新分配帧与临时数组
+"""
+
+from fractions import Fraction
+
+import av
+import numpy as np
+
+# 每种帧长保留的帧数；发送端逐帧编码，编码完成后才会取下一帧，两帧轮换即可保证不被覆盖
+FRAME_POOL_DEPTH = 2
+
+
+class AudioFramePool:
+    """
+    下行音频帧池
+
+    - silence(): 返回预先清零的静音帧，内容从不改写
+    - frame(pcm): 把 PCM 复制进池中的帧 (唯一一次拷贝)，不再经过 reshape / from_ndarray
+    - 所有帧使用同一个按采样数递增的 pts，时间基为 1/sample_rate，静音与语音之间不再出现 pts 跳变
+    """
+
+    def __init__(self, sample_rate=48000, layout="mono", depth=FRAME_POOL_DEPTH):
+        """
+        Args:
+            sample_rate: 采样率
+            layout: 声道布局
+            depth: 每种帧长轮换使用的帧数
+        """
+        self.sample_rate = sample_rate
+        self.layout = layout
+        self.channels = av.AudioLayout(layout).nb_channels
+        self.depth = depth
+        self.time_base = Fraction(1, sample_rate)
+        self.pts = 0
+
+        # 帧长 -> [[(帧, int16 数据视图), ...], 下一个位置]
+        self.silence_frames = {}
+        self.pcm_frames = {}
+
+        # 统计信息
+        self.allocated_frames = 0
+        self.silence_count = 0
+        self.frame_count = 0
+
+    def _allocate(self, samples):
+        frame = av.AudioFrame(format="s16", layout=self.layout, samples=samples)
+        frame.sample_rate = self.sample_rate
+        frame.time_base = self.time_base
+        view = np.frombuffer(frame.planes[0], dtype=np.int16)
+        view.fill(0)
+        self.allocated_frames += 1
+        return frame, view
+
+    def _next(self, pool, samples):
+        """取出指定帧长的下一个帧及其数据视图"""
+        entry = pool.get(samples)
+        if entry is None:
+            allocated = [self._allocate(samples) for _ in range(self.depth)]
+            entry = pool[samples] = [allocated, 0]
+        allocated, index = entry
+        entry[1] = (index + 1) % len(allocated)
+        return allocated[index]
+
+    def _stamp(self, frame):
+        frame.pts = self.pts
+        self.pts += frame.samples
+        return frame
+
+    def silence(self, samples=960):
+        """获取一个静音帧"""
+        self.silence_count += 1
+        frame, _ = self._next(self.silence_frames, samples)
+        return self._stamp(frame)
+
+    def frame(self, pcm):
+        """
+        把 int16 PCM 写入池中的帧
+
+        Args:
+            pcm: int16 数组 (任意形状，按行优先展开)
+
+        Returns:
+            av.AudioFrame: 帧在池中轮换复用，调用方不应长期持有
+        """
+        self.frame_count += 1
+        frame, view = self._next(self.pcm_frames, pcm.size // self.channels)
+        np.copyto(view, pcm.reshape(-1), casting="no")
+        return self._stamp(frame)
+
+    def get_statistics(self):
+        return {
+            "allocated_frames": self.allocated_frames,
+            "silence_frames": self.silence_count,
+            "pcm_frames": self.frame_count,
+            "pts": self.pts,
+        }
@@ -0,0 +1,217 @@
+"""
+自适应 Opus 编码
+Adaptive Opus Encoder - 替换 aiortc 默认的下行 Opus 编码器，按 OpusPolicy 在运行中调整码率、复杂度、帧长与 FEC
+"""
+
+import asyncio
+import logging
+
+from aiortc.codecs.opus import SAMPLE_RATE, OpusEncoder
+from av import AudioResampler
+from xiaozhi_sdk.utils import setup_opus
+
+from src.audio.opus_policy import OpusPolicy
+from src.config.opus_config import OpusConfig
+from src.load_monitor import load_monitor
+from src.track.aiortc_internals import (
+    SENDER_ENCODER,
+    SENDER_PACKET_COUNT,
+    SENDER_RTP_TIMESTAMP,
+    TRANSCEIVER_CODECS,
+    missing_attributes,
+    warn_missing,
+)
+
+# 与 xiaozhi_sdk 一致：先定位内置的 libopus，再导入 opuslib
+setup_opus()
+import opuslib  # noqa: E402
+from opuslib.api import ctl  # noqa: E402
+from opuslib.api.encoder import encoder_ctl  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+ENCODER_SETTINGS = ("bitrate", "complexity", "frame_duration", "packet_loss")
+
+
+class AdaptiveOpusEncoder(OpusEncoder):
+    """
+    可在运行中调整参数的 Opus 编码器 (单声道)
+
+    编码使用 opuslib：码率、复杂度、丢包率与带内 FEC 通过 opus_encoder_ctl 在同一个编码器上调整，
+    不重建编码器，也就不会丢弃 libopus 的前瞻缓冲 (重建会在语音中间产生爆音)。
+    opus_encode 每次调用可以使用不同的帧长，修改帧长只需在编码包边界重建分帧重采样器。
+    新参数在下一个编码包边界生效，输出包的 pts 来自输入帧，RTP 时间戳保持连续。
+
+    输入 pts 跳变 (DTX 暂停后恢复) 时重建分帧重采样器：丢弃跳变前未凑满一包的采样，
+    否则跳变后的第一个包会沿用跳变前的时间戳。DTX 只在静音之后暂停，丢弃的都是静音。
+    """
+
+    def __init__(self, bitrate, complexity, frame_duration=20, packet_loss=0):
+        """
+        Args:
+            bitrate: 码率 (bps)
+            complexity: 编码复杂度 (0-10)
+            frame_duration: 帧长 (毫秒)
+            packet_loss: 预期丢包率 (%)，大于 0 时开启带内 FEC
+        """
+        # 父类的 PyAV 编码器不会被打开，编码由 opuslib 完成；分帧重采样器换成单声道
+        super().__init__()
+        self.encoder = opuslib.Encoder(SAMPLE_RATE, 1, opuslib.APPLICATION_VOIP)
+        self.settings = {}
+        self.frame_size = None
+        self.pending = None
+        self.buffered_samples = 0
+        self.next_pts = None
+        self.reconfigurations = 0
+        self.discontinuities = 0
+        # 最近一个输出包的时间戳 (与帧 pts 同一时钟)，用于换算 RTP 时间戳
+        self.last_timestamp = None
+        self._apply(
+            {"bitrate": bitrate, "complexity": complexity, "frame_duration": frame_duration, "packet_loss": packet_loss}
+        )
+
+    def _reset_resampler(self):
+        self.resampler = AudioResampler(format="s16", layout="mono", rate=SAMPLE_RATE, frame_size=self.frame_size)
+        self.buffered_samples = 0
+
+    def _apply(self, settings):
+        """只调整有变化的参数"""
+        current = self.settings
+        if settings["bitrate"] != current.get("bitrate"):
+            self.encoder.bitrate = settings["bitrate"]
+        if settings["complexity"] != current.get("complexity"):
+            self.encoder.complexity = settings["complexity"]
+        if settings["packet_loss"] != current.get("packet_loss"):
+            self.encoder.packet_loss_perc = settings["packet_loss"]
+            # opuslib 的 inband_fec 属性有误，直接调用 opus_encoder_ctl
+            encoder_ctl(self.encoder.encoder_state, ctl.set_inband_fec, 1 if settings["packet_loss"] else 0)
+        if settings["frame_duration"] != current.get("frame_duration"):
+            self.frame_size = SAMPLE_RATE * settings["frame_duration"] // 1000
+            self._reset_resampler()
+        self.settings = settings
+
+    def configure(self, **settings):
+        """
+        请求新的编码参数 (在事件循环线程调用；编码在线程池中进行，下一个包边界生效)
+        """
+        unknown = set(settings) - set(ENCODER_SETTINGS)
+        if unknown:
+            raise ValueError("未知的编码参数: {}".format(", ".join(sorted(unknown))))
+        settings = dict(self.settings, **settings)
+        self.pending = settings if settings != self.settings else None
+
+    def encode(self, frame, force_keyframe=False):
+        if self.next_pts is not None and frame.pts != self.next_pts:
+            self._reset_resampler()
+            self.discontinuities += 1
+        pending = self.pending
+        if pending is not None and self.buffered_samples == 0:
+            self.pending = None
+            self._apply(pending)
+            self.reconfigurations += 1
+        self.next_pts = frame.pts + frame.samples
+        self.buffered_samples = (self.buffered_samples + frame.samples) % self.frame_size
+
+        payloads = []
+        timestamp = None
+        for chunk in self.resampler.resample(frame):
+            if timestamp is None:
+                timestamp = chunk.pts
+            pcm = bytes(chunk.planes[0])[: chunk.samples * 2]
+            payloads.append(self.encoder.encode(pcm, chunk.samples))
+        if not payloads:
+            return [], None
+
+        if self.first_packet_pts is None:
+            self.first_packet_pts = timestamp
+        timestamp -= self.first_packet_pts
+        self.last_timestamp = timestamp
+        return payloads, timestamp
+
+    def get_statistics(self):
+        return dict(self.settings, reconfigurations=self.reconfigurations, discontinuities=self.discontinuities)
+
+
+def install_adaptive_encoder(pc, sender):
+    """
+    在发送端第一次编码之前替换为 AdaptiveOpusEncoder
+
+    需要在轨道的第一次 recv 中调用 (此时 aiortc 已确定编码格式但尚未创建编码器)。
+    依赖 aiortc 的私有属性，当前版本缺少时记录一次警告，保留 aiortc 默认的编码器。
+
+    Returns:
+        AdaptiveOpusEncoder: 协商结果不是 Opus、编码器已创建或 aiortc 不支持时返回 None
+    """
+    transceiver = next((t for t in pc.getTransceivers() if t.sender is sender), None)
+    if transceiver is None:
+        return None
+    missing = missing_attributes(transceiver, TRANSCEIVER_CODECS) + missing_attributes(sender, SENDER_ENCODER)
+    if missing:
+        warn_missing("下行编码自适应", missing)
+        return None
+
+    codecs = getattr(transceiver, TRANSCEIVER_CODECS)
+    if not codecs or codecs[0].mimeType.lower() != "audio/opus":
+        return None
+    if getattr(sender, SENDER_ENCODER) is not None:
+        return None
+    encoder = AdaptiveOpusEncoder(**OpusPolicy().settings)
+    setattr(sender, SENDER_ENCODER, encoder)
+    return encoder
+
+
+def rtp_timestamp_origin(sender, encoder):
+    """
+    RTP 时间戳相对帧 pts 的偏移 (aiortc 为每条流随机选取)，RTP 时间戳 = 偏移 + pts (模 2^32)
+
+    只能在轨道的 recv 中调用：发送端逐帧 取帧 -> 编码 -> 发包，此时上一个编码包已经发出，
+    发送端记录的最近 RTP 时间戳与编码器的 last_timestamp 对应同一个包。
+
+    Returns:
+        int: 尚未发出过包时返回 None
+
+    Raises:
+        AttributeError: 当前 aiortc 版本缺少发送端的私有属性
+    """
+    if encoder.last_timestamp is None or not getattr(sender, SENDER_PACKET_COUNT):
+        return None
+    return (getattr(sender, SENDER_RTP_TIMESTAMP) - encoder.last_timestamp) & 0xFFFFFFFF
+
+
+class OpusController:
+    """
+    每个会话的下行编码控制：周期性读取 RTCP 接收报告与服务端负载，交给 OpusPolicy 决策
+    """
+
+    def __init__(self, sender, encoder, policy=None, monitor=None):
+        self.sender = sender
+        self.encoder = encoder
+        self.policy = policy or OpusPolicy()
+        self.monitor = monitor or load_monitor
+
+    async def step(self):
+        """执行一次调整"""
+        loss = jitter = rtt = None
+        stats = await self.sender.getStats()
+        for report in stats.values():
+            if report.type == "remote-inbound-rtp":
+                loss = report.fractionLost / 256
+                jitter = report.jitter / SAMPLE_RATE
+                rtt = report.roundTripTime
+                break
+
+        settings = self.policy.update(loss, jitter, rtt, self.monitor.loop_lag, self.monitor.cpu)
+        self.encoder.configure(**settings)
+
+    async def run(self, interval=None):
+        """周期性调整，直到被取消"""
+        interval = interval or OpusConfig.ADAPT_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.step()
+            except Exception:
+                logger.exception("调整下行编码参数失败")
+
+    def get_statistics(self):
+        return {"policy": self.policy.get_statistics(), "encoder": self.encoder.get_statistics()}
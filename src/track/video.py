@@ -1,9 +1,9 @@
-import os
-
-import cv2
 from aiortc import VideoStreamTrack
 from av import VideoFrame
 
+from src.profiler import attribute
+from src.track.avatar import load_avatar_images
+
 
 class VideoFaceSwapper(VideoStreamTrack):
     kind = "video"
@@ -13,44 +13,21 @@ class VideoFaceSwapper(VideoStreamTrack):
         self.track = track
         self.xiaozhi = xiaozhi
 
-        # 加载图片
-        self.image_dict = {}
-        self.init_image()
+        # 形象图片由所有会话共享，只在进程内解码一次 (通常已在启动预热时完成)
+        self.image_dict = load_avatar_images()
         self.image = self.image_dict["default"]
 
-    def init_image(self):
-        image_path = os.path.join(os.path.dirname(__file__), "..", "image", "{}")
-        self.image_dict = {
-            "default": cv2.imread(image_path.format("szr.png")),
-            "😄": cv2.imread(image_path.format("szr-happy.png")),
-            "😌": cv2.imread(image_path.format("szr-happy.png")),
-            "😋": cv2.imread(image_path.format("szr-happy.png")),
-            "😊": cv2.imread(image_path.format("szr-happy.png")),
-            "😆": cv2.imread(image_path.format("szr-happy.png")),
-            "😂": cv2.imread(image_path.format("szr-joy.png")),
-            "😭": cv2.imread(image_path.format("szr-joy.png")),
-            "😱": cv2.imread(image_path.format("szr-panic.png")),
-            "😡": cv2.imread(image_path.format("szr-angry.png")),
-            "🥰": cv2.imread(image_path.format("szr-love.png")),
-            "😍": cv2.imread(image_path.format("szr-love.png")),
-            "😏": cv2.imread(image_path.format("szr-smirk.png")),
-            "😉": cv2.imread(image_path.format("szr-smirk.png")),
-            "😘": cv2.imread(image_path.format("szr-kiss.png")),
-            "😴": cv2.imread(image_path.format("szr-sleep.png")),
-            "😎": cv2.imread(image_path.format("szr-cool-2.png")),
-            "😔": cv2.imread(image_path.format("szr-sad.png")),
-        }
-
     def set_emoji(self, emoji):
         self.image = self.image_dict.get(emoji, self.image_dict["default"])
 
     async def recv(self):
+        attribute(self.xiaozhi.pc.session_id)
 
         frame = await self.track.recv()
-        if not self.xiaozhi.server:
-            return frame
-        self.xiaozhi.server.video_frame = frame
+        self.xiaozhi.touch_media()
+        self.xiaozhi.video_control.on_frame(frame)
 
+        # 始终下发形象画面：后端休眠或重连期间不回传客户端自己的摄像头画面
         # 使用加载的图片创建视频帧
         new_frame = VideoFrame.from_ndarray(self.image, format="bgr24")
         new_frame.pts = frame.pts
@@ -0,0 +1,207 @@
+"""
+上行摄像头控制
+Inbound Video Control - 摄像头画面只在拍照时使用，平时限制客户端上行的码率、帧率与分辨率，拍照时短暂提高画质
+
+限制通过三条途径下发：
+- SDP：应答中视频 m 段的 b=AS / b=TIAS，作为整个会话的上限 (拍照画质)
+- REMB：替换接收端的带宽估计器，反馈给发送端的估计值不超过当前上限 (依赖 aiortc 私有属性，不支持时跳过)
+- DataChannel：video_control 消息，客户端用 RTCRtpSender.setParameters 设置码率、帧率与分辨率缩放
+"""
+
+import asyncio
+import logging
+import time
+
+from aiortc.rate import RemoteBitrateEstimator
+
+from src.config.video_config import VideoConfig
+from src.track.aiortc_internals import RECEIVER_ESTIMATOR, missing_attributes, warn_missing
+
+logger = logging.getLogger(__name__)
+
+
+def limit_video_bandwidth(sdp, bitrate):
+    """
+    在 SDP 的视频 m 段加入 b=AS (kbps) 与 b=TIAS (bps)
+
+    Args:
+        sdp: SDP 文本
+        bitrate: 码率上限 (bps)
+
+    Returns:
+        str: 修改后的 SDP
+    """
+    lines = sdp.split("\r\n")
+    result = []
+    in_video = False
+    pending = False
+    for line in lines:
+        if line.startswith("m="):
+            in_video = line.startswith("m=video")
+            pending = in_video
+        elif in_video and line.startswith("b="):
+            # 替换已有的带宽行
+            continue
+        elif pending and not line.startswith(("i=", "c=")):
+            # b= 行必须位于 c= 之后、a= 之前
+            result.append("b=AS:{}".format(max(1, bitrate // 1000)))
+            result.append("b=TIAS:{}".format(bitrate))
+            pending = False
+        result.append(line)
+    return "\r\n".join(result)
+
+
+class CappedBitrateEstimator(RemoteBitrateEstimator):
+    """
+    REMB 上限：反馈的带宽估计不超过 cap；提升窗口内直接反馈 cap，让发送端尽快提高码率
+    """
+
+    def __init__(self, cap):
+        super().__init__()
+        self.cap = cap
+        self.boost = False
+        self.cap_changed = False
+        self.last_estimate = None
+
+    def set_cap(self, cap, boost=False):
+        if cap != self.cap or boost != self.boost:
+            self.cap = cap
+            self.boost = boost
+            # 下一个包到达时立即发送 REMB，不等待估计器更新
+            self.cap_changed = True
+
+    def add(self, arrival_time_ms, abs_send_time, payload_size, ssrc):
+        remb = super().add(arrival_time_ms, abs_send_time, payload_size, ssrc)
+        if remb is not None:
+            self.last_estimate = remb[0]
+        elif self.cap_changed:
+            remb = (self.last_estimate or self.cap, list(self.ssrcs.keys()))
+        else:
+            return None
+        self.cap_changed = False
+
+        estimate, ssrcs = remb
+        return (self.cap if self.boost else min(estimate, self.cap)), ssrcs
+
+
+class InboundVideoController:
+    """
+    每个会话的上行摄像头控制，保存最近一帧画面供拍照工具使用
+    """
+
+    def __init__(self, xiaozhi):
+        """
+        Args:
+            xiaozhi: XiaoZhiServer，用于发送 DataChannel 消息
+        """
+        self.xiaozhi = xiaozhi
+        self.enabled = VideoConfig.CONTROL_ENABLED
+        self.estimator = None
+
+        # 最近一帧画面
+        self.latest_frame = None
+        self.frame_count = 0
+        self.frame_event = asyncio.Event()
+
+        # 拍照提升窗口
+        self.boosted = False
+        self.restore_handle = None
+
+        # 统计信息
+        self.boosts = 0
+
+        if self.enabled:
+            xiaozhi.channel.on("open", self.apply)
+
+    def answer_sdp(self, sdp):
+        """在应答 SDP 中写入上行视频带宽上限"""
+        if not self.enabled:
+            return sdp
+        return limit_video_bandwidth(sdp, VideoConfig.PHOTO_BITRATE)
+
+    def install_estimator(self, receiver):
+        """
+        替换视频接收端的 REMB 带宽估计器
+
+        依赖 aiortc 的私有属性，当前版本缺少时记录一次警告，只通过 SDP 与 DataChannel (setParameters) 限制上行
+        """
+        if not self.enabled:
+            return
+        missing = missing_attributes(receiver, RECEIVER_ESTIMATOR)
+        if missing:
+            warn_missing("REMB 码率上限", missing)
+            return
+        self.estimator = CappedBitrateEstimator(VideoConfig.get_control_params(self.boosted)["maxBitrate"])
+        setattr(receiver, RECEIVER_ESTIMATOR, self.estimator)
+
+    def apply(self):
+        """按当前状态下发上行视频限制"""
+        params = VideoConfig.get_control_params(self.boosted)
+        if self.estimator is not None:
+            self.estimator.set_cap(params["maxBitrate"], boost=self.boosted)
+        if self.xiaozhi.channel.readyState == "open":
+            self.xiaozhi.send_channel_message(dict(params, type="video_control"))
+
+    def on_frame(self, frame):
+        """收到一帧上行画面"""
+        self.latest_frame = frame
+        self.frame_count += 1
+        self.frame_event.set()
+
+    def boost(self):
+        """进入 (或延长) 拍照提升窗口"""
+        if self.restore_handle is not None:
+            self.restore_handle.cancel()
+        self.restore_handle = asyncio.get_running_loop().call_later(VideoConfig.PHOTO_BOOST_SECONDS, self._restore)
+        if not self.boosted:
+            logger.info("拍照，临时提高上行画质 [%s]", self.xiaozhi.pc.mac_address)
+            self.boosted = True
+            self.boosts += 1
+            self.apply()
+
+    def _restore(self):
+        self.restore_handle = None
+        if self.boosted:
+            self.boosted = False
+            self.apply()
+
+    async def capture(self):
+        """
+        拍照：提升画质后等待若干新帧 (最长 PHOTO_SETTLE_TIMEOUT 秒)，返回最新一帧
+
+        Returns:
+            av.VideoFrame: 没有收到过画面时返回 None
+        """
+        if not self.enabled:
+            return self.latest_frame
+        already_boosted = self.boosted
+        self.boost()
+        if already_boosted:
+            return self.latest_frame
+
+        target = self.frame_count + VideoConfig.PHOTO_SETTLE_FRAMES
+        deadline = time.monotonic() + VideoConfig.PHOTO_SETTLE_TIMEOUT
+        while self.frame_count < target:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.frame_event.clear()
+            try:
+                await asyncio.wait_for(self.frame_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+        return self.latest_frame
+
+    def close(self):
+        if self.restore_handle is not None:
+            self.restore_handle.cancel()
+            self.restore_handle = None
+
+    def get_statistics(self):
+        return {
+            "enabled": self.enabled,
+            "boosted": self.boosted,
+            "boosts": self.boosts,
+            "frames": self.frame_count,
+            "remb_cap": self.estimator.cap if self.estimator else None,
+        }
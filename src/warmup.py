@@ -0,0 +1,171 @@
+"""
+启动预热
+Warm-up - 服务启动后先开始监听，再在后台依次完成各预热阶段；全部成功后 /api/ready 返回 200
+
+媒体相关模块 (aiortc、av、cv2、xiaozhi_sdk 等) 不在 import src 时导入，而是在预热阶段于线程池中导入，
+端口可以更早开始监听，编排系统按就绪检查决定何时转发流量。
+"""
+
+import asyncio
+import importlib
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 处理通话需要的模块，在预热阶段导入
+MEDIA_MODULES = (
+    "numpy",
+    "av",
+    "cv2",
+    "aiortc",
+    "xiaozhi_sdk",
+    "src.server",
+    "src.recording",
+    "src.track.audio",
+    "src.track.video",
+)
+
+
+def import_media_modules():
+    """导入媒体相关模块 (在线程池中执行)"""
+    for name in MEDIA_MODULES:
+        importlib.import_module(name)
+    return {"modules": len(MEDIA_MODULES)}
+
+
+def warm_codecs():
+    """
+    初始化编码器与 DTLS 证书生成 (在线程池中执行)，让第一路通话不必承担库的首次加载开销
+    """
+    import numpy as np
+    from aiortc.rtcdtlstransport import RTCCertificate
+
+    from src.track.frame_pool import AudioFramePool
+    from src.track.opus_encoder import AdaptiveOpusEncoder
+
+    RTCCertificate.generateCertificate()
+
+    encoder = AdaptiveOpusEncoder(bitrate=32000, complexity=10)
+    pool = AudioFramePool()
+    payloads, _ = encoder.encode(pool.frame(np.zeros(960, dtype=np.int16)))
+    if not payloads:
+        raise RuntimeError("Opus 编码器没有输出")
+    return {"opus_bytes": sum(len(p) for p in payloads)}
+
+
+def validate_ice_config(ice_config):
+    """校验 ICE 配置 (地址格式、TURN 密码)，返回服务器数量"""
+    from src.ice import parse_ice_url
+
+    for url in ice_config.stun_urls + ice_config.turn_urls:
+        parse_ice_url(url)
+    if ice_config.turn_urls and ice_config.turn_credentials() is None:
+        raise ValueError("配置了 TURN_URLS 但没有 TURN_SECRET 或 TURN_USERNAME")
+    # 服务端的 RTCIceServer 同样需要能够构建
+    ice_config.get_server_ice_servers()
+    return {"stun": len(ice_config.stun_urls), "turn": len(ice_config.turn_urls)}
+
+
+class WarmUp:
+    """
+    启动预热：按登记顺序执行各阶段，记录耗时与错误
+    """
+
+    def __init__(self):
+        # [(阶段名, 无参协程函数)]，协程的返回值作为阶段详情
+        self.phases = []
+        self.results = {}
+        # 阶段名 -> 该阶段结束 (成功或失败) 的事件
+        self.finished = {}
+        self.done = asyncio.Event()
+        self.task = None
+        self.started_at = None
+        self.duration = None
+
+    def add_phase(self, name, func):
+        """登记一个预热阶段"""
+        self.phases.append((name, func))
+        self.finished[name] = asyncio.Event()
+
+    @property
+    def failed(self):
+        return any(not result["ok"] for result in self.results.values())
+
+    @property
+    def ready(self):
+        return self.done.is_set() and not self.failed
+
+    async def run(self):
+        """依次执行各阶段，单个阶段失败不影响后续阶段"""
+        self.started_at = time.perf_counter()
+        for name, func in self.phases:
+            start = time.perf_counter()
+            try:
+                detail = await func()
+            except Exception as e:
+                logger.exception("预热阶段 %s 失败", name)
+                self.results[name] = {"ok": False, "seconds": time.perf_counter() - start, "error": str(e)}
+            else:
+                self.results[name] = {"ok": True, "seconds": time.perf_counter() - start, "detail": detail}
+            self.finished[name].set()
+        self.duration = time.perf_counter() - self.started_at
+        self.done.set()
+        if self.failed:
+            logger.error("预热完成 (%.2fs)，存在失败的阶段，服务保持未就绪", self.duration)
+        else:
+            logger.info(
+                "预热完成 (%.2fs): %s",
+                self.duration,
+                ", ".join(
+                    "{} {:.0f}ms".format(name, result["seconds"] * 1000) for name, result in self.results.items()
+                ),
+            )
+
+    async def start(self, app=None):
+        """
+        启动预热 (可注册为 aiohttp on_startup 钩子)，不阻塞启动
+        """
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self, app=None):
+        """取消未完成的预热 (可注册为 aiohttp on_shutdown 钩子)"""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def wait(self, timeout, phase=None):
+        """
+        等待预热 (或其中某个阶段) 结束，最多 timeout 秒；预热未启动时立即返回
+
+        Args:
+            timeout: 最长等待时间 (秒)
+            phase: 阶段名，为 None 时等待全部阶段
+
+        Returns:
+            bool: 是否已结束
+        """
+        if self.task is None:
+            return False
+        event = self.done if phase is None else self.finished[phase]
+        try:
+            await asyncio.wait_for(asyncio.shield(event.wait()), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def get_statistics(self):
+        return {
+            "ready": self.ready,
+            "started": self.task is not None,
+            "done": self.done.is_set(),
+            "duration": self.duration,
+            "phases": self.results,
+        }
+
+
+warmup = WarmUp()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+
+from src.channel import ChannelSender
+
+
+class FakeChannel:
+    """记录发送帧的 RTCDataChannel 替身"""
+
+    def __init__(self, ready_state="open"):
+        self.readyState = ready_state
+        self.bufferedAmount = 0
+        self.bufferedAmountLowThreshold = 0
+        self.handlers = {}
+        self.frames = []
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def emit(self, event):
+        self.handlers[event]()
+
+    def send(self, data):
+        self.frames.append(json.loads(data))
+
+    def messages(self):
+        """展开 batch 帧后的全部消息"""
+        result = []
+        for frame in self.frames:
+            result.extend(frame["messages"] if frame["type"] == "batch" else [frame])
+        return result
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def volume(value):
+    return {"type": "tool", "text": "set_volume", "value": value}
+
+
+def test_messages_within_window_are_batched():
+    async def main():
+        channel = FakeChannel()
+        sender = ChannelSender(channel, batch_window=0.01)
+        sender.send({"type": "stt", "text": "a"})
+        sender.send({"type": "stt", "text": "b"})
+        assert channel.frames == []
+        await asyncio.sleep(0.05)
+        return channel
+
+    channel = run(main())
+    assert len(channel.frames) == 1
+    assert [m["text"] for m in channel.messages()] == ["a", "b"]
+
+
+def test_same_key_keeps_only_latest():
+    async def main():
+        channel = FakeChannel()
+        sender = ChannelSender(channel, batch_window=0.01)
+        sender.send(volume(10))
+        sender.send(volume(20))
+        sender.send(volume(30))
+        await asyncio.sleep(0.05)
+        return channel, sender
+
+    channel, sender = run(main())
+    assert channel.messages() == [volume(30)]
+    assert sender.merged == 2
+    assert sender.pending == 0
+    assert sender.keyed == {}
+
+
+def test_control_messages_are_sent_first_without_waiting_for_window():
+    async def main():
+        channel = FakeChannel()
+        sender = ChannelSender(channel, batch_window=10)
+        sender.send({"type": "stt", "text": "hello"})
+        sender.send({"type": "llm", "text": "😊"})
+        # 控制类消息在本轮事件循环结束时发送，不等待 10 秒的合并窗口
+        await asyncio.sleep(0)
+        return channel
+
+    channel = run(main())
+    assert [m["type"] for m in channel.messages()] == ["llm", "stt"]
+
+
+def test_large_batches_are_split():
+    async def main():
+        channel = FakeChannel()
+        sender = ChannelSender(channel, batch_window=0.01, max_batch_bytes=120)
+        for i in range(6):
+            sender.send({"type": "stt", "text": "x" * 30 + str(i)})
+        await asyncio.sleep(0.05)
+        return channel
+
+    channel = run(main())
+    assert len(channel.frames) > 1
+    assert [m["text"][-1] for m in channel.messages()] == list("012345")
+
+
+def test_high_water_blocks_until_buffered_amount_low():
+    async def main():
+        channel = FakeChannel()
+        channel.bufferedAmount = 100
+        sender = ChannelSender(channel, batch_window=0.01, high_water=100)
+        sender.send({"type": "stt", "text": "a"})
+        await asyncio.sleep(0.05)
+        assert channel.frames == []
+        assert sender.blocked and sender.stalls == 1
+
+        # 阻塞期间不再安排定时发送，由 bufferedamountlow 事件恢复
+        sender.send({"type": "stt", "text": "b"})
+        assert sender.flush_handle is None
+        channel.bufferedAmount = 0
+        channel.emit("bufferedamountlow")
+        return channel, sender
+
+    channel, sender = run(main())
+    assert not sender.blocked
+    assert [m["text"] for m in channel.messages()] == ["a", "b"]
+
+
+def test_drop_oldest_never_drops_control_messages():
+    async def main():
+        channel = FakeChannel()
+        channel.bufferedAmount = 100
+        sender = ChannelSender(channel, batch_window=0.01, high_water=100, max_pending=3)
+        sender.send({"type": "stt", "text": "old"})
+        sender.send({"type": "tool", "text": "open_tab", "value": "a"})
+        sender.send({"type": "tool", "text": "stop_music"})
+        sender.send({"type": "stt", "text": "new"})
+        assert sender.dropped == 1
+        sender.send({"type": "tool", "text": "open_tab", "value": "b"})
+        assert sender.dropped == 2
+        # 积压全是控制类消息时超过上限也不丢弃
+        sender.send({"type": "music", "url": "u"})
+        assert sender.dropped == 2 and sender.pending == 4
+
+        channel.bufferedAmount = 0
+        channel.emit("bufferedamountlow")
+        return channel, sender
+
+    channel, sender = run(main())
+    messages = channel.messages()
+    assert [m["type"] for m in messages[:4]] == ["tool", "tool", "tool", "music"]
+    assert [m["text"] for m in messages if m["type"] == "stt"] == []
+    assert sender.pending == 0
+
+
+def test_messages_wait_for_open_and_are_discarded_on_close():
+    async def main():
+        channel = FakeChannel(ready_state="connecting")
+        sender = ChannelSender(channel, batch_window=0.01)
+        sender.send({"type": "stt", "text": "early"})
+        await asyncio.sleep(0.05)
+        assert channel.frames == []
+        channel.readyState = "open"
+        channel.emit("open")
+        assert [m["text"] for m in channel.messages()] == ["early"]
+
+        channel.readyState = "closed"
+        sender.send({"type": "stt", "text": "late"})
+        channel.emit("close")
+        return sender
+
+    sender = run(main())
+    assert sender.pending == 0
@@ -0,0 +1,54 @@
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.aec_bench import FRAME_SIZE, ManagerEngine, Scenario, energy_db
+from src.audio.echo_manager import FRAME_ALLOCATION_BUDGET
+
+# 10 秒覆盖一个完整周期：远端单讲、静音、近端单讲、双讲
+SCENARIO = Scenario(duration=10.0, seed=0)
+
+
+def process_all(engine):
+    """逐帧处理整段信号 (管理器复用输出缓冲区，每帧结果需在下一次调用前复制)"""
+    output = np.zeros(SCENARIO.frames * FRAME_SIZE, dtype=np.float64)
+    for index in range(SCENARIO.frames):
+        output[index * FRAME_SIZE : (index + 1) * FRAME_SIZE] = engine.process(*SCENARIO.frame(index))
+    return output
+
+
+def test_allocation_per_frame_within_budget():
+    engine = ManagerEngine()
+    alloc_bytes = []
+    tracemalloc.start()
+    try:
+        for index in range(SCENARIO.frames):
+            mic, ref = SCENARIO.frame(index)
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            engine.process(mic, ref)
+            _, peak = tracemalloc.get_traced_memory()
+            # 只统计远端活动帧 (走完整回声消除路径)
+            if SCENARIO.far_active[index]:
+                alloc_bytes.append(peak - current)
+    finally:
+        tracemalloc.stop()
+
+    assert np.percentile(alloc_bytes, 95) <= FRAME_ALLOCATION_BUDGET
+
+
+def test_output_is_reproducible_for_fixed_seed():
+    first = process_all(ManagerEngine())
+    second = process_all(ManagerEngine())
+    assert np.array_equal(first, second)
+
+    # 与记录的结果一致：远端单讲时的 ERLE、近端说话时的失真
+    frames_out = first.reshape(SCENARIO.frames, FRAME_SIZE)
+    frames_mic = SCENARIO.mic.reshape(SCENARIO.frames, FRAME_SIZE)
+    frames_near = SCENARIO.near.reshape(SCENARIO.frames, FRAME_SIZE)
+    far_only = SCENARIO.far_active & ~SCENARIO.near_active
+    near = SCENARIO.near_active
+    erle = energy_db(np.mean(frames_mic[far_only] ** 2), np.mean(frames_out[far_only] ** 2))
+    distortion = energy_db(np.mean((frames_out[near] - frames_near[near]) ** 2), np.mean(frames_near[near] ** 2))
+    assert abs(erle - 9.88) < 0.01
+    assert abs(distortion + 4.51) < 0.01
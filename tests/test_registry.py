@@ -0,0 +1,177 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.registry import ACCEPT, REDIRECT, REJECT, ClusterNode, MemoryRegistry
+
+MAC = "02:00:00:00:00:01"
+
+
+class FakePeerConnection:
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+
+class FakeSessionManager:
+    """只提供 ClusterNode 用到的接口"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.closed = []
+
+    def add_close_listener(self, listener):
+        pass
+
+    def add(self, session_id):
+        pc = FakePeerConnection(session_id)
+        self.sessions[pc] = pc
+        return pc
+
+    def find(self, session_id):
+        return next((pc for pc in self.sessions if pc.session_id == session_id), None)
+
+    async def close(self, pc, reason):
+        self.sessions.pop(pc, None)
+        self.closed.append((pc.session_id, reason))
+
+
+def make_node(registry, node_id, url="", max_sessions=0, cpu=0.0, loop_lag=0.0):
+    monitor = SimpleNamespace(cpu=cpu, loop_lag=loop_lag)
+    return ClusterNode(registry, FakeSessionManager(), monitor, node_id, url=url, max_sessions=max_sessions)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_accepts_when_idle():
+    async def main():
+        node = make_node(MemoryRegistry(), "a", "http://a")
+        await node.heartbeat()
+        return await node.route(MAC)
+
+    assert run(main()) == (ACCEPT, None, None)
+
+
+def test_redirects_device_to_remote_owner():
+    async def main():
+        registry = MemoryRegistry()
+        local, remote = make_node(registry, "a", "http://a"), make_node(registry, "b", "http://b")
+        await local.heartbeat()
+        await remote.heartbeat()
+        await remote.claim(MAC, "s1")
+        return await local.route(MAC), await local.route(MAC, redirected=True), await local.route(None)
+
+    owner, redirected, anonymous = run(main())
+    assert owner == (REDIRECT, "http://b/api/offer?redirected=1", None)
+    # 已经重定向过一次：不再往返，在本节点建立
+    assert redirected == (ACCEPT, None, None)
+    # 未指定 MAC 的客户端不做设备唯一性检查
+    assert anonymous == (ACCEPT, None, None)
+
+
+def test_remote_owner_without_url_is_not_redirected():
+    async def main():
+        registry = MemoryRegistry()
+        local, remote = make_node(registry, "a", "http://a"), make_node(registry, "b")
+        await local.heartbeat()
+        await remote.heartbeat()
+        await remote.claim(MAC, "s1")
+        return await local.route(MAC)
+
+    assert run(main()) == (ACCEPT, None, None)
+
+
+def test_same_device_on_local_node_replaces_old_session():
+    async def main():
+        node = make_node(MemoryRegistry(), "a", "http://a", max_sessions=1)
+        await node.heartbeat()
+        node.session_manager.add("s1")
+        await node.claim(MAC, "s1")
+        # 本节点已满，但同一设备重新连接替换旧会话，不额外占用容量
+        route = await node.route(MAC)
+        await node.replace(route.replace)
+        return route, node
+
+    route, node = run(main())
+    assert route == (ACCEPT, None, "s1")
+    assert node.session_manager.closed[0][0] == "s1"
+    assert node.replaced == 1
+
+
+def test_full_node_redirects_to_least_loaded_then_rejects():
+    async def main():
+        registry = MemoryRegistry()
+        full = make_node(registry, "a", "http://a", max_sessions=1)
+        busy = make_node(registry, "b", "http://b", cpu=0.6)
+        idle = make_node(registry, "c", "http://c", cpu=0.1)
+        full.session_manager.add("s1")
+        for node in (full, busy, idle):
+            await node.heartbeat()
+        first = await full.route(MAC)
+
+        # 其他节点也满载 (CPU 或事件循环延迟超过上限) 时拒绝
+        busy.load_monitor.cpu = 0.95
+        idle.load_monitor.loop_lag = 0.5
+        await busy.heartbeat()
+        await idle.heartbeat()
+        return first, await full.route(MAC), await full.route(MAC, redirected=True)
+
+    first, second, redirected = run(main())
+    assert first == (REDIRECT, "http://c/api/offer?redirected=1", None)
+    assert second == (REJECT, None, None)
+    assert redirected == (REJECT, None, None)
+
+
+def test_draining_node_hands_devices_to_other_nodes():
+    async def main():
+        registry = MemoryRegistry()
+        local, other = make_node(registry, "a", "http://a"), make_node(registry, "b", "http://b")
+        await other.heartbeat()
+        await local.heartbeat()
+        local.session_manager.add("s1")
+        await local.claim(MAC, "s1")
+
+        await local.begin_drain()
+        owner = await registry.owner(MAC)
+        routes = await local.route(MAC), await local.route(None)
+        await other.begin_drain()
+        rejected = await local.route(MAC)
+        return owner, routes, rejected, local
+
+    owner, (device, anonymous), rejected, local = run(main())
+    # 排空时注销设备会话归属，会话本身继续运行
+    assert owner is None
+    assert local.session_manager.find("s1") is not None
+    assert device == anonymous == (REDIRECT, "http://b/api/offer?redirected=1", None)
+    assert rejected == (REJECT, None, None)
+
+
+def test_heartbeat_closes_session_superseded_on_another_node():
+    async def main():
+        registry = MemoryRegistry()
+        old, new = make_node(registry, "a", "http://a"), make_node(registry, "b", "http://b")
+        await old.heartbeat()
+        await new.heartbeat()
+        old.session_manager.add("s1")
+        await old.claim(MAC, "s1")
+        await new.claim(MAC, "s2")
+        await old.heartbeat()
+        return old
+
+    old = run(main())
+    assert old.superseded == 1
+    assert old.session_manager.closed[0][0] == "s1"
+    assert old.claims == {}
+
+
+def test_owner_on_expired_node_is_ignored():
+    async def main():
+        registry = MemoryRegistry(node_ttl=0.01)
+        local, remote = make_node(registry, "a", "http://a"), make_node(registry, "b", "http://b")
+        await remote.heartbeat()
+        await remote.claim(MAC, "s1")
+        await asyncio.sleep(0.05)
+        await local.heartbeat()
+        return await local.route(MAC)
+
+    assert run(main()) == (ACCEPT, None, None)